@@ -1,31 +1,43 @@
 import logging
-from flask import Response, request
-from app import app, schema_manager
-import json
+from app import app, schema_manager, redis_client
 import os
 import threading
 import datetime
 from app.workers.task_handler import (
     generate_result,
+    generate_title,
     start_thread,
     reset_task,
     reset_status,
+    job_pool,
+)
+from app.lib import (
+    convert_to_csv,
+    generate_file_path,
+    adjust_file_path,
+    json_response,
+    build_title,
+    request_fingerprint,
+    validate_request,
+    is_node_only,
 )
-from app.lib import convert_to_csv, generate_file_path, adjust_file_path
 import time
 from app.constants import TaskStatus
-from app.persistence import AnnotationStorageService
+from app.persistence import AnnotationStorageService, GraphFileStorage
 
 llm = app.config["llm_handler"]
 EXP = os.getenv("REDIS_EXPIRATION", 3600)  # expiration time of redis cache
 
 
-def handle_client_request(query, request, node_types):
+def handle_client_request(query, request, node_types, properties=True):
     annotation_id = request.get("annotation_id", None)
+    fingerprint = request_fingerprint(request, properties)
     # check if annotation exist
 
     if annotation_id:
-        existing_query = AnnotationStorageService.get_by_query(annotation_id, query[0])
+        existing_query = AnnotationStorageService.get_by_query(
+            annotation_id, query[0], fingerprint
+        )
     else:
         existing_query = None
 
@@ -44,9 +56,17 @@ def handle_client_request(query, request, node_types):
             "node_count_by_label": existing_query.node_count_by_label,
             "edge_count_by_label": existing_query.edge_count_by_label,
         }
+        # a fingerprint hit may come with renamed node ids, keep the
+        # stored query in step with the request it is run for
         AnnotationStorageService.update(
             annotation_id,
-            {"status": TaskStatus.PENDING.value, "updated_at": datetime.datetime.now()},
+            {
+                "query": query[0],
+                "request": {key: value for key, value in request.items()
+                            if key != "annotation_id"},
+                "status": TaskStatus.PENDING.value,
+                "updated_at": datetime.datetime.now(),
+            },
         )
         reset_status(annotation_id)
 
@@ -63,12 +83,9 @@ def handle_client_request(query, request, node_types):
         }
 
         start_thread(annotation_id, args)
-        return Response(
-            json.dumps({"annotation_id": str(annotation_id)}),
-            mimetype="application/json",
-        )
+        return json_response({"annotation_id": str(annotation_id)})
     elif annotation_id is None:
-        title = llm.generate_title(query[0])
+        title = build_title(request)
         annotation = {
             "query": query[0],
             "request": request,
@@ -76,9 +93,11 @@ def handle_client_request(query, request, node_types):
             "node_types": node_types,
             "status": TaskStatus.PENDING.value,
             "job_id": app.config["job_id"],
+            "fingerprint": fingerprint,
         }
 
         annotation_id = AnnotationStorageService.save(annotation)
+        job_pool.submit(generate_title, annotation_id, query[0], title, fingerprint)
 
         args = {
             "all_status": {
@@ -93,12 +112,9 @@ def handle_client_request(query, request, node_types):
         }
         start_thread(annotation_id, args)
 
-        return Response(
-            json.dumps({"annotation_id": str(annotation_id)}),
-            mimetype="application/json",
-        )
+        return json_response({"annotation_id": str(annotation_id)})
     else:
-        title = llm.generate_title(query[0])
+        title = build_title(request)
         del request["annotation_id"]
         # save the query and return the annotation
         annotation = {
@@ -111,9 +127,11 @@ def handle_client_request(query, request, node_types):
             "edge_count": None,
             "node_count_by_label": None,
             "edge_count_by_label": None,
+            "fingerprint": fingerprint,
         }
 
         AnnotationStorageService.update(annotation_id, annotation)
+        job_pool.submit(generate_title, annotation_id, query[0], title, fingerprint)
         reset_task(annotation_id)
 
         args = {
@@ -130,10 +148,7 @@ def handle_client_request(query, request, node_types):
 
         start_thread(annotation_id, args)
 
-        return Response(
-            json.dumps({"annotation_id": str(annotation_id)}),
-            mimetype="application/json",
-        )
+        return json_response({"annotation_id": str(annotation_id)})
 
 
 def requery(annotation_id, query, request):
@@ -164,3 +179,42 @@ def requery(annotation_id, query, request):
     result_generator = threading.Thread(name="result_generator", target=send_annotation)
     result_generator.start()
     return
+
+
+def request_symbols(request):
+    '''Node types and predicates of a request, named like in the dataset files.'''
+    symbols = {node["type"] for node in request.get("nodes", [])}
+    symbols |= {predicate["type"].replace(" ", "_") for predicate in request.get("predicates") or []}
+    return {symbol.lower() for symbol in symbols}
+
+
+def invalidate_annotations(job_id, symbols, db_instance):
+    '''
+    Drop the cached and stored results of the annotations of a dataset
+    that ask for any of the changed symbols, or of all of them when
+    symbols is None, and build their queries again with db_instance.
+    They are run again the next time they are opened. Returns the number
+    of invalidated annotations.
+    '''
+    changed = None if symbols is None else {symbol.lower() for symbol in symbols}
+    count = 0
+
+    for document in AnnotationStorageService.get(job_id):
+        if changed is not None and not request_symbols(document["request"]) & changed:
+            continue
+        redis_client.delete(str(document["_id"]))
+        if document.get("path_url"):
+            GraphFileStorage.invalidate(document["path_url"])
+        try:
+            node_map = validate_request(document["request"], schema_manager.schema)
+            query = db_instance.query_Generator(
+                document["request"], node_map, node_only=is_node_only(document["request"])
+            )
+            AnnotationStorageService.update(document["_id"], {"query": query[0]})
+        except Exception as e:
+            # the old query is run again instead
+            logging.error(f"Error building the query of annotation {document['_id']}: {e}")
+        count += 1
+
+    logging.info(f"Invalidated {count} annotations of job {job_id}")
+    return count
@@ -10,3 +10,9 @@ class TaskStatus(Enum):
 # Define the absolute path to the JSON file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 GRAPH_INFO_PATH = os.path.join(BASE_DIR, '../Data/count_info.json')
+
+# Safety budget for a single annotation result
+MAX_RESULT_ROWS = int(os.getenv('MAX_RESULT_ROWS', 50000))
+MAX_RESULT_NODES = int(os.getenv('MAX_RESULT_NODES', 10000))
+# how to pick nodes once the budget is exceeded: none, random or top_degree
+RESULT_SAMPLING = os.getenv('RESULT_SAMPLING', 'none').lower()
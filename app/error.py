@@ -1,3 +1,13 @@
 class ThreadStopException(Exception):
     def __init__(self, message):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+
+class QueryTimeoutException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class PoolClosedException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -1,6 +1,8 @@
-from .validator import validate_request
+from .validator import validate_request, is_node_only
 from .map_graph import map_graph
-from .limit_graph import limit_graph
-from .utils import convert_to_csv, generate_file_path, adjust_file_path, extract_middle
+from .limit_graph import limit_graph, sample_graph
+from .utils import convert_to_csv, generate_file_path, adjust_file_path, extract_middle, stable_id, build_title
 from .graph import Graph
-from .heuristic_sort import heuristic_sort
\ No newline at end of file
+from .heuristic_sort import heuristic_sort
+from .response import json_response, stream_response
+from .canonical import request_fingerprint
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import networkx as nx
+
+
+def pattern_graph(request):
+    '''
+    Build the pattern graph of a validated request. Every predicate becomes
+    a node of its own linked to its source and target, so direction and
+    repeated predicates between the same nodes survive in an undirected
+    graph. node_id and predicate_id are left out, they are only names.
+    '''
+    G = nx.Graph()
+
+    for node in request['nodes']:
+        label = json.dumps({"type": node['type'], "id": node.get('id', ''),
+                            "properties": node.get('properties', {})}, sort_keys=True, default=str)
+        G.add_node(("node", node['node_id']), label=label)
+
+    for i, predicate in enumerate(request.get('predicates') or []):
+        predicate_node = ("predicate", i)
+        G.add_node(predicate_node, label=f"predicate:{predicate['type']}")
+        source, target = ("node", predicate['source']), ("node", predicate['target'])
+        if source == target:
+            G.add_edge(predicate_node, source, role="source,target")
+        else:
+            G.add_edge(predicate_node, source, role="source")
+            G.add_edge(predicate_node, target, role="target")
+
+    return G
+
+
+def request_fingerprint(request, properties=True):
+    '''
+    Stable fingerprint of a request that does not change when node ids are
+    renamed or predicates are reordered, computed with a Weisfeiler-Lehman
+    hash of the pattern graph. The properties flag is part of it, it
+    changes what the stored query returns.
+    '''
+    G = pattern_graph(request)
+    wl_hash = nx.weisfeiler_lehman_graph_hash(
+        G, node_attr="label", edge_attr="role", iterations=max(3, G.number_of_nodes()))
+    # the sorted labels guard the hash against WL collisions between different type sets
+    labels = sorted(label for _, label in G.nodes(data="label"))
+    key = json.dumps([wl_hash, labels, properties])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
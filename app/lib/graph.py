@@ -1,7 +1,6 @@
-from nanoid import generate
 import json
 import hashlib
-from app.lib.utils import extract_middle
+from app.lib.utils import extract_middle, stable_id
 
 class Graph:
     def __init__(self):
@@ -32,7 +31,7 @@ class Graph:
             name = f"{len(nodes)} {node_type} nodes"
             new_node = {
                 "data": {
-                    "id": generate(),
+                    "id": stable_id(node_type, *sorted(node['id'] for node in nodes)),
                     "type": node_type,
                     "name": name,
                     "nodes": nodes
@@ -143,7 +142,7 @@ class Graph:
                         label = extract_middle(connection["edge_id"])
                         edge = {
                             "data": {
-                                "id": generate(),
+                                "id": stable_id(connection["edge_id"], group_hash, other_node_id),
                                 "edge_id": connection["edge_id"],
                                 "label": label,
                                 "source": group_hash,  # current group node is the source
@@ -179,7 +178,7 @@ class Graph:
                 if key not in parent_map:
                     label = extract_middle(edge_id)
                     parent_map[key] = {
-                        "id": generate(),
+                        "id": stable_id("parent", key),
                         "node": node_id,
                         "edge_id": edge_id,
                         "label": label,
@@ -273,7 +272,7 @@ class Graph:
                 target = parent["node"]
             new_edge = {
                 "data": {
-                    "id": generate(),
+                    "id": stable_id(parent["edge_id"], source, target),
                     "source": source,
                     "target": target,
                     "label": parent["label"],
@@ -283,3 +282,22 @@ class Graph:
             new_edges.append(new_edge)
         graph["edges"] = new_edges
         return graph
+
+    def diff(self, old_graph, new_graph):
+        """
+        Compare two runs of the same annotation by element id.
+        Returns the nodes and edges that were added or changed in the new graph
+        and the ids of the ones that no longer exist.
+        """
+        result = {}
+        for component in ["nodes", "edges"]:
+            old = {e["data"]["id"]: e for e in old_graph.get(component, [])}
+            new = {e["data"]["id"]: e for e in new_graph.get(component, [])}
+
+            result[component] = {
+                "added": [e for id, e in new.items() if id not in old],
+                "changed": [e for id, e in new.items()
+                            if id in old and old[id] != e],
+                "removed": [id for id in old if id not in new],
+            }
+        return result
@@ -1,3 +1,4 @@
+import random
 from app.lib.map_graph import map_graph
 
 def limit_graph(graph, threshold):
@@ -53,4 +54,46 @@ def limit_graph(graph, threshold):
         if remaining != 0:
             new_response["nodes"].append(graph["nodes"][node_widx])
             remaining = remaining - 1
-    return new_response 
+    return new_response
+
+def sample_graph(graph, max_nodes, mode=None):
+    '''
+    Bound the number of nodes in a graph that exceeds the result budget
+
+    Modes:
+        random: keep a random (but repeatable) sample of the nodes
+        top_degree: keep the nodes with the most edges
+        anything else: fall back to limit_graph
+
+    Only edges whose source and target are both kept survive.
+
+    Args:
+        graph (dict): Graph containing 'nodes' and 'edges'
+        max_nodes (int): The maximum number of nodes to keep
+        mode (str): Sampling mode
+
+    Returns:
+        dict: A new graph containg 'nodes' and 'edges'
+    '''
+    nodes = graph["nodes"]
+    if len(nodes) <= max_nodes:
+        return graph
+
+    if mode == "random":
+        # seeded so that re-running an annotation samples the same nodes
+        kept = random.Random(len(nodes)).sample(nodes, max_nodes)
+    elif mode == "top_degree":
+        degree = {}
+        for edge in graph["edges"]:
+            for end in ["source", "target"]:
+                node_id = edge["data"][end]
+                degree[node_id] = degree.get(node_id, 0) + 1
+        kept = sorted(nodes, key=lambda node: degree.get(node["data"]["id"], 0),
+                      reverse=True)[:max_nodes]
+    else:
+        return limit_graph(graph, max_nodes)
+
+    kept_ids = {node["data"]["id"] for node in kept}
+    edges = [edge for edge in graph["edges"]
+             if edge["data"]["source"] in kept_ids and edge["data"]["target"] in kept_ids]
+    return {"nodes": kept, "edges": edges}
@@ -0,0 +1,100 @@
+import gzip
+import zlib
+import orjson
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# bodies smaller than this are sent as they are
+MIN_COMPRESS_SIZE = 1024
+# bodies larger than this are streamed in chunks of STREAM_CHUNK_SIZE
+STREAM_THRESHOLD = 4 * 1024 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def encode_json(data, pretty=False):
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=str, option=option)
+
+
+def is_pretty():
+    return request.args.get("pretty", "0").lower() in ["1", "true", "yes"]
+
+
+def negotiate_encoding():
+    '''
+    Pick the encoding the client rates highest in Accept-Encoding, q=0
+    rules one out, brotli wins a tie.
+    '''
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(encodings)
+
+
+def compressor(encoding):
+    '''Return a (compress, flush) pair for incremental compression.'''
+    if encoding == "br":
+        stream = brotli.Compressor(quality=4)
+        return stream.process, stream.finish
+    stream = zlib.compressobj(5, zlib.DEFLATED, 31)  # 31 selects the gzip container
+    return stream.compress, stream.flush
+
+
+def chunked(body):
+    for offset in range(0, len(body), STREAM_CHUNK_SIZE):
+        yield body[offset:offset + STREAM_CHUNK_SIZE]
+
+
+def compress_stream(chunks, encoding):
+    compress, flush = compressor(encoding)
+    for chunk in chunks:
+        data = compress(bytes(chunk))
+        if data:
+            yield data
+    yield flush()
+
+
+def json_response(data, status=200):
+    '''
+    Encode `data` as compact JSON (indented with ?pretty=1), compress it
+    when the client accepts gzip or brotli and stream large bodies.
+    '''
+    body = encode_json(data, pretty=is_pretty())
+    encoding = negotiate_encoding() if len(body) >= MIN_COMPRESS_SIZE else None
+
+    if len(body) > STREAM_THRESHOLD:
+        chunks = chunked(body)
+        if encoding is not None:
+            chunks = compress_stream(chunks, encoding)
+        response = Response(chunks, status=status, mimetype="application/json")
+    else:
+        if encoding == "br":
+            body = brotli.compress(body, quality=4)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=5)
+        response = Response(body, status=status, mimetype="application/json")
+
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def stream_response(chunks, status=200):
+    '''
+    Stream an already encoded JSON body, compressing it on the fly when the
+    client accepts it. ?pretty=1 does not apply to streamed bodies.
+    '''
+    encoding = negotiate_encoding()
+    if encoding is not None:
+        chunks = compress_stream(chunks, encoding)
+
+    response = Response(chunks, status=status, mimetype="application/json")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
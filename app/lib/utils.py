@@ -3,6 +3,7 @@ from pathlib import Path
 import os
 import logging
 import re
+import hashlib
 
 def adjust_file_path(file_path):
     parent_name = file_path.parents[1].name
@@ -56,3 +57,35 @@ def extract_middle(words):
     if len(words) <= 2:
         return words[1] if len(words) == 2 else ""
     return "_".join(words[1:-1])
+
+
+def stable_id(*parts):
+    '''
+    Build a short deterministic id from the given parts so that grouping the
+    same result twice yields the same node and edge ids.
+    '''
+    key = "\x1f".join(str(part) for part in parts)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def build_title(request):
+    '''
+    Cheap deterministic title built from the node and predicate types,
+    used until the LLM title is ready or when it cannot be generated.
+    '''
+    node_types = {node['node_id']: node['type'] for node in request['nodes']}
+    predicates = request.get('predicates') or []
+
+    parts = []
+    for predicate in predicates:
+        source = node_types.get(predicate['source'], predicate['source'])
+        target = node_types.get(predicate['target'], predicate['target'])
+        parts.append(f"{source} {predicate['type']} {target}")
+
+    connected = {p[key] for p in predicates for key in ['source', 'target']}
+    for node_id, node_type in node_types.items():
+        if node_id not in connected:
+            parts.append(node_type)
+
+    title = ", ".join(dict.fromkeys(parts))
+    return title[:1].upper() + title[1:]
@@ -102,6 +102,11 @@ def validate_request(request, schema):
     return node_map
 
 
+def is_node_only(request):
+    '''Whether a request only asks for nodes, with no predicates between them.'''
+    return not request.get('predicates')
+
+
 def check_disconnected_graph(request):
     # create a networkx graph
     nodes = request['nodes']
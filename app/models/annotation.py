@@ -17,6 +17,7 @@ class Annotation(Schema):
     edge_count_by_label = None
     status = None
     job_id = None
+    fingerprint = None
 
     def __init__(self, **kwargs):
         self.schema = {
@@ -56,6 +57,7 @@ class Annotation(Schema):
             },
             "path_url": Types.String,
             "job_id": Types.String,
+            "fingerprint": Types.String,
             "created_at": {
                 "type": Types.Date,
                 "required": True,
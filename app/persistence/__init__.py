@@ -1 +1,2 @@
-from .annotation_storage_service import AnnotationStorageService
\ No newline at end of file
+from .annotation_storage_service import AnnotationStorageService
+from .graph_file_storage import GraphFileStorage
@@ -1,4 +1,5 @@
 from app.models.annotation import Annotation
+from app.persistence.graph_file_storage import GraphFileStorage
 
 
 class AnnotationStorageService:
@@ -19,6 +20,7 @@ class AnnotationStorageService:
             edge_count_by_label=annotation.get("edge_count_by_label", None),
             job_id=annotation.get("job_id", None),
             status=annotation.get("status", "PENDING"),
+            fingerprint=annotation.get("fingerprint", None),
         )
 
         id = data.save()
@@ -37,8 +39,12 @@ class AnnotationStorageService:
         return data
 
     @staticmethod
-    def get_by_query(annotation_id, query):
-        data = Annotation.find_one({"_id": annotation_id, "query": query})
+    def get_by_query(annotation_id, query, fingerprint=None):
+        # the fingerprint also matches requests that only rename node ids
+        conditions = [{"query": query}]
+        if fingerprint is not None:
+            conditions.append({"fingerprint": fingerprint})
+        data = Annotation.find_one({"_id": annotation_id, "$or": conditions})
         return data
 
     @staticmethod
@@ -50,9 +56,22 @@ class AnnotationStorageService:
     def update(id, data):
         data = Annotation.update({"_id": id}, {"$set": data}, many=False)
 
+    @staticmethod
+    def update_title(id, title, expected_title):
+        # only replace the title if nobody renamed the annotation meanwhile,
+        # the modified count tells whether it was replaced
+        return Annotation.update(
+            {"_id": id, "title": expected_title}, {"$set": {"title": title}}, many=False
+        )
+
     @staticmethod
     def delete(id):
+        annotation = Annotation.find_by_id(id)
         data = Annotation.delete({"_id": id})
+        # drop the stored result along with its index, pages and previous run
+        path_url = getattr(annotation, "path_url", None)
+        if path_url:
+            GraphFileStorage.delete(path_url)
         return data
 
     @staticmethod
@@ -0,0 +1,263 @@
+import json
+import mmap
+import os
+import shutil
+
+# number of lines between two entries of the offset index
+INDEX_STRIDE = 1000
+# size of the slices streamed out of a memory mapped result
+CHUNK_SIZE = 1024 * 1024
+# times stream reopens a result that was replaced while it was opening it
+OPEN_ATTEMPTS = 5
+COMPONENTS = ["nodes", "edges"]
+
+
+class GraphFileStorage:
+    '''
+    Stores a grouped annotation graph on disk.
+
+    Next to the full <id>.json document every component is written as a
+    line-delimited <id>.<component>.jsonl file, and <id>.index.json keeps
+    the element count and the byte offset of every INDEX_STRIDE-th line,
+    so a page can be read by seeking instead of loading the whole graph.
+    The index also records where the nodes and edges arrays start and end
+    inside <id>.json, so the full graph can be streamed out of an mmap
+    without being parsed.
+    '''
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def base_path(file_path):
+        return os.path.splitext(str(file_path))[0]
+
+    @staticmethod
+    def component_path(file_path, component):
+        return f"{GraphFileStorage.base_path(file_path)}.{component}.jsonl"
+
+    @staticmethod
+    def index_path(file_path):
+        return f"{GraphFileStorage.base_path(file_path)}.index.json"
+
+    @staticmethod
+    def prev_path(file_path):
+        return f"{GraphFileStorage.base_path(file_path)}.prev.json"
+
+    @staticmethod
+    def layout_paths(file_path):
+        # the index comes last, it is the file readers look at first
+        return [str(file_path)] + \
+            [GraphFileStorage.component_path(file_path, component) for component in COMPONENTS] + \
+            [GraphFileStorage.index_path(file_path)]
+
+    @staticmethod
+    def save(file_path, graph):
+        file_path = str(file_path)
+
+        # keep the previous run around so clients can fetch only the changes
+        if os.path.exists(file_path):
+            GraphFileStorage.keep_previous(file_path)
+
+        GraphFileStorage.write(file_path, graph)
+
+    @staticmethod
+    def write(file_path, graph):
+        '''
+        Write every file of the layout next to its final path and move
+        them into place once all are complete, the index last, so readers
+        never see a partially written result.
+        '''
+        body = GraphFileStorage.write_body(f"{file_path}.tmp", graph)
+        # moving the file into place keeps its inode, size and mtime
+        body["stamp"] = GraphFileStorage.stamp(os.stat(f"{file_path}.tmp"))
+        index = GraphFileStorage.write_index(file_path, graph, body, suffix=".tmp")
+        for path in GraphFileStorage.layout_paths(file_path):
+            os.replace(f"{path}.tmp", path)
+        return index
+
+    @staticmethod
+    def stamp(stat):
+        '''Identifies one write of <id>.json, the index records it for its body.'''
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def keep_previous(file_path):
+        # a hard link keeps the current result readable until it is replaced
+        prev_path = GraphFileStorage.prev_path(file_path)
+        if os.path.exists(prev_path):
+            os.remove(prev_path)
+        try:
+            os.link(file_path, prev_path)
+        except OSError:
+            shutil.copyfile(file_path, prev_path)
+
+    @staticmethod
+    def invalidate(file_path):
+        '''
+        Drop a stored result that no longer matches the dataset. It is
+        kept as the previous run, so the next run can still be diffed.
+        '''
+        file_path = str(file_path)
+        for path in reversed(GraphFileStorage.layout_paths(file_path)[1:]):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(file_path):
+            os.replace(file_path, GraphFileStorage.prev_path(file_path))
+
+    @staticmethod
+    def delete(file_path):
+        '''Remove a stored result with its index, pages and previous run.'''
+        for path in reversed(GraphFileStorage.layout_paths(file_path)):
+            if os.path.exists(path):
+                os.remove(path)
+        prev_path = GraphFileStorage.prev_path(file_path)
+        if os.path.exists(prev_path):
+            os.remove(prev_path)
+
+    @staticmethod
+    def write_body(file_path, graph):
+        '''
+        Write the graph as compact JSON and return the byte range of each
+        component array in the file.
+        '''
+        body = {}
+        extra = {key: value for key, value in graph.items() if key not in COMPONENTS}
+
+        with open(file_path, "wb") as file:
+            position = file.write(b"{")
+            for i, component in enumerate(COMPONENTS):
+                separator = b"" if i == 0 else b", "
+                position += file.write(separator + json.dumps(component).encode("utf-8") + b": ")
+                start = position
+                position += file.write(json.dumps(graph.get(component, [])).encode("utf-8"))
+                body[component] = [start, position]
+            for key, value in extra.items():
+                position += file.write(b", " + json.dumps(key).encode("utf-8") + b": "
+                                       + json.dumps(value).encode("utf-8"))
+            file.write(b"}")
+
+        body["extra"] = extra
+        return body
+
+    @staticmethod
+    def write_index(file_path, graph, body, suffix=""):
+        index = {"stride": INDEX_STRIDE, "body": body}
+
+        for component in COMPONENTS:
+            offsets = []
+            position = 0
+            elements = graph.get(component, [])
+            component_path = GraphFileStorage.component_path(file_path, component)
+            with open(f"{component_path}{suffix}", "wb") as file:
+                for i, element in enumerate(elements):
+                    if i % INDEX_STRIDE == 0:
+                        offsets.append(position)
+                    line = json.dumps(element).encode("utf-8") + b"\n"
+                    file.write(line)
+                    position += len(line)
+            index[component] = {"count": len(elements), "offsets": offsets}
+
+        with open(f"{GraphFileStorage.index_path(file_path)}{suffix}", "w") as file:
+            json.dump(index, file)
+        return index
+
+    @staticmethod
+    def get_index(file_path):
+        index_path = GraphFileStorage.index_path(file_path)
+        if not os.path.exists(index_path):
+            if not os.path.exists(file_path):
+                return None
+            # results written before the paginated layout existed
+            with open(file_path, "r") as file:
+                graph = json.load(file)
+            return GraphFileStorage.write(file_path, graph)
+
+        with open(index_path, "r") as file:
+            return json.load(file)
+
+    @staticmethod
+    def read_page(file_path, component, cursor=0, limit=1000):
+        '''
+        Read up to `limit` elements of a component starting at position `cursor`.
+        Returns the elements, the cursor of the next page (None on the last
+        page) and the total number of elements, or None if nothing is stored.
+        '''
+        index = GraphFileStorage.get_index(file_path)
+        if index is None:
+            return None
+
+        count = index[component]["count"]
+        if cursor >= count:
+            return [], None, count
+
+        block, skip = divmod(cursor, index["stride"])
+        elements = []
+        with open(GraphFileStorage.component_path(file_path, component), "rb") as file:
+            file.seek(index[component]["offsets"][block])
+            for _ in range(skip):
+                file.readline()
+            for _ in range(min(limit, count - cursor)):
+                elements.append(json.loads(file.readline()))
+
+        next_cursor = cursor + len(elements)
+        return elements, (next_cursor if next_cursor < count else None), count
+
+    @staticmethod
+    def stream(file_path, meta_data):
+        '''
+        Yield a JSON document made of `meta_data` followed by the stored
+        nodes, edges and the other stored graph keys. The component arrays
+        are sliced straight out of a memory mapped <id>.json, which is
+        mapped before this returns together with its own index, so a rerun
+        replacing the result meanwhile can't mix the two.
+        Returns None if nothing is stored.
+        '''
+        opened = GraphFileStorage.open_body(file_path)
+        if opened is None:
+            return None
+        index, mapped = opened
+
+        body = index["body"]
+        document = {**meta_data, **body["extra"]}
+        prefix = json.dumps(document)[:-1]
+        if len(document) > 0:
+            prefix += ", "
+
+        def generate():
+            with mapped:
+                yield prefix.encode("utf-8")
+                for i, component in enumerate(COMPONENTS):
+                    separator = "" if i == 0 else ", "
+                    yield f"{separator}{json.dumps(component)}: ".encode("utf-8")
+                    start, end = body[component]
+                    for offset in range(start, end, CHUNK_SIZE):
+                        yield mapped[offset:min(offset + CHUNK_SIZE, end)]
+                yield b"}"
+
+        return generate()
+
+    @staticmethod
+    def open_body(file_path):
+        '''
+        Map <id>.json and read the index written with it. The file is
+        opened before the index is read, and opened again when the index
+        belongs to another write, which happens while a rerun replaces
+        them. Returns (index, mmap), or None if nothing is stored.
+        '''
+        for _ in range(OPEN_ATTEMPTS):
+            try:
+                file = open(file_path, "rb")
+            except FileNotFoundError:
+                if GraphFileStorage.get_index(file_path) is None:
+                    return None
+                continue
+            with file:
+                index = GraphFileStorage.get_index(file_path)
+                if index is None:
+                    return None
+                # indexes written before the stamp existed can't be checked
+                stamp = index["body"].get("stamp")
+                if stamp is None or stamp == GraphFileStorage.stamp(os.fstat(file.fileno())):
+                    return index, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return None
@@ -103,3 +103,51 @@ Each paragraph should address one of the following points:
 - Explain any notable relationships, including nodes that have a higher number of associated related nodes or complex processes.
 Addressed points in a separate paragraph, with clear and concise descriptions. Make sure not to use bullet points or numbered lists, but instead focus on delivering the content in paragraph form.
 """
+
+SUMMARY_PROMPT_REDUCE = """
+You are an expert biology assistant on summarizing graph data.
+
+The graph was too large to summarize at once, so each part of it was summarized separately.
+Given the following partial summaries:
+{partial_summaries}
+
+Given request used to fetch the graph data: \n{json_query}\n\n
+
+Given the graph statistics: \n{count_by_label}\n\n
+
+Your task is to merge the partial summaries into a single summary of the whole graph.
+Keep the key entities, identifiers and metrics mentioned in the partial summaries, combine repeated information and do not invent anything that is not in them.
+Addressed points in a separate paragraph, with clear and concise descriptions. Make sure not to use bullet points or numbered lists, but instead focus on delivering the content in paragraph form.
+"""
+
+SUMMARY_PROMPT_REDUCE_USER_QUERY = """
+## **System Instruction**  
+You are an intelligent assistant that answers questions using graph data. The graph was too large to read at once, so each part of it was answered separately. Merge the partial answers into a single answer to the user's question.
+
+### **Key Requirements**  
+1. Preserve all relevant key entities, synonyms, and properties from the partial answers
+2. Combine repeated information and do not invent anything that is not in the partial answers
+3. Ensure the response directly addresses the user's question without unnecessary information
+4. Respond in paragraph form, not bullet points or numbered lists or any markdown characters.
+
+---
+
+### **Input**
+
+#### **User Question**  
+`{user_query}`  
+
+### **Query Pattern(JSON)** // json query used to fetch the graph data
+```json
+{json_query}
+```
+
+### **Graph Statistics**
+{count_by_label}
+
+#### **Partial Answers**  
+{partial_summaries}
+"""
+
+# bump whenever a prompt above changes so cached summaries are regenerated
+PROMPT_VERSION = 1
@@ -2,15 +2,15 @@ from flask import (
     copy_current_request_context,
     request,
     jsonify,
-    Response,
     send_from_directory,
+    send_file,
 )
 import logging
 import json
 import os
 import threading
 from app import app, schema_manager, socketio, redis_client
-from app.lib import validate_request
+from app.lib import validate_request, is_node_only
 from flask_cors import CORS
 from flask_socketio import disconnect, join_room, send
 
@@ -18,11 +18,15 @@ from flask_socketio import disconnect, join_room, send
 from dotenv import load_dotenv
 from distutils.util import strtobool
 import datetime
-from app.lib import Graph, heuristic_sort
-from app.annotation_controller import handle_client_request, requery
-from app.constants import TaskStatus
-from app.workers.task_handler import get_annotation_redis
-from app.persistence import AnnotationStorageService
+from app.lib import Graph, heuristic_sort, json_response, stream_response
+from app.annotation_controller import handle_client_request, requery, invalidate_annotations
+from app.constants import TaskStatus, MAX_RESULT_ROWS
+from app.workers.task_handler import (
+    get_annotation_redis,
+    apply_row_budget,
+    apply_node_budget,
+)
+from app.persistence import AnnotationStorageService, GraphFileStorage
 from app.services.cypher_generator import CypherQueryGenerator
 from app.services.metta_generator import MeTTa_Query_Generator
 from app import config
@@ -39,6 +43,8 @@ logging.getLogger("flask_redis").setLevel(logging.CRITICAL)
 
 llm = app.config["llm_handler"]
 EXP = os.getenv("REDIS_EXPIRATION", 3600)  # expiration time of redis cache
+PAGE_LIMIT = 1000  # default page size of the paginated graph endpoints
+MAX_PAGE_LIMIT = 10000
 CORS(app)
 
 
@@ -48,7 +54,7 @@ def get_schema_list():
     response = {
         "schemas": schema_list,
     }
-    return Response(json.dumps(response, indent=4), mimetype="application/json")
+    return json_response(response)
 
 
 @app.route("/schema", methods=["GET"])
@@ -72,7 +78,7 @@ def get_schema():
                 "properties": edge["properties"],
             }
             response["edges"].append(edge_input)
-        return Response(json.dumps(response, indent=4), mimetype="application/json")
+        return json_response(response)
     except Exception as e:
         logging.error(f"Error fetching schema: {e}")
         return jsonify({"error": str(e)}), 500
@@ -153,7 +159,10 @@ def process_query():
 
         db_instance = app.config["db_instance"]
         # Generate the query code
-        query = db_instance.query_Generator(requests, node_map, limit)
+        query = db_instance.query_Generator(
+            requests, node_map, limit, node_only=is_node_only(requests),
+            properties=properties
+        )
 
         # Extract node types
         nodes = requests["nodes"]
@@ -164,7 +173,7 @@ def process_query():
 
         node_types = list(node_types)
 
-        return handle_client_request(query, requests, node_types)
+        return handle_client_request(query, requests, node_types, properties)
     except Exception as e:
         logging.error(f"Error processing query: {e}")
         return jsonify({"error": (e)}), 500
@@ -197,7 +206,7 @@ def process_source_history():
                 "updated_at": document["updated_at"].isoformat(),
             }
         )
-    return Response(json.dumps(return_value, indent=4), mimetype="application/json")
+    return json_response(return_value)
 
 
 @app.route("/annotation/<id>", methods=["GET"])
@@ -259,6 +268,12 @@ def get_by_id(id):
             response_data["edge_count_by_label"] = edge_count_by_label
         response_data["status"] = status
 
+        # serve completed results straight from the stored file
+        if status == TaskStatus.COMPLETE.value and file_path and os.path.exists(file_path):
+            stream = GraphFileStorage.stream(file_path, response_data)
+            if stream is not None:
+                return stream_response(stream)
+
         cache = redis_client.get(str(annotation_id))
 
         if cache is not None:
@@ -267,48 +282,144 @@ def get_by_id(id):
             if graph is not None:
                 response_data["nodes"] = graph["nodes"]
                 response_data["edges"] = graph["edges"]
+                response_data["truncated"] = graph.get("truncated", False)
 
-            return Response(
-                json.dumps(response_data, indent=4), mimetype="application/json"
-            )
+            return json_response(response_data)
 
         if status in [TaskStatus.PENDING.value, TaskStatus.COMPLETE.value]:
             if status == TaskStatus.COMPLETE.value:
-                if os.path.exists(file_path):
-                    # open the file and read the graph
-                    with open(file_path, "r") as file:
-                        graph = json.load(file)
-
-                    response_data["nodes"] = graph["nodes"]
-                    response_data["edges"] = graph["edges"]
-                else:
-                    response_data["status"] = TaskStatus.PENDING.value
-                    requery(annotation_id, query, json_request)
-            formatted_response = json.dumps(response_data, indent=4)
-            return Response(formatted_response, mimetype="application/json")
+                # the stored result is gone, run the query again
+                response_data["status"] = TaskStatus.PENDING.value
+                requery(annotation_id, query, json_request)
+            return json_response(response_data)
 
         db_instance = app.config["db_instance"]
+        # the stored query only carries the properties asked for when the
+        # annotation was created, build it again for the ones asked for now
+        node_map = validate_request(json_request, schema_manager.schema)
+        query = db_instance.query_Generator(
+            json_request, node_map, limit, node_only=is_node_only(json_request),
+            properties=properties
+        )[0]
         # Run the query and parse the results
-        result = db_instance.run_query(query)
+        result = db_instance.run_query(query, max_rows=MAX_RESULT_ROWS + 1)
+        result, truncated = apply_row_budget(result)
         graph_components = {"properties": properties}
-        response_data = db_instance.parse_and_serialize(
+        result_graph = db_instance.parse_and_serialize(
             result, schema_manager.schema, graph_components, result_type="graph"
         )
+        result_graph, sampled = apply_node_budget(result_graph)
         graph = Graph()
-        if len(response_data["edges"]) == 0:
-            response_data = graph.group_node_only(response_data, request)
+        if len(result_graph["edges"]) == 0:
+            grouped_graph = graph.group_node_only(result_graph, json_request)
         else:
-            grouped_graph = graph.group_graph(response_data)
+            grouped_graph = graph.group_graph(result_graph)
         response_data["nodes"] = grouped_graph["nodes"]
         response_data["edges"] = grouped_graph["edges"]
+        response_data["truncated"] = truncated or sampled
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype="application/json")
+        return json_response(response_data)
     except Exception as e:
         logging.error(f"Error processing query: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/annotation/<id>/graph", methods=["GET"])
+def get_graph_file_by_id(id):
+    cursor = AnnotationStorageService.get_by_id(id)
+
+    if cursor is None:
+        return jsonify("No value Found"), 404
+
+    if cursor.status != TaskStatus.COMPLETE.value:
+        return jsonify({"error": "Annotation is not complete yet"}), 409
+
+    file_path = cursor.path_url
+    if file_path is None or not os.path.exists(file_path):
+        return jsonify({"error": "No result found for this annotation"}), 404
+
+    # conditional responses give clients Range and ETag support
+    return send_file(file_path, mimetype="application/json", conditional=True)
+
+
+@app.route("/annotation/<id>/nodes", methods=["GET"], defaults={"component": "nodes"})
+@app.route("/annotation/<id>/edges", methods=["GET"], defaults={"component": "edges"})
+def get_page_by_id(id, component):
+    cursor = AnnotationStorageService.get_by_id(id)
+
+    if cursor is None:
+        return jsonify("No value Found"), 404
+
+    try:
+        position = int(request.args.get("cursor") or 0)
+        limit = int(request.args.get("limit") or PAGE_LIMIT)
+    except ValueError:
+        return (
+            jsonify({"error": "Invalid cursor or limit value. It should be an integer."}),
+            400,
+        )
+
+    if position < 0 or limit <= 0:
+        return jsonify({"error": "cursor and limit must be positive"}), 400
+    limit = min(limit, MAX_PAGE_LIMIT)
+
+    if cursor.status != TaskStatus.COMPLETE.value or cursor.path_url is None:
+        return jsonify({"error": "Annotation is not complete yet"}), 409
+
+    try:
+        page = GraphFileStorage.read_page(cursor.path_url, component, position, limit)
+
+        if page is None:
+            return jsonify({"error": "No result found for this annotation"}), 404
+
+        elements, next_cursor, total = page
+        response_data = {
+            "annotation_id": str(cursor.id),
+            component: elements,
+            "next_cursor": str(next_cursor) if next_cursor is not None else None,
+            "total": total,
+        }
+
+        return json_response(response_data)
+    except Exception as e:
+        logging.error(f"Error reading annotation {component}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/annotation/<id>/diff", methods=["GET"])
+def get_diff_by_id(id):
+    cursor = AnnotationStorageService.get_by_id(id)
+
+    if cursor is None:
+        return jsonify("No value Found"), 404
+
+    if cursor.status != TaskStatus.COMPLETE.value:
+        return jsonify({"error": "Annotation is not complete yet"}), 409
+
+    file_path = cursor.path_url
+    if file_path is None or not os.path.exists(file_path):
+        return jsonify({"error": "No result found for this annotation"}), 404
+
+    try:
+        with open(file_path, "r") as file:
+            new_graph = json.load(file)
+
+        prev_path = GraphFileStorage.prev_path(file_path)
+        if os.path.exists(prev_path):
+            with open(prev_path, "r") as file:
+                old_graph = json.load(file)
+        else:
+            old_graph = {"nodes": [], "edges": []}
+
+        response_data = {"annotation_id": str(cursor.id)}
+        response_data.update(Graph().diff(old_graph, new_graph))
+
+        return json_response(response_data)
+    except Exception as e:
+        logging.error(f"Error computing annotation diff: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/annotation/<id>", methods=["DELETE"])
 def delete_by_id(id):
     try:
@@ -329,8 +440,7 @@ def delete_by_id(id):
 
                 response_data = {"message": f"Annotation {id} has been cancelled."}
 
-                formatted_response = json.dumps(response_data, indent=4)
-                return Response(formatted_response, mimetype="application/json")
+                return json_response(response_data)
 
         # else delete the annotation from the db
         existing_record = AnnotationStorageService.get_by_id(id)
@@ -345,8 +455,7 @@ def delete_by_id(id):
 
         response_data = {"message": "Annotation deleted successfully"}
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype="application/json")
+        return json_response(response_data)
     except Exception as e:
         logging.error(f"Error deleting annotation: {e}")
         return jsonify({"error": str(e)}), 500
@@ -374,8 +483,7 @@ def update_title(id):
             "title": title,
         }
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype="application/json")
+        return json_response(response_data)
     except Exception as e:
         logging.error(f"Error updating title: {e}")
         return jsonify({"error": str(e)}), 500
@@ -420,8 +528,7 @@ def delete_many():
             "message": f"Out of {len(annotation_ids)}, {delete_count} were successfully deleted."
         }
 
-        formatted_response = json.dumps(response_data, indent=4)
-        return Response(formatted_response, mimetype="application/json")
+        return json_response(response_data)
     except Exception as e:
         logging.error(f"Error deleting annotations: {e}")
         return jsonify({"error": str(e)}), 500
@@ -451,26 +558,32 @@ def load_data():
 
         # load database config
         databases = {
-            "metta": lambda: MeTTa_Query_Generator(data_path),
-            "cypher": lambda: CypherQueryGenerator(data_path),
+            "metta": MeTTa_Query_Generator,
+            "cypher": CypherQueryGenerator,
             # Add other database instances here
         }
 
         database_type = config["database"][type]
-        db_instance = databases[database_type]()
+        db_instance = app.config.get("db_instance")
+        response = {
+            "message": "Schema loaded and data loaded successfully",
+        }
+
+        # append new output to the loaded dataset instead of loading it again
+        if data.get("incremental", False) and isinstance(db_instance, databases[database_type]) \
+                and db_instance.dataset_path == data_path:
+            symbols = db_instance.load_changes()
+            response["invalidated"] = invalidate_annotations(folder_id, symbols, db_instance)
+        else:
+            db_instance = databases[database_type](data_path)
 
         if type == 'cypher':
             db_instance.set_tenant_id(folder_id)
+            db_instance.set_schema(schema_manager.schema)
 
         app.config["db_instance"] = db_instance
 
-        response = {
-            "message": "Schema loaded and data loaded successfully",
-        }
-
-        formatted_response = json.dumps(response, indent=4)
-
-        return Response(formatted_response, mimetype="application/json")
+        return json_response(response)
     except Exception as e:
         logging.error(f"Error loading schema: {e}")
         return jsonify({"error": str(e)}), 500
@@ -484,7 +597,8 @@ def run_query_directly():
 
         db_instance = app.config["db_instance"]
 
-        result = db_instance.run_query(query)
+        result = db_instance.run_query(query, max_rows=MAX_RESULT_ROWS + 1)
+        result, truncated = apply_row_budget(result)
 
         parsed_query, result = db_instance.prepare_query_input(result, schema_manager.schema)
 
@@ -492,12 +606,11 @@ def run_query_directly():
 
         response = {
             "nodes": nodes,
-            "edges": edges
+            "edges": edges,
+            "truncated": truncated
         }
 
-        formatted_response = json.dumps(response, indent=4)
-
-        return Response(formatted_response, mimetype="application/json")
+        return json_response(response)
     except Exception as e:
         logging.error(f"Error running query: {e}")
         return jsonify({"error": str(e)}), 500
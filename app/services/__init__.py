@@ -3,4 +3,7 @@ from .metta_generator import MeTTa_Query_Generator
 from .query_generator_interface import QueryGeneratorInterface
 from .llm_models import OpenAIModel, GeminiModel
 from .graph_handler import Graph_Summarizer
-from .metta import Metta_Ground, metta_seralizer, recurssive_seralize
\ No newline at end of file
+from .metta import Metta_Ground, metta_seralizer, recurssive_seralize
+from .summary_cache import SummaryCache
+from .llm_transport import LLMTransport, get_transport
+from .title_batcher import TitleBatcher
@@ -1,13 +1,14 @@
 from typing import List
 import logging
 from dotenv import load_dotenv
-import neo4j
 from app.services.query_generator_interface import QueryGeneratorInterface
+from app.services.dataset_manifest import DatasetManifest, CYPHER_SYMBOL_PATTERN
 from neo4j import GraphDatabase
 import glob
 import os
 from neo4j.graph import Node, Relationship
 from app.error import ThreadStopException
+from app.constants import MAX_RESULT_ROWS
 import json
 
 load_dotenv()
@@ -16,6 +17,12 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# properties that are never sent back with a node
+EXCLUDED_PROPERTIES = frozenset(['id', 'synonyms'])
+# properties used as the display name when properties are turned off
+NAMED_TYPES = ('gene_name', 'transcript_name',
+               'protein_name', 'pathway_name', 'term_name')
+
 
 class CypherQueryGenerator(QueryGeneratorInterface):
     def __init__(self, dataset_path: str):
@@ -24,8 +31,13 @@ class CypherQueryGenerator(QueryGeneratorInterface):
             auth=(os.getenv('NEO4J_USERNAME'), os.getenv('NEO4J_PASSWORD'))
         )
         self.tenant_id = None
-        # self.dataset_path = dataset_path
+        self.schema = None
+        # return map projections instead of whole Node/Relationship objects
+        self.projection = True
+        self.dataset_path = dataset_path
         # self.load_dataset(self.dataset_path)
+        # built by the first incremental load, most instances never need one
+        self.manifest = None
 
     def close(self):
         self.driver.close()
@@ -33,6 +45,35 @@ class CypherQueryGenerator(QueryGeneratorInterface):
     def set_tenant_id(self, tenant_id):
         self.tenant_id = tenant_id
 
+    def set_schema(self, schema):
+        self.schema = schema
+
+    def dataset_files(self):
+        return sorted(glob.glob(os.path.join(self.dataset_path, "**/*.cypher"), recursive=True))
+
+    def load_changes(self):
+        '''
+        Compare the .cypher files of the dataset with the ones seen at the
+        previous incremental load and return the labels and relationship
+        types of the new statements, or None when a file was rewritten or
+        removed, or on the first incremental load, which has nothing to
+        compare with. The statements themselves are imported into Neo4j
+        outside the app.
+        '''
+        paths = self.dataset_files()
+        changes = self.manifest.diff(paths) if self.manifest is not None else None
+        self.manifest = DatasetManifest.build(paths)
+
+        if changes is None or changes["changed"] or changes["removed"]:
+            return None
+
+        symbols = set()
+        for path in changes["added"]:
+            symbols |= DatasetManifest.symbols(path, pattern=CYPHER_SYMBOL_PATTERN)
+        for path, offset in changes["appended"].items():
+            symbols |= DatasetManifest.symbols(path, offset, pattern=CYPHER_SYMBOL_PATTERN)
+        return symbols
+
     def load_dataset(self, path: str) -> None:
         if not os.path.exists(path):
             raise ValueError(f"Dataset path '{path}' does not exist.")
@@ -67,7 +108,7 @@ class CypherQueryGenerator(QueryGeneratorInterface):
         logger.info(
             f"Finished loading {len(nodes_paths)} nodes and {len(edges_paths)} edges datasets.")
 
-    def run_query(self, query_code, stop_event=None):
+    def run_query(self, query_code, stop_event=None, max_rows=None):
         results = []
 
         # use lazy loading for improved performance
@@ -76,10 +117,12 @@ class CypherQueryGenerator(QueryGeneratorInterface):
             for record in result:
                 if stop_event is not None and stop_event.is_set():
                     raise ThreadStopException('Query runner is stopped')
+                if max_rows is not None and len(results) >= max_rows:
+                    break
                 results.append(record)
         return results
 
-    def query_Generator(self, requests, node_map, limit=None, node_only=False):
+    def query_Generator(self, requests, node_map, limit=None, node_only=False, properties=True):
         nodes = requests['nodes']
         predicate_map = {}
 
@@ -108,23 +151,30 @@ class CypherQueryGenerator(QueryGeneratorInterface):
         where_no_preds = []
         node_ids = set()
         clause_list = []
+        predicate_vars = {}
 
         if not predicates:
             list_of_node_ids = []
+            # filters of each node, an optional match is filtered on its own
+            node_wheres = []
             # Case when there are no predicates
             for node in nodes:
                 var_name = f"{node['node_id']}"
                 match_no_preds.append(self.match_node(node, var_name))
-                if node['properties']:
-                    where_no_preds.extend(self.where_construct(node, var_name))
+                node_where = self.where_construct(node, var_name) if node['properties'] else []
+                where_no_preds.extend(node_where)
+                node_wheres.append(node_where)
                 return_no_preds.append(var_name)
                 list_of_node_ids.append(var_name)
+            return_projections = [
+                self.project_node(node_map[var], var, properties)
+                for var in return_no_preds]
             if node_only:
                 cypher_query = self.construct_optional_clause(
-                    match_no_preds, return_no_preds, where_no_preds, limit)
+                    match_no_preds, return_projections, node_wheres, limit)
             else:
                 cypher_query = self.construct_clause(
-                    match_no_preds, return_no_preds, where_no_preds, limit)
+                    match_no_preds, return_projections, where_no_preds, limit)
             cypher_queries.append(cypher_query)
             query_clauses = {
                 "match_no_preds": match_no_preds,
@@ -159,6 +209,7 @@ class CypherQueryGenerator(QueryGeneratorInterface):
                         self.where_construct(target_node, target_var))
 
                 return_preds.append(predicate_id)
+                predicate_vars[predicate_id] = (source_var, target_var)
                 node_ids.add(source_var)
                 node_ids.add(target_var)
 
@@ -174,10 +225,17 @@ class CypherQueryGenerator(QueryGeneratorInterface):
 
                 if i == len(predicates) - 1:
                     # Construct the RETURN clause
-                    return_clause = f"RETURN {', '.join(return_preds)}, {', '.join(node_ids)}"
+                    return_projections = [
+                        self.project_edge(pred_id, *predicate_vars[pred_id], properties)
+                        for pred_id in return_preds]
+                    return_projections.extend(
+                        self.project_node(node_map[var], var, properties)
+                        for var in node_ids)
+                    return_clause = f"RETURN {', '.join(return_projections)}"
 
                     # Combine all clauses into a single query
-                    clause_list.append(f"{match_clause} {where_clause} {return_clause}")
+                    clause_list.append(
+                        f"{match_clause} {where_clause} {return_clause} {self.limit_query(limit)}")
                 else:
                     with_clause = f"WITH {', '.join(return_preds)}, {', '.join(node_ids)}"
 
@@ -211,16 +269,16 @@ class CypherQueryGenerator(QueryGeneratorInterface):
             return f"{match_clause} {where_clause} {return_clause} {self.limit_query(limit)}"
         return f"{match_clause} {return_clause} {self.limit_query(limit)}"
 
-    def construct_optional_clause(self, match_clause, return_clause, where_no_preds, limit):
+    def construct_optional_clause(self, match_clause, return_clause, node_wheres, limit):
         optional_clause = ""
 
-        for match in match_clause:
+        # a WHERE only filters the OPTIONAL MATCH right before it
+        for match, where in zip(match_clause, node_wheres):
             optional_clause += f"OPTIONAL MATCH {match} "
+            if where:
+                optional_clause += f"WHERE {' AND '.join(where)} "
 
         return_clause = f"RETURN {', '.join(return_clause)}"
-        if len(where_no_preds) > 0:
-            where_clause = f"WHERE {' AND '.join(where_no_preds)}"
-            return f"{optional_clause} {where_clause} {return_clause} {self.limit_query(limit)}"
         return f"{optional_clause} {return_clause} {self.limit_query(limit)}"
 
     def construct_count_clause(self, query_clauses, node_map, predicate_map):
@@ -305,18 +363,54 @@ class CypherQueryGenerator(QueryGeneratorInterface):
 
         return [total_count, label_count_query]
 
+    def project_node(self, node, var_name, properties):
+        '''
+        Build a map projection that only carries the node id, its labels
+        and the properties that end up in the response, so large values
+        like synonyms never leave the database.
+        '''
+        if not self.projection:
+            return var_name
+
+        if properties:
+            # excluded keys are nulled out, the parser drops null fields
+            excluded = ', '.join(f"{key}: null" for key in sorted(EXCLUDED_PROPERTIES)
+                                 if key != 'id')
+            return f"{var_name} {{.*, {excluded}, _labels: labels({var_name})}}"
+
+        node_type = node['type']
+        schema_properties = None
+        if self.schema is not None and node_type in self.schema['nodes']:
+            schema_properties = self.schema['nodes'][node_type].get('properties')
+
+        named_types = [key for key in NAMED_TYPES
+                       if schema_properties and key in schema_properties]
+        named_types = named_types or NAMED_TYPES
+        name = ', '.join(f"{var_name}.{key}" for key in named_types)
+        return f"{var_name} {{.id, _labels: labels({var_name}), name: coalesce({name})}}"
+
+    def project_edge(self, predicate_id, source_var, target_var, properties):
+        if not self.projection:
+            return predicate_id
+
+        fields = [
+            f"_type: type({predicate_id})",
+            f"_source: [labels({source_var})[0], {source_var}.id]",
+            f"_target: [labels({target_var})[0], {target_var}.id]",
+        ]
+        if properties:
+            fields.insert(0, ".*")
+        return f"{predicate_id} {{{', '.join(fields)}}}"
+
     def limit_query(self, limit):
         '''
-        for now remove the limit from the backend
-        and handle it from the client side
+        Cap the result at the row budget. One row more than the budget is
+        requested so the runner can tell a truncated result apart from one
+        that fits exactly.
         '''
-        # if limit:
-            # curr_limit = min(1000, int(limit))
-        # else:
-            # curr_limit = 1000
         if limit:
-            return f"LIMIT {limit}"
-        return f""
+            return f"LIMIT {min(int(limit), MAX_RESULT_ROWS + 1)}"
+        return f"LIMIT {MAX_RESULT_ROWS + 1}"
 
     def match_node(self, node, var_name):
         if node['id']:
@@ -355,83 +449,154 @@ class CypherQueryGenerator(QueryGeneratorInterface):
     def convert_to_dict(self, results, schema, graph_components):
         graph_components['properties'] = True
         (_, _, node_dict, edge_dict, _) = self.process_result(
-            results, graph_components)
+            results, graph_components, 'graph')
         return (node_dict, edge_dict)
 
     def process_result_graph(self, results, graph_components):
-        node_dict = {}
+        nodes = []
+        edges = []
+        node_to_dict = {}
+        edge_to_dict = {}
+        # a result hydrates every node once, so a node is looked up by
+        # id() of its object and its label and id are only read once.
+        # Keys are kept as strings, which the garbage collector doesn't track.
+        node_ids = {}
+        seen_nodes = set()
         visited_relations = set()
+        properties = graph_components['properties']
+
+        for record in results:
+            for item in record.values():
+                if type(item) is Node:
+                    if id(item) in node_ids:
+                        continue
+                    node_id = node_ids[id(item)] = self.node_id(item)
+                    if node_id in seen_nodes:
+                        continue
+                    seen_nodes.add(node_id)
+                    label = node_id.partition(" ")[0]
+
+                    if properties:
+                        data = {"id": node_id, "type": label}
+                        data.update(item.items())
+                        data["id"] = node_id
+                        data.pop("synonyms", None)
+                        data.setdefault("name", node_id)
+                    else:
+                        keys = item.keys()
+                        name = next((item[key] for key in NAMED_TYPES if key in keys), node_id)
+                        data = {"id": node_id, "type": label, "name": name}
+
+                    node_data = {"data": data}
+                    nodes.append(node_data)
+                    node_to_dict.setdefault(label, []).append(node_data)
+                # relationship types are generated subclasses of Relationship
+                elif isinstance(item, Relationship):
+                    start_node, end_node = item.nodes
+                    source_id = node_ids.get(id(start_node)) or self.node_id(start_node)
+                    target_id = node_ids.get(id(end_node)) or self.node_id(end_node)
+                    edge_type = item.type
+                    relation_key = f"{source_id} - {edge_type} - {target_id}"
+                    if relation_key in visited_relations:
+                        continue
+                    visited_relations.add(relation_key)
+
+                    data = dict(item.items())
+                    if "source" in data:
+                        data["source_data"] = data.pop("source")
+                    data["edge_id"] = (f"{source_id.partition(' ')[0]}_{edge_type}_"
+                                       f"{target_id.partition(' ')[0]}")
+                    data["label"] = edge_type
+                    data["source"] = source_id
+                    data["target"] = target_id
+
+                    edge_data = {"data": data}
+                    edges.append(edge_data)
+                    edge_to_dict.setdefault(edge_type, []).append(edge_data)
+
+        return (nodes, edges, node_to_dict, edge_to_dict)
+
+    @staticmethod
+    def node_id(node):
+        return f"{next(iter(node.labels))} {node['id']}"
+
+    def process_projected_graph(self, results, graph_components):
+        '''
+        Parse rows produced by project_node/project_edge. Every non-null
+        field the query shipped is kept, nodes only keep their name when
+        properties are turned off.
+        '''
         nodes = []
         edges = []
-        node_dict = {}
         node_to_dict = {}
         edge_to_dict = {}
-        node_type = set()
-        edge_type = set()
+        seen_nodes = set()
+        visited_relations = set()
+        properties = graph_components['properties']
 
-        named_types = ['gene_name', 'transcript_name',
-                       'protein_name', 'pathway_name', 'term_name']
         for record in results:
             for item in record.values():
-                if isinstance(item, neo4j.graph.Node):
-                    node_id = f"{list(item.labels)[0]} {item['id']}"
-                    if node_id not in node_dict:
-                        node_data = {
-                            "data": {
-                                "id": node_id,
-                                "type": list(item.labels)[0],
-                            }
-                        }
-
-                        for key, value in item.items():
-                            if graph_components['properties']:
-                                if key != "id" and key != "synonyms":
-                                    node_data["data"][key] = value
-                            else:
-                                if key in named_types:
-                                    node_data["data"]["name"] = value
-                        if "name" not in node_data["data"]:
-                            node_data["data"]["name"] = node_id
-                        nodes.append(node_data)
-                        if node_data["data"]["type"] not in node_type:
-                            node_type.add(node_data["data"]["type"])
-                            node_to_dict[node_data['data']['type']] = []
-                        node_to_dict[node_data['data']
-                                     ['type']].append(node_data)
-                        node_dict[node_id] = node_data
-                elif isinstance(item, neo4j.graph.Relationship):
-                    source_label = list(item.start_node.labels)[0]
-                    target_label = list(item.end_node.labels)[0]
-                    source_id = f"{list(item.start_node.labels)[0]} {item.start_node['id']}"
-                    target_id = f"{list(item.end_node.labels)[0]} {item.end_node['id']}"
-                    edge_data = {
-                        "data": {
-                            # "id": item.id,
-                            "edge_id": f"{source_label}_{item.type}_{target_label}",
-                            "label": item.type,
-                            "source": source_id,
-                            "target": target_id,
-                        }
-                    }
-                    temp_relation_id = f"{source_id} - {item.type} - {target_id}"
-                    if temp_relation_id in visited_relations:
+                if item is None:
+                    continue
+                if '_type' in item:
+                    source_label, source_key = item['_source']
+                    target_label, target_key = item['_target']
+                    label = item['_type']
+                    source_id = f"{source_label} {source_key}"
+                    target_id = f"{target_label} {target_key}"
+                    relation_key = (source_id, label, target_id)
+                    if relation_key in visited_relations:
                         continue
-                    visited_relations.add(temp_relation_id)
+                    visited_relations.add(relation_key)
 
+                    data = {
+                        "edge_id": f"{source_label}_{label}_{target_label}",
+                        "label": label,
+                        "source": source_id,
+                        "target": target_id,
+                    }
                     for key, value in item.items():
+                        if key[0] == '_':
+                            continue
                         if key == 'source':
-                            edge_data["data"]["source_data"] = value
+                            data["source_data"] = value
                         else:
-                            edge_data["data"][key] = value
+                            data[key] = value
+
+                    edge_data = {"data": data}
                     edges.append(edge_data)
-                    if edge_data["data"]["label"] not in edge_type:
-                        edge_type.add(edge_data["data"]["label"])
-                        edge_to_dict[edge_data['data']['label']] = []
-                    edge_to_dict[edge_data['data']
-                                 ['label']].append(edge_data)
+                    edge_to_dict.setdefault(label, []).append(edge_data)
+                else:
+                    label = item['_labels'][0]
+                    node_id = f"{label} {item['id']}"
+                    if node_id in seen_nodes:
+                        continue
+                    seen_nodes.add(node_id)
+
+                    data = {"id": node_id, "type": label}
+                    for key, value in item.items():
+                        if value is None or key == 'id' or key[0] == '_':
+                            continue
+                        if properties:
+                            data[key] = value
+                        elif key == 'name' or key in NAMED_TYPES:
+                            data["name"] = value
+                    if "name" not in data:
+                        data["name"] = node_id
+
+                    node_data = {"data": data}
+                    nodes.append(node_data)
+                    node_to_dict.setdefault(label, []).append(node_data)
 
         return (nodes, edges, node_to_dict, edge_to_dict)
 
+    def is_projected_result(self, results):
+        for record in results:
+            for item in record.values():
+                if item is not None:
+                    return isinstance(item, dict)
+        return False
+
     def process_result_count(self, node_and_edge_count, count_by_label, graph_components):
         node_count_by_label = []
         edge_count_by_label = []
@@ -502,8 +667,12 @@ class CypherQueryGenerator(QueryGeneratorInterface):
             count_by_label = results[1]
 
         if result_type == 'graph':
-            nodes, edges, node_to_dict, edge_to_dict = self.process_result_graph(
-                match_result, graph_components)
+            if self.is_projected_result(match_result):
+                nodes, edges, node_to_dict, edge_to_dict = self.process_projected_graph(
+                    match_result, graph_components)
+            else:
+                nodes, edges, node_to_dict, edge_to_dict = self.process_result_graph(
+                    match_result, graph_components)
 
         if result_type == 'count':
             meta_data = self.process_result_count(
@@ -0,0 +1,95 @@
+import hashlib
+import mmap
+import os
+import re
+
+# bytes hashed at the start and at the end of every file
+MANIFEST_SAMPLE = 64 * 1024
+
+# (gene ensg1) -> gene, (gene_name (gene ensg1) TP53) -> gene_name gene
+METTA_SYMBOL_PATTERN = re.compile(rb'^\(([^\s()]+)(?: \(([^\s()]+))?', re.MULTILINE)
+# labels and relationship types, (n:gene {...}) or [:transcribed_to]
+CYPHER_SYMBOL_PATTERN = re.compile(rb':`?([A-Za-z_][\w]*)')
+
+
+class DatasetManifest:
+    '''
+    Size and sampled digests of the files of a dataset, used to tell
+    which files were added, appended to, rewritten or removed since it
+    was taken.
+
+    Only the first and the last MANIFEST_SAMPLE bytes of a file are
+    hashed, so a manifest costs two small reads per file whatever the
+    dataset size. A file is appended to when it grew and the bytes it
+    had at those two places are unchanged.
+    '''
+
+    def __init__(self, entries):
+        self.entries = entries  # path -> (size, head digest, tail digest)
+
+    @staticmethod
+    def digest(file, start, end):
+        file.seek(start)
+        return hashlib.blake2b(file.read(end - start), digest_size=16).hexdigest()
+
+    @classmethod
+    def entry(cls, path, size=None):
+        '''The entry of the first size bytes of a file, all of it by default.'''
+        if size is None:
+            size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            head = cls.digest(file, 0, min(size, MANIFEST_SAMPLE))
+            tail = cls.digest(file, max(0, size - MANIFEST_SAMPLE), size)
+        return (size, head, tail)
+
+    @classmethod
+    def build(cls, paths):
+        return cls({path: cls.entry(path) for path in paths})
+
+    def diff(self, paths):
+        '''
+        Compare the manifest with the files at paths. Returns a dict with
+        the "added", "changed" and "removed" paths, and the "appended"
+        paths mapped to the offset their new content starts at.
+        '''
+        changes = {"added": [], "appended": {}, "changed": [], "removed": []}
+
+        for path in paths:
+            entry = self.entries.get(path)
+            if entry is None:
+                changes["added"].append(path)
+                continue
+            size = os.path.getsize(path)
+            if size == entry[0]:
+                if self.entry(path) != entry:
+                    changes["changed"].append(path)
+            elif size > entry[0] and self.entry(path, entry[0]) == entry \
+                    and self.starts_line(path, entry[0]):
+                changes["appended"][path] = entry[0]
+            else:
+                changes["changed"].append(path)
+
+        changes["removed"] = sorted(set(self.entries) - set(paths))
+        return changes
+
+    @staticmethod
+    def starts_line(path, offset):
+        # text added to the last line of a file changes an existing atom
+        if offset == 0:
+            return True
+        with open(path, "rb") as file:
+            file.seek(offset - 1)
+            before, after = file.read(2)
+        return before in b"\r\n" or after in b"\r\n"
+
+    @staticmethod
+    def symbols(path, offset=0, pattern=METTA_SYMBOL_PATTERN):
+        '''The symbols of a file from offset on, node types, predicates and property names.'''
+        symbols = set()
+        if os.path.getsize(path) <= offset:
+            return symbols
+        with open(path, "rb") as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for match in pattern.finditer(mapped, offset):
+                symbols.update(group.decode("utf-8") for group in match.groups() if group)
+        return symbols
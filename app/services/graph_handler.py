@@ -1,10 +1,57 @@
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+import os
 import re
+import threading
+import time
 import traceback
 import json
 import tiktoken
-from app.prompts.summarizer_prompts import SUMMARY_PROMPT, SUMMARY_PROMPT_BASED_ON_USER_QUERY, SUMMARY_PROMPT_CHUNKING, SUMMARY_PROMPT_CHUNKING_USER_QUERY
+from app.prompts.summarizer_prompts import SUMMARY_PROMPT, SUMMARY_PROMPT_BASED_ON_USER_QUERY, SUMMARY_PROMPT_CHUNKING, SUMMARY_PROMPT_CHUNKING_USER_QUERY, SUMMARY_PROMPT_REDUCE, SUMMARY_PROMPT_REDUCE_USER_QUERY
+
+# refine: one batch after the other, each prompt carries the previous summary
+# map_reduce: summarize batches concurrently then merge the partial summaries
+SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'refine').lower()
+SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', 4))
+SUMMARY_RATE_LIMIT = float(os.getenv('SUMMARY_RATE_LIMIT', 0))  # LLM calls per second, 0 disables it
+REDUCE_FAN_IN = 4  # partial summaries merged by a single reduce call
+# tokens of graph description sent to the LLM in total, descriptions past it are not built
+SUMMARY_TOKEN_BUDGET = int(os.getenv('SUMMARY_TOKEN_BUDGET', 200000))
+# member nodes described for a grouped node
+GROUP_SAMPLE_SIZE = int(os.getenv('SUMMARY_GROUP_SAMPLE_SIZE', 5))
+ENCODE_BATCH_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name):
+    return tiktoken.get_encoding(encoding_name)
+
+
+class RateLimiter:
+    '''
+    Spaces out calls so that at most `rate` calls per second start, shared by every thread.
+    '''
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.lock = threading.Lock()
+        self.next_call = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+rate_limiter = RateLimiter(SUMMARY_RATE_LIMIT)
 
 
 class Graph_Summarizer:
@@ -20,7 +67,7 @@ class Graph_Summarizer:
             self.max_token = 2000
         elif self.llm.__class__.__name__ == 'OpenAIModel':
             self.max_token = 100000
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = get_encoding("cl100k_base")
 
     def clean_and_format_response(self, desc):
         desc = desc.strip()
@@ -50,8 +97,18 @@ class Graph_Summarizer:
         desc_parts = []
 
         for key, value in node.items():
+            # Grouped nodes carry every member, describe an evenly spaced sample of them
+            if key == 'nodes' and isinstance(value, list):
+                step = max(1, len(value) // GROUP_SAMPLE_SIZE)
+                members = [self.generate_node_description(member)
+                           for member in value[::step][:GROUP_SAMPLE_SIZE]]
+                remaining = len(value) - len(members)
+                more = f" and {remaining} more" if remaining > 0 else ""
+                desc_parts.append(f"Nodes: {'; '.join(members)}{more}")
+                continue
+
             # Attempt to parse JSON-like strings into lists
-            if isinstance(value, str):
+            if isinstance(value, str) and value.startswith('['):
                 try:
                     parsed_value = json.loads(value)
                     if isinstance(parsed_value, list):
@@ -59,7 +116,7 @@ class Graph_Summarizer:
                         top_items = parsed_value[:3]
                         if top_items:
                             desc_parts.append(
-                                f"{key.capitalize()}: {', '.join(top_items)}")
+                                f"{key.capitalize()}: {', '.join(map(str, top_items))}")
                         continue  # Move to the next attribute after processing
                 except json.JSONDecodeError:
                     pass  # If not a JSON string, treat it as a regular string
@@ -68,9 +125,9 @@ class Graph_Summarizer:
             desc_parts.append(f"{key.capitalize()}: {value}")
         return " | ".join(desc_parts)
 
-    def generate_grouped_descriptions(self, edges, nodes, batch_size=50):
+    def generate_grouped_descriptions(self, edges, nodes):
+        """Yield one description per source node, lazily so generation stops with the token budget."""
         grouped_edges = self.group_edges_by_source(edges)
-        descriptions = []
 
         # Process each source node and its related target nodes
         for source_node_id, related_edges in grouped_edges.items():
@@ -92,40 +149,45 @@ class Graph_Summarizer:
             # Combine the source node description with all target node descriptions
             source_and_targets = (f"Source Node ({source_node_id}): {source_desc}\n" +
                                   "\n".join(target_descriptions))
-            descriptions.append(source_and_targets)
-
-            # If batch processing is required, we can break or yield after each batch
-            # if len(descriptions) >= batch_size:
-            #   break   Process the next batch in another iteration
-
-        return descriptions
+            yield source_and_targets
 
     def nodes_description(self, nodes):
-        nodes_descriptions = []
-        for source_node_id in nodes:
-            source_node = nodes.get(source_node_id, {})
-            source_desc = self.generate_node_description(source_node)
-            nodes_descriptions.append(source_desc)
-        return nodes_descriptions
+        for node in nodes.values():
+            yield self.generate_node_description(node)
 
-    def num_tokens_from_string(self, encoding_name: str):
-        """Calculates the number of tokens in each description and groups them into batches under a token limit."""
-        encoding = tiktoken.get_encoding(encoding_name)
+    def batch_descriptions(self, descriptions):
+        """
+        Group descriptions into batches of at most max_token tokens. Descriptions
+        are encoded ENCODE_BATCH_SIZE at a time and consumed until
+        SUMMARY_TOKEN_BUDGET is spent, the rest are never generated.
+        """
+        batches = []
+        current_batch = []
         accumulated_tokens = 0
-        grouped_batched_descriptions = []
-        self.current_batch = []
-        for i, desc in enumerate(self.description):
-            desc_tokens = len(encoding.encode(desc))
-            if accumulated_tokens + desc_tokens <= self.max_token:
-                self.current_batch.append(desc)
-                accumulated_tokens += desc_tokens
-            else:
-                grouped_batched_descriptions.append(self.current_batch)
-                self.current_batch = [desc]
-                accumulated_tokens = desc_tokens
-        if self.current_batch:
-            grouped_batched_descriptions.append(self.current_batch)
-        return grouped_batched_descriptions
+        total_tokens = 0
+
+        descriptions = iter(descriptions)
+        for chunk in iter(lambda: list(islice(descriptions, ENCODE_BATCH_SIZE)), []):
+            for desc, tokens in zip(chunk, self.tokenizer.encode_ordinary_batch(chunk)):
+                desc_tokens = len(tokens)
+                total_tokens += desc_tokens
+                if total_tokens > SUMMARY_TOKEN_BUDGET:
+                    if current_batch:
+                        batches.append(current_batch)
+                    return batches
+
+                if accumulated_tokens + desc_tokens <= self.max_token:
+                    current_batch.append(desc)
+                    accumulated_tokens += desc_tokens
+                else:
+                    if current_batch:
+                        batches.append(current_batch)
+                    current_batch = [desc]
+                    accumulated_tokens = desc_tokens
+
+        if current_batch:
+            batches.append(current_batch)
+        return batches
 
     def graph_description(self, graph):
         nodes = {node['data']['id']: node['data'] for node in graph['nodes']}
@@ -135,15 +197,66 @@ class Graph_Summarizer:
             edges = [{'source': edge['data']['source'],
                       'target': edge['data']['target'],
                       'label': edge['data']['label']} for edge in graph['edges']]
-            self.description = self.generate_grouped_descriptions(
-                edges, nodes, batch_size=10)
-            self.descriptions = self.num_tokens_from_string("cl100k_base")
+            self.descriptions = self.batch_descriptions(
+                self.generate_grouped_descriptions(edges, nodes))
         else:
-            self.descriptions = self.nodes_description(nodes)
+            self.descriptions = self.batch_descriptions(self.nodes_description(nodes))
 
         return self.descriptions
 
-    def summary(self,graph, request, user_query=None,graph_id=None, summary=None):
+    def generate(self, prompt, on_token=None):
+        rate_limiter.wait()
+        if on_token is None:
+            return self.llm.generate(prompt)
+
+        # stream the answer, handing every piece to on_token as it arrives
+        chunks = []
+        for chunk in self.llm.generate_stream(prompt):
+            chunks.append(chunk)
+            on_token(chunk)
+        return self.llm.parse_response("".join(chunks))
+
+    def map_prompt(self, batch, request, user_query, count_by_label):
+        if user_query:
+            return SUMMARY_PROMPT_BASED_ON_USER_QUERY.format(description=batch, user_query=user_query, prev_summery='', json_query=request, count_by_label=count_by_label)
+        return SUMMARY_PROMPT.format(description=batch, json_query=request)
+
+    def reduce_prompt(self, partials, request, user_query, count_by_label):
+        partial_summaries = "\n\n".join(
+            f"Part {i + 1}:\n{partial}" for i, partial in enumerate(partials))
+        if user_query:
+            return SUMMARY_PROMPT_REDUCE_USER_QUERY.format(partial_summaries=partial_summaries, user_query=user_query, json_query=request, count_by_label=count_by_label)
+        return SUMMARY_PROMPT_REDUCE.format(partial_summaries=partial_summaries, json_query=request, count_by_label=count_by_label)
+
+    def map_reduce_summary(self, request, user_query, count_by_label, on_token=None):
+        '''
+        Summarize every batch concurrently, then merge the partial summaries
+        REDUCE_FAN_IN at a time until a single summary is left. Only the
+        call producing the final summary is streamed to on_token.
+        '''
+        def reduce(partials, on_token=None):
+            return self.generate(self.reduce_prompt(partials, request, user_query, count_by_label), on_token)
+
+        with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+            prompts = [self.map_prompt(batch, request, user_query, count_by_label)
+                       for batch in self.descriptions]
+            if len(prompts) == 1:
+                partials = [self.generate(prompts[0], on_token)]
+            else:
+                partials = list(executor.map(self.generate, prompts))
+
+            while len(partials) > 1:
+                groups = [partials[i:i + REDUCE_FAN_IN]
+                          for i in range(0, len(partials), REDUCE_FAN_IN)]
+                if len(groups) == 1:
+                    partials = [reduce(groups[0], on_token)]
+                else:
+                    partials = list(executor.map(reduce, groups))
+
+        return partials[0] if partials else None
+
+    def summary(self,graph, request, user_query=None,graph_id=None, summary=None, mode=None, on_token=None):
+        mode = mode or SUMMARY_MODE
         prev_summery=[]
         response = None
         try:
@@ -162,6 +275,8 @@ class Graph_Summarizer:
                 prev_summery = []
                 self.graph_description(graph)
                 count_by_label  = [graph['node_count_by_label'], graph['edge_count_by_label']]
+                if mode == 'map_reduce':
+                    return self.map_reduce_summary(request, user_query, count_by_label, on_token)
                 for i, batch in enumerate(self.descriptions):  
                     if prev_summery:
                         if user_query:
@@ -173,7 +288,9 @@ class Graph_Summarizer:
                             prompt = SUMMARY_PROMPT_BASED_ON_USER_QUERY.format(description=batch,user_query=user_query, prev_summery='',json_query=request, count_by_label=count_by_label)
                         else:
                             prompt = SUMMARY_PROMPT.format(description=batch, json_query=request)
-                    response = self.llm.generate(prompt)
+                    # only the last batch produces the summary the client keeps
+                    is_last = i == len(self.descriptions) - 1
+                    response = self.generate(prompt, on_token if is_last else None)
                     prev_summery = [response]
                 # cleaned_desc = self.clean_and_format_response(response)
                 return response
@@ -27,7 +27,20 @@ class LLMHandler:
         title = self.model.generate(prompt)
         return title
 
-    def generate_summary(self, graph, request, user_query=None,graph_id=None, summary=None):
+    def generate_titles(self, queries):
+        """Generate one title per query with a single call, raises ValueError if the answer does not line up."""
+        numbered = "\n".join(f"{i + 1}. {query}" for i, query in enumerate(queries))
+        prompt = f'''From each of these queries generate approperiate title. Only give the title sentences don't add any prefix.
+                     Answer with a JSON array of {len(queries)} strings, one title per query in the same order.
+                     Queries:
+                     {numbered}'''
+        titles = self.model.generate(prompt)
+        if not isinstance(titles, list) or len(titles) != len(queries) \
+                or not all(isinstance(title, str) for title in titles):
+            raise ValueError("Batched titles do not match the queries")
+        return titles
+
+    def generate_summary(self, graph, request, user_query=None,graph_id=None, summary=None, on_token=None):
         summarizer = Graph_Summarizer(self.model)
-        summary = summarizer.summary(graph, request, user_query, graph_id, summary)
+        summary = summarizer.summary(graph, request, user_query, graph_id, summary, on_token=on_token)
         return summary
@@ -1,22 +1,43 @@
 import json
-from typing import Any, Dict
-import requests
+import os
+from contextlib import closing
+from typing import Any, Dict, Iterator
 import openai
+from app.services.llm_transport import get_transport, LLM_MAX_RETRIES
+
+GEMINI_API_URL = os.getenv(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent")
 
 class LLMInterface:
     def generate(self, prompt: str) -> Dict[str, Any]:
         raise NotImplementedError("Subclasses must implement the generate method")
 
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """Yield the response text as it arrives. Models without streaming yield it whole."""
+        response = self.generate(prompt)
+        yield response if isinstance(response, str) else json.dumps(response)
+
+    def parse_response(self, content: str) -> Dict[str, Any]:
+        """Parse streamed text the same way generate parses a full response."""
+        json_content = self._extract_json_from_codeblock(content)
+        try:
+            return json.loads(json_content)
+        except json.JSONDecodeError:
+            return json_content
+
+    def _extract_json_from_codeblock(self, content: str) -> str:
+        return content
+
 class GeminiModel(LLMInterface):
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, api_url: str = GEMINI_API_URL):
         self.api_key = api_key
-        self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-    
-    def generate(self, prompt: str) -> Dict[str, Any]:
-        headers = {
-            "Content-Type": "application/json"
-        }
-        data = {
+        self.api_url = api_url
+        self.stream_url = api_url.replace(":generateContent", ":streamGenerateContent")
+        self.transport = get_transport("gemini")
+
+    def request_body(self, prompt: str) -> Dict[str, Any]:
+        return {
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {
                 "temperature": 0,
@@ -24,8 +45,18 @@ class GeminiModel(LLMInterface):
                 "topP": 1
             }
         }
-        response = requests.post(f"{self.api_url}?key={self.api_key}", headers=headers, json=data)
-        response.raise_for_status()
+    
+    def headers(self) -> Dict[str, str]:
+        # the key goes in a header, request URLs end up in the httpx logs
+        return {
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.api_key
+        }
+    
+    def generate(self, prompt: str) -> Dict[str, Any]:
+        response = self.transport.post(self.api_url, headers=self.headers(),
+                                       json=self.request_body(prompt),
+                                       tokens=self.transport.estimate_tokens(prompt))
 
         content = response.json()['candidates'][0]['content']['parts'][0]['text']
     
@@ -35,6 +66,21 @@ class GeminiModel(LLMInterface):
         except json.JSONDecodeError:
             return json_content
 
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        # server sent events, every "data:" line is a partial GenerateContentResponse
+        lines = self.transport.stream(f"{self.stream_url}?alt=sse",
+                                      headers=self.headers(),
+                                      json=self.request_body(prompt),
+                                      tokens=self.transport.estimate_tokens(prompt))
+        for line in lines:
+            if not line.startswith("data:"):
+                continue
+            chunk = json.loads(line[len("data:"):])
+            for candidate in chunk.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
     def _extract_json_from_codeblock(self, content: str) -> str:
         start = content.find("```json")
         end = content.rfind("```")
@@ -46,18 +92,23 @@ class GeminiModel(LLMInterface):
 
 
 class OpenAIModel(LLMInterface):
-    def __init__(self, api_key: str, model_name: str = "gpt-4o-mini"):
+    def __init__(self, api_key: str, model_name: str = "gpt-4o-mini", base_url: str = None):
         self.api_key = api_key
         self.model_name = model_name
-        openai.api_key = self.api_key
+        self.transport = get_transport("openai")
+        # the SDK retries 429/5xx with jittered backoff itself, it only needs the pooled client
+        self.client = openai.OpenAI(api_key=self.api_key, base_url=base_url,
+                                    http_client=self.transport.client,
+                                    timeout=self.transport.timeout,
+                                    max_retries=LLM_MAX_RETRIES)
     
     def generate(self, prompt: str) -> Dict[str, Any]:
-        response = openai.chat.completions.create(
+        response = self.transport.call(lambda: self.client.chat.completions.create(
             model=self.model_name,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
             max_tokens=1000
-        )
+        ), tokens=self.transport.estimate_tokens(prompt) + 1000)
         content = response.choices[0].message.content
         
         json_content = self._extract_json_from_codeblock(content)
@@ -66,6 +117,19 @@ class OpenAIModel(LLMInterface):
         except json.JSONDecodeError:
             return json_content
 
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        chunks = self.transport.call_stream(lambda: self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=1000,
+            stream=True
+        ), tokens=self.transport.estimate_tokens(prompt) + 1000)
+        with closing(chunks):
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
     def _extract_json_from_codeblock(self, content: str) -> str:
         start = content.find("```json")
         end = content.rfind("```")
@@ -0,0 +1,173 @@
+import os
+import random
+import threading
+import time
+import logging
+import httpx
+
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 120))  # seconds to wait for a response
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 10))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+LLM_BACKOFF = float(os.getenv('LLM_BACKOFF', 1))  # base of the exponential backoff in seconds
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenRateLimiter:
+    '''
+    Token bucket refilled at `tokens_per_minute`, shared by every thread
+    calling the same provider. A rate of 0 disables it.
+    '''
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens):
+        if not self.capacity:
+            return
+        # a single call larger than the bucket only waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class LLMTransport:
+    '''
+    Pooled HTTP client for one LLM provider.
+
+    Keeps connections alive between calls, bounds every call with a
+    connect and read timeout, retries 429/5xx responses and network errors
+    with jittered exponential backoff, and limits the number of calls in
+    flight and the tokens sent per minute.
+    '''
+
+    def __init__(self, provider, max_concurrency=8, tokens_per_minute=0,
+                 timeout=LLM_TIMEOUT, connect_timeout=LLM_CONNECT_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_BACKOFF):
+        self.provider = provider
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.client = httpx.Client(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max_concurrency,
+                                max_keepalive_connections=max_concurrency),
+        )
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = TokenRateLimiter(tokens_per_minute)
+
+    @staticmethod
+    def estimate_tokens(text):
+        # close enough for rate limiting without loading a tokenizer
+        return len(text) // 4 + 1
+
+    def backoff_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        # full jitter keeps concurrent retries from hitting the provider together
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def post(self, url, tokens=0, **kwargs):
+        self.rate_limiter.acquire(tokens)
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                with self.semaphore:
+                    response = self.client.post(url, **kwargs)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("%s request failed: %s", self.provider, e)
+
+            delay = self.backoff_delay(attempt, response)
+            logging.warning("%s request retry %s in %.2fs", self.provider, attempt + 1, delay)
+            time.sleep(delay)
+
+    def stream(self, url, tokens=0, **kwargs):
+        '''
+        Yield the lines of a streamed POST response. Retries only happen
+        before the first line, a stream that breaks halfway raises.
+        '''
+        self.rate_limiter.acquire(tokens)
+
+        for attempt in range(self.max_retries + 1):
+            retry_response = None
+            try:
+                with self.semaphore, self.client.stream("POST", url, **kwargs) as response:
+                    if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                        response.read()
+                        retry_response = response
+                    else:
+                        if response.is_error:
+                            response.read()
+                        response.raise_for_status()
+                        yield from response.iter_lines()
+                        return
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("%s request failed: %s", self.provider, e)
+
+            delay = self.backoff_delay(attempt, retry_response)
+            logging.warning("%s request retry %s in %.2fs", self.provider, attempt + 1, delay)
+            time.sleep(delay)
+
+    def call(self, fn, tokens=0):
+        '''Run a call made through a provider SDK under the same limits.'''
+        self.rate_limiter.acquire(tokens)
+        with self.semaphore:
+            return fn()
+
+    def call_stream(self, fn, tokens=0):
+        '''
+        Yield the items of a stream opened through a provider SDK. The call
+        keeps its slot until the stream is exhausted or closed.
+        '''
+        self.rate_limiter.acquire(tokens)
+        with self.semaphore:
+            stream = fn()
+            with stream:
+                yield from stream
+
+
+transports = {}
+transports_lock = threading.Lock()
+
+
+def get_transport(provider):
+    '''
+    Return the shared transport of a provider. Limits are read from
+    <PROVIDER>_MAX_CONCURRENCY and <PROVIDER>_TOKENS_PER_MINUTE, falling back
+    to LLM_MAX_CONCURRENCY and LLM_TOKENS_PER_MINUTE.
+    '''
+    with transports_lock:
+        if provider not in transports:
+            prefix = provider.upper()
+            max_concurrency = int(os.getenv(f'{prefix}_MAX_CONCURRENCY',
+                                            os.getenv('LLM_MAX_CONCURRENCY', 8)))
+            tokens_per_minute = int(os.getenv(f'{prefix}_TOKENS_PER_MINUTE',
+                                              os.getenv('LLM_TOKENS_PER_MINUTE', 0)))
+            transports[provider] = LLMTransport(provider, max_concurrency, tokens_per_minute)
+        return transports[provider]
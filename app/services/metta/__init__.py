@@ -1,2 +1,6 @@
 from .metta_ground import Metta_Ground
-from .metta_seralizer import metta_seralizer, recurssive_seralize
\ No newline at end of file
+from .metta_seralizer import metta_seralizer, recurssive_seralize, iter_tuples, iter_graph_elements
+from .dataset_snapshot import DatasetSnapshot
+from .metta_dataset import MettaDataset
+from .property_index import PropertyIndex
+from .metta_worker import MettaWorkerPool
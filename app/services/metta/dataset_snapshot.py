@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+
+SNAPSHOT_VERSION = 2
+# where snapshots are written, next to the dataset when unset
+METTA_SNAPSHOT_DIR = os.getenv('METTA_SNAPSHOT_DIR')
+
+# head symbol of every atom that starts a line, "(gene_name (gene ensg1) TP53)" -> gene_name
+HEAD_PATTERN = re.compile(rb'^\(([^\s()]+)', re.MULTILINE)
+# a line that does not open an atom with a symbol head: indented, continued,
+# "((" or not an atom at all
+OTHER_LINE_PATTERN = re.compile(rb'^(?:[^(\r\n]|\([\s()])', re.MULTILINE)
+# a pair of parentheses holding only pairs, collapsed one level per pass
+NESTED_PAIRS_PATTERN = re.compile(rb'\((?:\(\))+\)')
+# strings, comments and parentheses, "(" with the symbol that follows it
+TOKEN_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*"|;[^\n]*|\(\s*([^\s()";]*)|\)|[^\s()";]+')
+# bytes checked at once by lines_are_atoms, cut back to a line end
+SCAN_BLOCK = 64 * 1024 * 1024
+# every byte but parentheses and line feeds
+DELETED_BYTES = bytes(byte for byte in range(256) if byte not in b"()\n")
+
+
+class DatasetSnapshot:
+    '''
+    Index of a MeTTa dataset folder, versioned by a hash of its files.
+
+    For every .metta file it records the head symbols of the atoms it
+    holds (node types, property names and predicates for BioCypher
+    output), so a query only needs the files whose heads it mentions
+    loaded into the space. Files with no atom heads, or with top level
+    content other than atoms headed by a symbol, are marked eager and
+    always loaded. The index is written to <snapshot dir>/<dataset
+    hash>.json after the first scan and read back on later starts.
+    '''
+
+    def __init__(self, dataset_hash, files):
+        self.dataset_hash = dataset_hash
+        self.files = files  # path -> list of heads, None for eager files
+        self.by_head = {}
+        for path, heads in files.items():
+            for head in heads or []:
+                self.by_head.setdefault(head, []).append(path)
+
+    @property
+    def eager_files(self):
+        return [path for path, heads in self.files.items() if heads is None]
+
+    def files_for(self, symbols):
+        paths = set()
+        for symbol in symbols:
+            paths.update(self.by_head.get(symbol, []))
+        return paths
+
+    @staticmethod
+    def dataset_hash(signature):
+        key = json.dumps([SNAPSHOT_VERSION, signature])
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def snapshot_dir(folder):
+        if METTA_SNAPSHOT_DIR is None:
+            return os.path.join(folder, ".snapshot")
+        # datasets share METTA_SNAPSHOT_DIR, each gets a folder of its own
+        key = hashlib.blake2b(os.path.abspath(folder).encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(METTA_SNAPSHOT_DIR, key)
+
+    @staticmethod
+    def snapshot_path(folder, dataset_hash):
+        return os.path.join(DatasetSnapshot.snapshot_dir(folder), f"{dataset_hash}.json")
+
+    @staticmethod
+    def scan(path, offset=0):
+        '''
+        Head symbols of the top level atoms of a file from offset on, or
+        None when there are none or the file holds other top level content,
+        like !(...) or an atom with an expression as head.
+        '''
+        if os.path.getsize(path) <= offset:
+            return None
+        with open(path, "rb") as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if DatasetSnapshot.lines_are_atoms(mapped, offset):
+                heads = {match.decode("utf-8") for match in HEAD_PATTERN.findall(mapped, offset)}
+            else:
+                heads = DatasetSnapshot.top_level_heads(mapped, offset)
+        return sorted(heads) if heads else None
+
+    @staticmethod
+    def lines_are_atoms(mapped, offset):
+        '''
+        Whether every non empty line from offset on holds exactly one whole
+        atom starting at its first byte, as BioCypher writes them, so
+        HEAD_PATTERN sees every top level atom. Only the parentheses are
+        kept and nested pairs collapsed until each line is a single "()".
+        Strings or comments holding parentheses or line breaks make it
+        answer False, which only costs a slower exact scan.
+        '''
+        if OTHER_LINE_PATTERN.search(mapped, offset):
+            return False
+        start = offset
+        while start < len(mapped):
+            end = len(mapped)
+            if end - start > SCAN_BLOCK:
+                end = mapped.rfind(b"\n", start, start + SCAN_BLOCK) + 1 or end
+            block = mapped[start:end].translate(None, DELETED_BYTES)
+            while True:
+                collapsed = NESTED_PAIRS_PATTERN.sub(b"()", block)
+                if collapsed == block:
+                    break
+                block = collapsed
+            # left over is a line with no atom, or more than one
+            if (block + b"\n").replace(b"()\n", b"\n").strip(b"\n"):
+                return False
+            start = end
+        return True
+
+    @staticmethod
+    def top_level_heads(mapped, offset):
+        '''Tokenize the file and collect the head symbol of every top level atom.'''
+        heads = set()
+        depth = 0
+        for match in TOKEN_PATTERN.finditer(mapped, offset):
+            token = match.group(0)
+            if token[0] == ord("("):
+                if depth == 0:
+                    head = match.group(1)
+                    if not head:
+                        # "(" followed by an expression or nothing
+                        if mapped[match.end():match.end() + 1] != b")":
+                            return None
+                    else:
+                        heads.add(head.decode("utf-8"))
+                depth += 1
+            elif token == b")":
+                depth -= 1
+            elif depth == 0 and token[0] != ord(";"):
+                # a symbol or string outside of any atom, like the ! of !(...)
+                return None
+        return heads
+
+    def extend(self, folder, signature, heads):
+        '''
+        Return the snapshot of the dataset after files were added or
+        appended to, where heads maps each of those files to the heads of
+        its new atoms. The new snapshot is written like a scanned one.
+        '''
+        files = dict(self.files)
+        for path, new_heads in heads.items():
+            if path in files and files[path] is not None:
+                new_heads = sorted(set(files[path]) | set(new_heads or []))
+            files[path] = new_heads
+        snapshot = DatasetSnapshot(DatasetSnapshot.dataset_hash(signature), files)
+        snapshot.save(folder)
+        return snapshot
+
+    def save(self, folder):
+        snapshot_path = DatasetSnapshot.snapshot_path(folder, self.dataset_hash)
+        try:
+            os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+            tmp_path = f"{snapshot_path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump({"version": SNAPSHOT_VERSION, "files": self.files}, file)
+            os.replace(tmp_path, snapshot_path)
+            DatasetSnapshot.prune(folder, snapshot_path)
+        except OSError as e:
+            # a read-only dataset still works, it is scanned again on the next start
+            logging.warning(f"Could not write snapshot '{snapshot_path}': {e}")
+
+    @staticmethod
+    def prune(folder, snapshot_path):
+        '''Remove the snapshots of earlier versions of the dataset.'''
+        directory = DatasetSnapshot.snapshot_dir(folder)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if path != snapshot_path and name.endswith(".json"):
+                os.remove(path)
+
+    @classmethod
+    def open(cls, folder, signature):
+        '''Read the snapshot of the dataset, scanning the files and writing it if there is none.'''
+        dataset_hash = cls.dataset_hash(signature)
+        snapshot_path = cls.snapshot_path(folder, dataset_hash)
+
+        if os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, "r") as file:
+                    return cls(dataset_hash, json.load(file)["files"])
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Ignoring unreadable snapshot '{snapshot_path}': {e}")
+
+        snapshot = cls(dataset_hash, {path: cls.scan(path) for path, _, _ in signature})
+        snapshot.save(folder)
+        return snapshot
@@ -0,0 +1,150 @@
+import functools
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from hyperon import MeTTa
+from .metta_ground import Metta_Ground
+from .dataset_snapshot import DatasetSnapshot
+from .property_index import PropertyIndex
+from .metta_worker import METTA_POOL_SIZE, MettaWorkerPool, use_workers
+from ..dataset_manifest import DatasetManifest
+
+# load files when a query needs them instead of loading the whole dataset up front
+METTA_LAZY_LOAD = os.getenv('METTA_LAZY_LOAD', 'true').lower() == 'true'
+
+SYMBOL_PATTERN = re.compile(r'[^\s()]+')
+# a variable in head position, e.g. ($property (gene ensg1) $value), can match any file
+VARIABLE_HEAD_PATTERN = re.compile(r'\(\s*\$')
+
+
+class MettaDataset:
+    '''
+    A MeTTa instance with one dataset folder loaded into &space.
+
+    With METTA_LAZY_LOAD only the eager files of the snapshot are loaded
+    at start, the others are loaded the first time a query mentions one of
+    their head symbols. With query workers, queries run in the workers'
+    own copies of the dataset and files are loaded there.
+    '''
+
+    def __init__(self, folder, signature, snapshot=None, workers=True):
+        self.folder = folder
+        self.signature = signature
+        self.paths = [path for path, _, _ in signature]
+        self.metta = MeTTa()
+        self.metta.run("!(bind! &space (new-space))")
+        Metta_Ground(self.metta)
+
+        self.loaded = set()
+        self.lock = threading.Lock()
+
+        if snapshot is None:
+            start = time.perf_counter()
+            snapshot = DatasetSnapshot.open(folder, signature)
+            logging.info(f"Opened snapshot {snapshot.dataset_hash} of '{folder}' "
+                         f"in {time.perf_counter() - start:.2f}s")
+        self.snapshot = snapshot
+
+        self.property_index = PropertyIndex(self.snapshot)
+        self.manifest = DatasetManifest.build(self.paths)
+        self.load_files(self.snapshot.eager_files if METTA_LAZY_LOAD else self.paths)
+
+        self.pool = None
+        if workers and use_workers():
+            self.pool = MettaWorkerPool(self.open_copy(), METTA_POOL_SIZE)
+            logging.info(f"Started {METTA_POOL_SIZE} MeTTa query workers for '{folder}'")
+
+    def open_copy(self):
+        '''
+        A picklable callable opening the dataset again, without workers.
+        The copy reuses this snapshot, so a worker started for files that
+        have changed since never rescans them or replaces the snapshot.
+        '''
+        return functools.partial(MettaDataset, self.folder, self.signature,
+                                 snapshot=self.snapshot, workers=False)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+    def load_file(self, path, name=None):
+        name = name or path
+        start = time.perf_counter()
+        try:
+            self.metta.run(f'''
+                !(load-ascii &space {path})
+                ''')
+            logging.info(f"Loaded '{name}' in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logging.error(f"Error loading dataset from '{name}': {e}")
+
+    def load_files(self, paths):
+        with self.lock:
+            paths = sorted(path for path in paths if path not in self.loaded)
+            if not paths:
+                return
+
+            start = time.perf_counter()
+            for path in paths:
+                self.load_file(path)
+                self.loaded.add(path)
+            logging.info(f"Finished loading {len(paths)} datasets in {time.perf_counter() - start:.2f}s.")
+
+    def load_appended(self, path, offset):
+        '''Load the atoms written to a file after offset.'''
+        with open(path, "rb") as file:
+            file.seek(offset)
+            content = file.read()
+        with tempfile.NamedTemporaryFile(suffix=".metta") as delta:
+            delta.write(content)
+            delta.flush()
+            self.load_file(delta.name, f"{path}@{offset}")
+
+    def apply_changes(self, signature, changes):
+        '''
+        Load added files and the new atoms of appended files into the
+        space, as given by DatasetManifest.diff. Files the space has not
+        loaded yet are only recorded in the snapshot and load whole when a
+        query needs them. Returns the symbols of the new atoms.
+        '''
+        symbols = set()
+        heads = {}
+        with self.lock:
+            for path in changes["added"]:
+                heads[path] = DatasetSnapshot.scan(path)
+                symbols |= DatasetManifest.symbols(path)
+                if heads[path] is None or not METTA_LAZY_LOAD:
+                    self.load_file(path)
+                    self.loaded.add(path)
+
+            for path, offset in changes["appended"].items():
+                heads[path] = DatasetSnapshot.scan(path, offset)
+                symbols |= DatasetManifest.symbols(path, offset)
+                if path in self.loaded:
+                    self.load_appended(path, offset)
+                self.property_index.index_appended(path, offset)
+
+            self.signature = signature
+            self.paths = [path for path, _, _ in signature]
+            self.snapshot = self.snapshot.extend(self.folder, signature, heads)
+            self.property_index.snapshot = self.snapshot
+            self.manifest = DatasetManifest.build(self.paths)
+
+        # the workers hold copies of the dataset from before the changes
+        # and are replaced before they are closed, so queries that find
+        # the old pool closed can move on to the new one
+        if self.pool is not None:
+            pool, self.pool = self.pool, MettaWorkerPool(self.open_copy(), METTA_POOL_SIZE)
+            pool.close()
+        return symbols
+
+    def ensure_loaded(self, query):
+        if len(self.loaded) == len(self.paths):
+            return
+        if VARIABLE_HEAD_PATTERN.search(query):
+            self.load_files(self.paths)
+        else:
+            self.load_files(self.snapshot.files_for(SYMBOL_PATTERN.findall(query)))
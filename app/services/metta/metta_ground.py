@@ -1,5 +1,5 @@
 from hyperon import OperationAtom, SymbolAtom, ExpressionAtom, GroundedAtom, ValueAtom
-from .metta_seralizer import recurssive_seralize, metta_seralizer
+from .metta_seralizer import iter_graph_elements
 
 class Metta_Ground:
     def __init__(self, metta):
@@ -11,52 +11,40 @@ class Metta_Ground:
         # Create total count and label count operational atom
         total_count = OperationAtom("total_count", self.total_count, unwrap=False)
         label_count = OperationAtom("label_count", self.label_count, unwrap=False)
+        graph_stats = OperationAtom("graph_stats", self.graph_stats, unwrap=False)
 
         # Register the operational atom into the atomspace
         self.metta.register_atom("total_count", total_count)
         self.metta.register_atom("label_count", label_count)
+        self.metta.register_atom("graph_stats", graph_stats)
 
-    def get_distinct_node_edge_count(self, result_list):
+    def get_distinct_node_edge_count(self, elements):
         nodes = set()
         edges = []
         edge_unique_set = set()
 
-        for i in range(len(result_list)):
-            if result_list[i] == 'node' and i + 2 < len(result_list):
-                nodes.add(f'{result_list[i + 1]} {result_list[i + 2]}')
-            elif result_list[i] == 'edge' and i + 1 < len(result_list):
-                edge_unique = f'{result_list[i+1]}_{result_list[i+3]}_{result_list[i+4]}_{result_list[i+6]}_{result_list[i+7]}'
+        for element in elements:
+            if element[0] == 'node' and len(element) >= 3:
+                nodes.add(element[1:3])
+            elif element[0] == 'edge' and len(element) >= 6:
+                edge_unique = element[1:6]
 
                 if edge_unique not in edge_unique_set:
-                    edges.append(result_list[i + 1])
+                    edges.append(element[1])
                     edge_unique_set.add(edge_unique)
 
         return nodes, edges
 
 
-    def total_count(self, pattern):
-        """Count the total number of nodes and edges in the atomspace."""
-        expression = pattern.get_children()
-        res = recurssive_seralize(expression, [])
-
-        nodes, edges = self.get_distinct_node_edge_count(res)
-
-        result ={'total_nodes': len(nodes), 'total_edges': len(edges)}
-        return [ValueAtom(result)]
+    def count_totals(self, nodes, edges):
+        return {'total_nodes': len(nodes), 'total_edges': len(edges)}
 
 
-    def label_count(self, pattern):
-        """Count the number of nodes and edges with a specific label in the atomspace."""
-        expression = pattern.get_children()
-        res = recurssive_seralize(expression, [])
-
+    def count_labels(self, nodes, edges):
         node_label = {}
         edge_label = {}
 
-        nodes, edges = self.get_distinct_node_edge_count(res)
-
-        for node in nodes:
-            label = node.split(' ')[0]
+        for label, _ in nodes:
 
             if label not in node_label:
                 node_label[label] = {}
@@ -72,5 +60,27 @@ class Metta_Ground:
             else:
                 edge_label[edge]['count'] += 1
 
-        result = {'node_label_count': node_label, 'edge_label_count': edge_label}
+        return {'node_label_count': node_label, 'edge_label_count': edge_label}
+
+
+    def total_count(self, pattern):
+        """Count the total number of nodes and edges in the atomspace."""
+        nodes, edges = self.get_distinct_node_edge_count(iter_graph_elements([pattern]))
+
+        return [ValueAtom(self.count_totals(nodes, edges))]
+
+
+    def label_count(self, pattern):
+        """Count the number of nodes and edges with a specific label in the atomspace."""
+        nodes, edges = self.get_distinct_node_edge_count(iter_graph_elements([pattern]))
+
+        return [ValueAtom(self.count_labels(nodes, edges))]
+
+
+    def graph_stats(self, pattern):
+        """Count the total and per label number of nodes and edges in one pass over the matches."""
+        nodes, edges = self.get_distinct_node_edge_count(iter_graph_elements([pattern]))
+
+        result = self.count_totals(nodes, edges)
+        result.update(self.count_labels(nodes, edges))
         return [ValueAtom(result)]
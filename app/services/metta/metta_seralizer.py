@@ -1,27 +1,62 @@
-from hyperon import SymbolAtom, ExpressionAtom, GroundedAtom
+import re
+
+# Atoms are rendered to text by hyperon in one call and read back with
+# these patterns, which is much cheaper than wrapping every child atom
+# in a Python object through get_children.
+
+# a quoted string or a bare symbol, parentheses only group
+LEAF_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[^\s()"]+')
+TOKEN_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[()]|[^\s()"]+')
+# ((edge transcribed_to) (node (gene ensg1)) (node (transcript enst1))) or (node (gene ensg1))
+GRAPH_ELEMENT_PATTERN = re.compile(
+    r'\(\(edge ([^\s()]+)\) \(node \(([^\s()]+) ([^\s()]+)\)\) \(node \(([^\s()]+) ([^\s()]+)\)\)\)'
+    r'|\(node \(([^\s()]+) ([^\s()]+)\)\)')
+
+def iter_leaves(atoms):
+    '''Names of the symbols and grounded atoms under atoms, depth first.'''
+    for atom in atoms:
+        yield from LEAF_PATTERN.findall(str(atom))
 
 def recurssive_seralize(metta_expression, result):
-    for node in metta_expression:
-        if isinstance(node, SymbolAtom):
-         result.append(node.get_name())
-        elif isinstance(node, GroundedAtom):
-            result.append(str(node))
-        else:
-            recurssive_seralize(node.get_children(), result)
+    result.extend(iter_leaves(metta_expression))
     return result
 
-def metta_seralizer(metta_result):
-    result = []
+def iter_tuples(metta_result):
+    '''
+    Yield one tuple of leaves per expression of every match, skipping the
+    "," of conjunctions. Nesting is tracked with a depth counter, so deep
+    expressions can't hit the recursion limit.
+    '''
+    for node in metta_result:
+        depth = 0
+        leaves = []
+        for token in TOKEN_PATTERN.findall(str(node)):
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth == 1:
+                    yield tuple(leaves)
+                    leaves = []
+            elif depth > 1:
+                leaves.append(token)
 
-    if len(metta_result) == 0:
-        return []
+def metta_seralizer(metta_result):
+    return list(iter_tuples(metta_result))
 
-    for node in metta_result:
-        node = node.get_children()
-        for metta_symbol in node:
-            if isinstance(metta_symbol, SymbolAtom) and  metta_symbol.get_name() == ",":
-                continue
-            elif isinstance(metta_symbol, ExpressionAtom):
-                res = recurssive_seralize(metta_symbol.get_children(), [])
-                result.append(tuple(res))
-    return result
+def iter_graph_elements(atoms):
+    '''
+    Yield ("node", type, id) for every (node (type id)) under atoms and
+    ("edge", predicate, source type, source id, target type, target id)
+    for every ((edge predicate) (node ...) (node ...)), followed by the
+    nodes of the edge.
+    '''
+    for atom in atoms:
+        for match in GRAPH_ELEMENT_PATTERN.finditer(str(atom)):
+            predicate, source_type, source_id, target_type, target_id, node_type, node_id = match.groups()
+            if predicate is None:
+                yield ("node", node_type, node_id)
+            else:
+                yield ("edge", predicate, source_type, source_id, target_type, target_id)
+                yield ("node", source_type, source_id)
+                yield ("node", target_type, target_id)
@@ -0,0 +1,187 @@
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from hyperon import GroundedAtom, ValueAtom
+from hyperon.atoms import ValueObject
+from app.error import ThreadStopException, QueryTimeoutException, PoolClosedException
+
+# run queries in worker processes that can be killed on cancel or timeout
+METTA_QUERY_PROCESS = os.getenv('METTA_QUERY_PROCESS', 'true').lower() == 'true'
+# seconds a query may run before it is killed, 0 disables the limit
+METTA_QUERY_TIMEOUT = float(os.getenv('METTA_QUERY_TIMEOUT', 300))
+# number of query workers per dataset
+METTA_POOL_SIZE = int(os.getenv('METTA_POOL_SIZE', 2))
+# forkserver or spawn, workers are never forked from the threaded server
+METTA_START_METHOD = os.getenv('METTA_START_METHOD', 'forkserver')
+# seconds between two checks of the stop event while a query runs
+POLL_INTERVAL = 0.1
+
+
+def encode(results, max_rows=None):
+    '''
+    Make query results picklable. Values of grounded atoms, like the
+    counts returned by total_count, are kept as is, every other atom is
+    replaced by its text, which is all the serializers read.
+    '''
+    encoded = []
+    for result in results:
+        if max_rows is not None:
+            result = result[:max_rows]
+        atoms = []
+        for atom in result:
+            if isinstance(atom, GroundedAtom) and isinstance(atom.get_object(), ValueObject):
+                atoms.append(("value", atom.get_object().value))
+            else:
+                atoms.append(("text", str(atom)))
+        encoded.append(atoms)
+    return encoded
+
+
+def decode(encoded):
+    return [[ValueAtom(value) if kind == "value" else value for kind, value in result]
+            for result in encoded]
+
+
+def use_workers():
+    return METTA_QUERY_PROCESS and METTA_POOL_SIZE > 0
+
+
+def worker_context():
+    if METTA_START_METHOD in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context(METTA_START_METHOD)
+    else:
+        context = multiprocessing.get_context("spawn")
+    if context.get_start_method() == "forkserver":
+        # imported once by the fork server instead of by every worker
+        context.set_forkserver_preload([__name__])
+    return context
+
+
+def wait_for_result(connection, process, query_code, stop_event, timeout):
+    '''
+    Wait for the answer of a worker, raising ThreadStopException when
+    stop_event is set and QueryTimeoutException when the query runs longer
+    than timeout seconds.
+    '''
+    start = time.monotonic()
+    while not connection.poll(POLL_INTERVAL):
+        if stop_event is not None and stop_event.is_set():
+            raise ThreadStopException('Query runner is stopped')
+        if timeout and time.monotonic() - start > timeout:
+            logging.warning(f"MeTTa query timed out after {timeout}s: {query_code[:200]}")
+            raise QueryTimeoutException(f'Query timed out after {timeout}s')
+    try:
+        kind, payload = connection.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"MeTTa query worker exited with code {process.exitcode}")
+
+    if kind == "error":
+        raise payload
+    return decode(payload)
+
+
+def serve(open_dataset, connection):
+    dataset = open_dataset()
+    while True:
+        try:
+            query_code, max_rows = connection.recv()
+        except EOFError:
+            return
+        try:
+            dataset.ensure_loaded(query_code)
+            connection.send(("result", encode(dataset.metta.run(query_code), max_rows)))
+        except Exception as e:
+            try:
+                connection.send(("error", e))
+            except Exception:
+                connection.send(("error", RuntimeError(str(e))))
+
+
+class MettaWorker:
+    '''A worker process answering queries on its own copy of a dataset.'''
+
+    def __init__(self, open_dataset, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(open_dataset, child), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class MettaWorkerPool:
+    '''
+    Long lived worker processes running the queries of a dataset.
+
+    Workers are started with METTA_START_METHOD, never forked from the
+    server, so they don't inherit locks held by its other threads. Each
+    one calls open_dataset, a picklable callable opening the dataset
+    from its folder and snapshot, and loads the files its queries need
+    the first time they need them. A query goes to the first idle
+    worker, so a slow query never holds back the ones behind it while
+    another worker is free. Workers running a cancelled or timed out
+    query are killed and replaced. Queries waiting for a worker when the
+    pool is closed raise PoolClosedException.
+    '''
+
+    def __init__(self, open_dataset, size):
+        self.open_dataset = open_dataset
+        self.context = worker_context()
+        self.idle = queue.Queue()
+        self.closed = False
+        for _ in range(size):
+            self.idle.put(self.spawn())
+
+    def spawn(self):
+        return MettaWorker(self.open_dataset, self.context)
+
+    def acquire(self, stop_event):
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                raise ThreadStopException('Query runner is stopped')
+            # workers are killed instead of released once the pool is closed
+            if self.closed:
+                raise PoolClosedException('Query worker pool is closed')
+            try:
+                return self.idle.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def release(self, worker):
+        if self.closed:
+            worker.kill()
+        else:
+            self.idle.put(worker)
+
+    def run(self, query_code, stop_event=None, max_rows=None, timeout=METTA_QUERY_TIMEOUT):
+        worker = self.acquire(stop_event)
+        try:
+            worker.connection.send((query_code, max_rows))
+            return wait_for_result(worker.connection, worker.process, query_code, stop_event, timeout)
+        except (ThreadStopException, QueryTimeoutException):
+            # the worker is still busy with the query
+            worker.kill()
+            worker = self.spawn()
+            raise
+        except Exception:
+            if not worker.process.is_alive():
+                worker.kill()
+                worker = self.spawn()
+            raise
+        finally:
+            self.release(worker)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().kill()
+            except queue.Empty:
+                return
@@ -0,0 +1,91 @@
+import itertools
+import mmap
+import re
+import threading
+
+# a quoted string or a bare symbol, parentheses only group
+TOKEN_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*"|[^\s()"]+')
+# (gene_name (gene ensg1) TP53)
+NODE_PROPERTY_PATTERN = re.compile(
+    rb'^[ \t]*\(([^\s()]+) \(([^\s()]+) ([^\s()]+)\) (.+)\)[ \t]*\r?$', re.MULTILINE)
+# (source (transcribed_to (gene ensg1) (transcript enst1)) GENCODE)
+EDGE_PROPERTY_PATTERN = re.compile(
+    rb'^[ \t]*\(([^\s()]+) \(([^\s()]+) \(([^\s()]+) ([^\s()]+)\) \(([^\s()]+) ([^\s()]+)\)\) (.+)\)[ \t]*\r?$',
+    re.MULTILINE)
+
+
+class PropertyIndex:
+    '''
+    Maps (property, owner) to the tokens of the property value, where the
+    owner is (type, id) for a node and (predicate, source type, source id,
+    target type, target id) for an edge. A file is read the first time
+    one of its heads is looked up, so only the properties that queries
+    ask for are held in memory. The inverted index of a property, from
+    (node type, value) to node ids, is built the first time it is searched.
+    '''
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.properties = {}
+        # values after the first one of multi-valued properties, only searched by find
+        self.extra_values = {}
+        self.inverted = {}
+        self.indexed = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def tokens(value):
+        return tuple(token.decode("utf-8") for token in TOKEN_PATTERN.findall(value))
+
+    def index_file(self, path, offset=0):
+        with open(path, "rb") as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for match in NODE_PROPERTY_PATTERN.finditer(mapped, offset):
+                head, node_type, node_id, value = match.groups()
+                head = head.decode("utf-8")
+                owner = (node_type.decode("utf-8"), node_id.decode("utf-8"))
+                owners = self.properties.setdefault(head, {})
+                if owner in owners:
+                    self.extra_values.setdefault(head, []).append((owner, self.tokens(value)))
+                else:
+                    owners[owner] = self.tokens(value)
+            for match in EDGE_PROPERTY_PATTERN.finditer(mapped, offset):
+                head, *owner, value = match.groups()
+                owners = self.properties.setdefault(head.decode("utf-8"), {})
+                owners.setdefault(tuple(part.decode("utf-8") for part in owner), self.tokens(value))
+
+    def ensure_indexed(self, property):
+        paths = self.snapshot.by_head.get(property, [])
+        if any(path not in self.indexed for path in paths):
+            with self.lock:
+                for path in paths:
+                    if path not in self.indexed:
+                        self.index_file(path)
+                        self.indexed.add(path)
+                        # files indexed later may add values to any property
+                        self.inverted.clear()
+
+    def index_appended(self, path, offset):
+        '''Index the properties written to an already indexed file after offset.'''
+        with self.lock:
+            if path in self.indexed:
+                self.index_file(path, offset)
+                self.inverted.clear()
+
+    def get(self, property, owner):
+        self.ensure_indexed(property)
+        return self.properties.get(property, {}).get(owner)
+
+    def find(self, property, node_type, value):
+        '''Ids of the nodes of node_type whose property is the given value.'''
+        self.ensure_indexed(property)
+        with self.lock:
+            if property not in self.inverted:
+                inverted = {}
+                values = itertools.chain(self.properties.get(property, {}).items(),
+                                         self.extra_values.get(property, []))
+                for owner, tokens in values:
+                    if len(owner) == 2:
+                        inverted.setdefault((owner[0], ' '.join(tokens)), []).append(owner[1])
+                self.inverted[property] = inverted
+            return self.inverted[property].get((node_type, str(value)), [])
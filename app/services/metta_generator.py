@@ -1,45 +1,116 @@
 import glob
+import itertools
 import os
-from hyperon import MeTTa, SymbolAtom, ExpressionAtom, GroundedAtom
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+from hyperon import SymbolAtom, ExpressionAtom, GroundedAtom
 import logging
 from .query_generator_interface import QueryGeneratorInterface
-from .metta import Metta_Ground, metta_seralizer
+from .metta import MettaDataset, metta_seralizer, iter_tuples
+from app.error import ThreadStopException, PoolClosedException
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# number of loaded datasets kept in memory
+METTA_CACHE_SIZE = int(os.getenv('METTA_CACHE_SIZE', 2))
+# read result properties from the property index instead of a second match query
+METTA_PROPERTY_INDEX = os.getenv('METTA_PROPERTY_INDEX', 'true').lower() == 'true'
+# property filtered nodes matching more ids than this are left to unification
+METTA_PREBIND_LIMIT = int(os.getenv('METTA_PREBIND_LIMIT', 1000))
+
+MATCH_PATTERN = re.compile(r'\(match &space ')
+PAREN_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[()]')
+# (gene_name (gene $n1) TP53), written by construct_node_representation
+PROPERTY_FILTER_PATTERN = re.compile(r'\(([^\s()$]+) \(([^\s()$]+) \$([^\s()]+)\) ([^\s()$"]+)\)')
+
+# loaded datasets by folder, with the signature of the files they were loaded from
+dataset_cache = OrderedDict()
+dataset_cache_lock = threading.Lock()
+
+
 class MeTTa_Query_Generator(QueryGeneratorInterface):
     def __init__(self, dataset_path: str):
-        self.metta = MeTTa()
-        self.initialize_space()
         self.dataset_path = dataset_path
+        self.ids = itertools.count()
+        self.use_property_index = METTA_PROPERTY_INDEX
+        # queries being evaluated, identical queries wait for the same result
+        self.running = {}
+        self.running_lock = threading.Lock()
         self.load_dataset(self.dataset_path)
-        self.initialize_grounatoms()
-
-    def initialize_space(self):
-        self.metta.run("!(bind! &space (new-space))")
 
-    def initialize_grounatoms(self):
-        Metta_Ground(self.metta)
-
-    def load_dataset(self, path: str) -> None:
+    def dataset_files(self, path: str):
         if not os.path.exists(path):
             raise ValueError(f"Dataset path '{path}' does not exist.")
-        paths = glob.glob(os.path.join(path, "**/*.metta"), recursive=True)
+        paths = sorted(glob.glob(os.path.join(path, "**/*.metta"), recursive=True))
         if not paths:
             raise ValueError(f"No .metta files found in dataset path '{path}'.")
+        return paths
+
+    def dataset_signature(self, paths):
+        signature = []
         for path in paths:
-            logging.info(f"Start loading dataset from '{path}'...")
-            try:
-                self.metta.run(f'''
-                    !(load-ascii &space {path})
-                    ''')
-            except Exception as e:
-                logging.error(f"Error loading dataset from '{path}': {e}")
-        logging.info(f"Finished loading {len(paths)} datasets.")
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def load_dataset(self, path: str) -> None:
+        '''
+        Open the dataset folder in a new space, or reuse the one opened
+        earlier from the same folder if none of its files changed since.
+        '''
+        paths = self.dataset_files(path)
+        signature = self.dataset_signature(paths)
+        key = os.path.abspath(path)
+
+        with dataset_cache_lock:
+            cached = dataset_cache.get(key)
+            if cached is not None and cached[0] == signature:
+                dataset_cache.move_to_end(key)
+                self.dataset = cached[1]
+                self.metta = self.dataset.metta
+                logging.info(f"Reusing the dataset loaded from '{path}'.")
+                return
+
+            self.dataset = MettaDataset(path, signature)
+            self.metta = self.dataset.metta
+
+            dataset_cache[key] = (signature, self.dataset)
+            dataset_cache.move_to_end(key)
+            while len(dataset_cache) > METTA_CACHE_SIZE:
+                _, (_, evicted) = dataset_cache.popitem(last=False)
+                evicted.close()
+
+    def load_changes(self):
+        '''
+        Bring the loaded dataset up to date with its folder. New files and
+        the new atoms of files that were only appended to are loaded into
+        the existing space. Returns the symbols of the new atoms, or None
+        when a file was rewritten or removed and the whole dataset had to
+        be loaded again.
+        '''
+        paths = self.dataset_files(self.dataset_path)
+        signature = self.dataset_signature(paths)
+        changes = self.dataset.manifest.diff(paths)
+
+        if changes["changed"] or changes["removed"]:
+            logging.info(f"Reloading '{self.dataset_path}', changed: {changes['changed']}, "
+                         f"removed: {changes['removed']}")
+            self.load_dataset(self.dataset_path)
+            return None
+
+        symbols = self.dataset.apply_changes(signature, changes)
+        with dataset_cache_lock:
+            key = os.path.abspath(self.dataset_path)
+            if dataset_cache.get(key, (None, None))[1] is self.dataset:
+                dataset_cache[key] = (signature, self.dataset)
+        logging.info(f"Loaded {len(changes['added'])} new and {len(changes['appended'])} "
+                     f"appended files of '{self.dataset_path}'")
+        return symbols
 
     def generate_id(self):
-        import uuid
-        return str(uuid.uuid4())[:8]
+        return f"v{next(self.ids)}"
 
     def construct_node_representation(self, node, identifier):
         node_type = node['type']
@@ -48,7 +119,64 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
             node_representation += f' ({key} ({node_type + " " + identifier}) {value})'
         return node_representation
 
-    def query_Generator(self, requests ,node_map, limit=None, node_only=False):
+    def bind_query(self, query_code):
+        '''
+        Bind the node variables of property filters to the ids the property
+        index holds for them, one match expression at a time. Stored queries
+        are kept unbound and bound on every run, so they pick up nodes
+        loaded after they were generated.
+        '''
+        if not self.use_property_index:
+            return query_code
+
+        parts = []
+        position = 0
+        for match in MATCH_PATTERN.finditer(query_code):
+            start = match.start()
+            if start < position:
+                continue
+            end = self.expression_end(query_code, start)
+            expression = query_code[start:end]
+            parts.append(query_code[position:start])
+            parts.append(self.bind(expression, self.property_bindings(expression)))
+            position = end
+        parts.append(query_code[position:])
+        return ''.join(parts)
+
+    @staticmethod
+    def expression_end(query_code, start):
+        depth = 0
+        for token in PAREN_PATTERN.finditer(query_code, start):
+            if token.group(0) == '(':
+                depth += 1
+            elif token.group(0) == ')':
+                depth -= 1
+                if depth == 0:
+                    return token.end()
+        return len(query_code)
+
+    def property_bindings(self, expression):
+        '''
+        Ids of the nodes matching the property filters of an expression by
+        variable. Variables matching more than METTA_PREBIND_LIMIT ids are
+        left to unification.
+        '''
+        index = self.dataset.property_index
+        ids = {}
+        for property, node_type, variable, value in PROPERTY_FILTER_PATTERN.findall(expression):
+            found = set(index.find(property, node_type, value))
+            ids[variable] = found if variable not in ids else ids[variable] & found
+        return {variable: sorted(found) for variable, found in ids.items()
+                if len(found) <= METTA_PREBIND_LIMIT}
+
+    def bind(self, expression, bindings):
+        '''Wrap the expression so each bound variable takes each of its ids in turn.'''
+        for node_id, ids in bindings.items():
+            if re.search(rf'\${re.escape(node_id)}(?![^\s()])', expression):
+                expression = f'(let ${node_id} (superpose ({" ".join(ids)})) {expression})'
+        return expression
+
+    def query_Generator(self, requests ,node_map, limit=None, node_only=False, properties=True):
         nodes = requests['nodes']
         predicate_map = {}
 
@@ -73,17 +201,24 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
         return_preds = []
         node_representation = ''
 
-        match_clause = '''!(match &space (,'''
+        match_clause = '''(match &space (,'''
         return_clause = ''' ('''
         metta_output = ''
 
         # if there is no predicate
         if not predicates:
+            patterns = set()
             for node in nodes:
                 node_type = node["type"]
                 node_id = node["node_id"]
                 node_identifier = '$' + node["node_id"]
 
+                # nodes asking for the same matches are only looked up once
+                pattern = (node_type, node["id"], tuple(sorted(node["properties"].items())))
+                if node_only and pattern in patterns:
+                    continue
+                patterns.add(pattern)
+
                 if node["id"]:
                     essemble_id = node["id"]
                     match_preds.append(f'({node_type} {essemble_id})')
@@ -101,17 +236,19 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
             }
 
             if node_only:
-                queries = []
-                for i, match_query in enumerate(match_preds):
-                    queries.append(f'{match_clause} {match_query}) ({return_preds[i]}))')
+                # one evaluation for all the nodes, each matched on its own
+                # instead of the cross product of a conjunction
+                matches = [f'{match_clause} {match_query}) ({return_preds[i]}))'
+                           for i, match_query in enumerate(match_preds)]
+                metta_output = '!' + self.superpose(matches)
 
-                queries = ' '.join(queries)
-                return [queries, None, None]
+                count_query = self.count_query_generator(query_clause, node_only=True, batched=True)
+                return [metta_output, count_query[0], count_query[1]]
 
             count_query = self.count_query_generator(query_clause, node_only=True)
-            match_clause += ' '.join(match_preds)
+            match_clause += ' ' + ' '.join(match_preds)
             return_clause += ' '.join(return_preds)
-            metta_output += f'{match_clause}){return_clause}))'
+            metta_output += f'!{match_clause}){return_clause}))'
 
             return [metta_output, count_query[0], count_query[1]]
 
@@ -155,42 +292,104 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
             predicate_type, source, target = returns
             return_output.append(f'({predicate_type} {source} {target})')
         return_clause += ' '.join(return_output)
-        metta_output += f'{match_clause}){return_clause}))'
+        metta_output += f'!{match_clause}){return_clause}))'
 
         return [metta_output, count[0], count[1]]
 
-    def count_query_generator(self, query_clauses, node_only):
-        metta_output = '''(match &space (,'''
-        output = ''' ('''
-
-        match_clause = ' '.join(query_clauses['match_preds'])
-        return_clause = []
-
-        for returns in query_clauses['return_preds']:
-            if node_only:
-                return_clause.append(f'(node {returns})')
-            else:
-                predicate_type, source, target = returns
-                return_clause.append(f'((edge {predicate_type}) (node {source}) (node {target}))')
-
-
-        output += ' '.join(return_clause)
-
-        metta_output += f'{match_clause}){output}))'
-
-        total_count_query = f'''!(total_count (collapse {metta_output}))'''
-        lable_count_query = f'''!(label_count (collapse {metta_output}))'''
-
-        return [total_count_query, lable_count_query]
+    def superpose(self, expressions):
+        if len(expressions) == 1:
+            return expressions[0]
+        return f'(superpose ({" ".join(expressions)}))'
 
+    def count_query_generator(self, query_clauses, node_only, batched=False):
+        if batched:
+            metta_output = self.superpose([
+                f'(match &space (, {match_query}) (node {returns}))'
+                for match_query, returns in zip(query_clauses['match_preds'], query_clauses['return_preds'])])
+        else:
+            match_clause = ' '.join(query_clauses['match_preds'])
+            return_clause = []
 
-    def run_query(self, query_code, stop_event=True):
-        return self.metta.run(query_code)
+            for returns in query_clauses['return_preds']:
+                if node_only:
+                    return_clause.append(f'(node {returns})')
+                else:
+                    predicate_type, source, target = returns
+                    return_clause.append(f'((edge {predicate_type}) (node {source}) (node {target}))')
+
+            output = ' '.join(return_clause)
+            metta_output = f'(match &space (, {match_clause}) ({output}))'
+
+        # both counts come from one graph_stats query, which run_query
+        # evaluates once when the two count tasks ask for it together
+        stats_query = f'''!(graph_stats (collapse {metta_output}))'''
+
+        return [stats_query, stats_query]
+
+
+    def run_query(self, query_code, stop_event=True, max_rows=None):
+        # max_rows only bounds the rows sent back, MeTTa still evaluates
+        # the whole query
+        # callers that can't cancel pass no event
+        if not hasattr(stop_event, 'is_set'):
+            stop_event = None
+        query_code = self.bind_query(query_code)
+
+        key = (id(self.dataset), query_code, max_rows)
+        while True:
+            with self.running_lock:
+                future = self.running.get(key)
+                if future is None:
+                    future = self.running[key] = Future()
+                    break
+            try:
+                return self.wait_for(future, stop_event)
+            except ThreadStopException:
+                # the query was stopped for whoever started it, not for us
+                if stop_event is not None and stop_event.is_set():
+                    raise
+
+        try:
+            future.set_result(self.execute_query(query_code, stop_event, max_rows))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.running_lock:
+                del self.running[key]
+        return future.result()
+
+    def wait_for(self, future, stop_event):
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except TimeoutError:
+                if stop_event is not None and stop_event.is_set():
+                    raise ThreadStopException('Query runner is stopped')
+
+    def execute_query(self, query_code, stop_event, max_rows):
+        # a dataset evicted from the cache closes its pool, one brought up
+        # to date closes it after starting the next one
+        pool = self.dataset.pool
+        while pool is not None and not pool.closed:
+            try:
+                return pool.run(query_code, stop_event, max_rows)
+            except PoolClosedException:
+                pool = self.dataset.pool
+        # without workers the query can't be interrupted once it runs
+        self.dataset.ensure_loaded(query_code)
+        results = self.metta.run(query_code)
+        if max_rows is not None:
+            results = [result[:max_rows] for result in results]
+        return results
 
     def parse_and_serialize(self, input, schema, graph_components, result_type):
         if result_type == 'graph':
+            tuples = [match for result in input for match in iter_tuples(result)]
+            if self.use_property_index and all(len(match) == 2 for match in tuples):
+                return self.parse_nodes(tuples, schema, graph_components)
+
             query, result = self.prepare_query_input(input, schema)
-            tuples = metta_seralizer(result[0])
+            tuples = result[0]
 
             if not tuples:
                 nodes, edges = self.parse_and_seralize_no_properties(query)
@@ -201,7 +400,7 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
                         "edge_count_by_label": []
                 }
             else:
-                result = self.parse_and_serialize_properties(result, graph_components, result_type)
+                result = self.parse_and_serialize_properties(result, graph_components, result_type, query)
             return result
         else:
             (_,_,_,_, meta_data) = self.process_result(input, graph_components, result_type)
@@ -212,12 +411,40 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
                 "edge_count_by_label": meta_data.get('edge_count_by_label', []),
             }
 
+    def parse_nodes(self, tuples, schema, graph_components):
+        '''
+        Serialize the (type, id) tuples of a node only result in one pass,
+        reading the node properties from the property index.
+        '''
+        index = self.dataset.property_index
+        nodes = {}
+
+        for node_type, node_id in tuples:
+            if (node_type, node_id) in nodes:
+                continue
+            node = {"id": f"{node_type} {node_id}", "type": node_type}
+            if graph_components['properties']:
+                for property in schema['nodes'][node_type]['properties']:
+                    value = index.get(property, (node_type, node_id))
+                    if value is not None:
+                        node[property] = value[0] if len(value) == 1 else list(value)
+            nodes[(node_type, node_id)] = node
+
+        return {"nodes": [{"data": node} for node in nodes.values()], "edges": [],
+                "node_count": 0,
+                "edge_count": 0,
+                "node_count_by_label": [],
+                "edge_count_by_label": []
+        }
+
     def parse_and_seralize_no_properties(self, results):
         nodes = set()
         edges = []
 
         for result in results:
             nodes.add(result['source'])
+            if 'predicate' not in result:
+                continue
             nodes.add(result['target'])
 
             source_label = result['source'].split(' ')[0]
@@ -244,9 +471,21 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
 
         return nodes_list, edges
 
-    def parse_and_serialize_properties(self, input, graph_components, result_type):
+    def parse_and_serialize_properties(self, input, graph_components, result_type, query=None):
         (nodes, edges, _, _, meta_data) = self.process_result(input, graph_components, result_type)
-        return {"nodes": nodes[0], "edges": edges[0],
+        nodes, edges = nodes[0], edges[0]
+
+        # matches without any stored property still belong to the graph
+        if query:
+            node_ids = {node["data"]["id"] for node in nodes}
+            edge_keys = {(edge["data"]["label"], edge["data"]["source"], edge["data"]["target"])
+                         for edge in edges}
+            bare_nodes, bare_edges = self.parse_and_seralize_no_properties(query)
+            nodes += [node for node in bare_nodes if node["data"]["id"] not in node_ids]
+            edges += [edge for edge in bare_edges
+                      if (edge["data"]["label"], edge["data"]["source"], edge["data"]["target"]) not in edge_keys]
+
+        return {"nodes": nodes, "edges": edges,
                 "node_count": meta_data.get('node_count', 0),
                 "edge_count": meta_data.get('edge_count', 0),
                 "node_count_by_label": meta_data.get('node_count_by_label', []),
@@ -293,7 +532,6 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
         (_, node_dict, edge_dict) = self.process_result(result[0], True)
         return (node_dict, edge_dict)
 
-    # Won't work because of we don't try to parse node count and count by labels
     def process_result(self, results, graph_components, result_type):
         node_and_edge_count = {}
         count_by_label = {}
@@ -328,7 +566,7 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
         edge_to_dict = {}
         node_type = set()
         edge_type = set()
-        tuples = metta_seralizer(results)
+        tuples = results
 
         for match in tuples:
             graph_attribute = match[0]
@@ -422,8 +660,7 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
         for input in inputs:
             if len(input) == 0:
                 continue
-            tuples = metta_seralizer(input)
-            for tuple in tuples:
+            for tuple in iter_tuples(input):
                 if len(tuple) == 2:
                     src_type, src_id = tuple
                     result.append({
@@ -436,7 +673,39 @@ class MeTTa_Query_Generator(QueryGeneratorInterface):
                     "source": f"{src_type} {src_id}",
                     "target": f"{tgt_type} {tgt_id}"
                     })
-        query = self.get_node_properties(result, schema)
+        return (result, [self.fetch_properties(result, schema)])
+
+    def fetch_properties(self, results, schema):
+        '''
+        Return one serialized tuple per property of every node and edge in
+        the results, shaped like the output of the get_node_properties query.
+        '''
+        if not self.use_property_index:
+            query = self.get_node_properties(results, schema)
+            return metta_seralizer(self.run_query(query)[0])
+
+        index = self.dataset.property_index
+        tuples = []
+        nodes = set()
+
+        for result in results:
+            for role in ["source", "target"]:
+                node = result.get(role)
+                if node is None or node in nodes:
+                    continue
+                nodes.add(node)
+                node_type, node_id = node.split(' ', 1)
+                for property in schema['nodes'][node_type]['properties']:
+                    value = index.get(property, (node_type, node_id))
+                    if value is not None:
+                        tuples.append(("node", property, node_type, node_id, *value))
+
+            if "predicate" in result:
+                predicate = result['predicate']
+                owner = (predicate, *result['source'].split(' ', 1), *result['target'].split(' ', 1))
+                for property in schema['edges'][predicate]['properties']:
+                    value = index.get(property, owner)
+                    if value is not None:
+                        tuples.append(("edge", property, *owner, *value))
 
-        result_properties = self.run_query(query)
-        return (result, result_properties)
+        return tuples
@@ -7,11 +7,15 @@ class QueryGeneratorInterface(ABC):
         pass
 
     @abstractmethod
-    def query_Generator(self, requests, node_map, limit, node_only) -> str:
+    def load_changes(self) -> set:
         pass
 
     @abstractmethod
-    def run_query(self, query_code) -> list:
+    def query_Generator(self, requests, node_map, limit, node_only, properties) -> str:
+        pass
+
+    @abstractmethod
+    def run_query(self, query_code, stop_event, max_rows) -> list:
         pass
 
     @abstractmethod
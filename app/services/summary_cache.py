@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import orjson
+from app.prompts.summarizer_prompts import PROMPT_VERSION
+from app.services.graph_handler import SUMMARY_MODE
+
+
+class SummaryCache:
+    '''
+    Caches generated summaries in Redis.
+
+    The key is a fingerprint of the grouped graph handed to the summarizer,
+    the fingerprint of the request, the user query, the prompt version and
+    the summary mode, so re-running an annotation that returns the same
+    graph, or the same query from another user, reuses the summary. A hit refreshes the
+    TTL so with an LRU eviction policy the most used summaries stay.
+    '''
+    PREFIX = "summary"
+
+    def __init__(self, redis_client, ttl):
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def fingerprint(graph, request_fingerprint, user_query=None):
+        # grouped node and edge ids are stable, so sorting them, and the
+        # members of every group, gives the same document for the same
+        # graph whatever order the rows came in
+        nodes = sorted(graph.get("nodes", []), key=lambda node: node["data"]["id"])
+        document = {
+            "nodes": [SummaryCache.canonical_node(node) for node in nodes],
+            "edges": sorted(graph.get("edges", []),
+                            key=lambda edge: str(edge["data"].get("id"))),
+            "counts": [graph.get(key) for key in ["node_count", "edge_count",
+                                                  "node_count_by_label", "edge_count_by_label"]],
+            "request": request_fingerprint,
+            "user_query": user_query,
+            "prompt_version": PROMPT_VERSION,
+            "mode": SUMMARY_MODE,
+        }
+        encoded = orjson.dumps(document, default=str,
+                               option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return hashlib.sha256(encoded).hexdigest()
+
+    @staticmethod
+    def canonical_node(node):
+        data = node["data"]
+        members = data.get("nodes")
+        if isinstance(members, list):
+            data = {**data, "nodes": sorted(members, key=lambda member: str(member.get("id")))}
+        return data
+
+    def key(self, fingerprint):
+        return f"{self.PREFIX}:{fingerprint}"
+
+    def get(self, fingerprint):
+        try:
+            summary = self.redis_client.get(self.key(fingerprint))
+            if summary is None:
+                self.redis_client.incr(f"{self.PREFIX}:misses")
+                return None
+            self.redis_client.incr(f"{self.PREFIX}:hits")
+            self.redis_client.expire(self.key(fingerprint), self.ttl)
+            return orjson.loads(summary)
+        except Exception as e:
+            # a broken cache should never block the summary itself
+            logging.error("Error reading the summary cache %s", e)
+            return None
+
+    def set(self, fingerprint, summary):
+        try:
+            self.redis_client.setex(self.key(fingerprint), self.ttl, orjson.dumps(summary))
+        except Exception as e:
+            logging.error("Error writing the summary cache %s", e)
+
+    def stats(self):
+        try:
+            hits = int(self.redis_client.get(f"{self.PREFIX}:hits") or 0)
+            misses = int(self.redis_client.get(f"{self.PREFIX}:misses") or 0)
+        except Exception as e:
+            logging.error("Error reading the summary cache stats %s", e)
+            return None
+        total = hits + misses
+        return {"hits": hits, "misses": misses,
+                "hit_rate": hits / total if total else 0.0}
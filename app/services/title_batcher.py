@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+TITLE_BATCH_WINDOW = float(os.getenv('TITLE_BATCH_WINDOW', 0.5))  # seconds to wait for more titles
+TITLE_BATCH_SIZE = int(os.getenv('TITLE_BATCH_SIZE', 20))
+
+
+class TitleBatcher:
+    '''
+    Coalesces title requests made within TITLE_BATCH_WINDOW seconds into a
+    single LLM call that returns a JSON array of titles. Identical queries
+    share one title. If the batched answer can't be used every query falls
+    back to its own generate_title call.
+    '''
+
+    def __init__(self, llm_handler, window=TITLE_BATCH_WINDOW, max_size=TITLE_BATCH_SIZE):
+        self.llm_handler = llm_handler
+        self.window = window
+        self.max_size = max_size
+        self.pending = {}  # query -> futures waiting for its title
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def submit(self, query):
+        future = Future()
+        with self.condition:
+            self.pending.setdefault(query, []).append(future)
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name="title-batcher", daemon=True)
+                self.worker.start()
+            self.condition.notify()
+        return future
+
+    def next_batch(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            deadline = time.monotonic() + self.window
+            while len(self.pending) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            queries = list(self.pending)[:self.max_size]
+            return {query: self.pending.pop(query) for query in queries}
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            for query, title in self.generate(list(batch)).items():
+                for future in batch[query]:
+                    if isinstance(title, Exception):
+                        future.set_exception(title)
+                    else:
+                        future.set_result(title)
+
+    def generate(self, queries):
+        if len(queries) > 1:
+            try:
+                titles = self.llm_handler.generate_titles(queries)
+                return {query: title.strip() for query, title in zip(queries, titles)}
+            except Exception as e:
+                logging.warning("Batched title generation failed, falling back: %s", e)
+
+        results = {}
+        for query in queries:
+            try:
+                results[query] = str(self.llm_handler.generate_title(query)).strip()
+            except Exception as e:
+                results[query] = e
+        return results
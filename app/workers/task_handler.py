@@ -1,17 +1,38 @@
 from flask import request, Response
 from app import app, schema_manager, socketio, redis_client, ThreadStopException
+from app.error import QueryTimeoutException
 import logging
 import json
 import os
 import threading
 import time
-from app.lib import Graph
-from app.constants import TaskStatus
-from app.persistence import AnnotationStorageService
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from app.lib import Graph, sample_graph, request_fingerprint
+from app.constants import TaskStatus, MAX_RESULT_ROWS, MAX_RESULT_NODES, RESULT_SAMPLING
+from app.persistence import AnnotationStorageService, GraphFileStorage
+from app.services import SummaryCache, TitleBatcher
 from pathlib import Path
 
 llm = app.config["llm_handler"]
 EXP = os.getenv("REDIS_EXPIRATION", 3600)  # expiration time of redis cache
+TITLE_EXP = int(os.getenv("TITLE_CACHE_EXPIRATION", 7 * 24 * 3600))
+SUMMARY_EXP = int(os.getenv("SUMMARY_CACHE_EXPIRATION", 7 * 24 * 3600))
+
+summary_cache = SummaryCache(redis_client, SUMMARY_EXP)
+title_batcher = TitleBatcher(llm)
+
+# pool for background jobs that are not part of the annotation tasks
+job_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("JOB_POOL_WORKERS", 4)), thread_name_prefix="job"
+)
+
+
+def failure_update(error, update):
+    # a timed out query is a failure the user should hear the reason of
+    if isinstance(error, QueryTimeoutException):
+        return {**update, "error": str(error)}
+    return update
 
 
 def update_task(annotation_id, graph=None):
@@ -43,9 +64,9 @@ def update_task(annotation_id, graph=None):
                 AnnotationStorageService.delete(annotation_id)
                 redis_client.delete(f"{annotation_id}_tasks")
                 redis_client.delete(str(annotation_id))
-                with app.config["annotation_lock"]:
-                    annotation_threads = app.config["annotation_threads"]
-                    del annotation_threads[str(annotation_id)]
+                # annotation_lock is already held here and is not reentrant
+                annotation_threads = app.config["annotation_threads"]
+                annotation_threads.pop(str(annotation_id), None)
         else:
             status = (
                 TaskStatus.COMPLETE.value if task_num >= 4 else TaskStatus.PENDING.value
@@ -67,6 +88,23 @@ def update_task(annotation_id, graph=None):
         return status
 
 
+def apply_row_budget(response_data):
+    """Trim a raw query result to the row budget, returns (rows, truncated)"""
+    if len(response_data) > 0 and isinstance(response_data[0], list):
+        # MeTTa returns one list of matches per top level expression
+        truncated = any(len(result) > MAX_RESULT_ROWS for result in response_data)
+        return [result[:MAX_RESULT_ROWS] for result in response_data], truncated
+    return response_data[:MAX_RESULT_ROWS], len(response_data) > MAX_RESULT_ROWS
+
+
+def apply_node_budget(response):
+    """Sample the parsed graph down to the node budget, returns (graph, truncated)"""
+    if len(response["nodes"]) <= MAX_RESULT_NODES:
+        return response, False
+    sampled = sample_graph(response, MAX_RESULT_NODES, RESULT_SAMPLING)
+    return {**response, "nodes": sampled["nodes"], "edges": sampled["edges"]}, True
+
+
 def get_status(annotation_id):
     with app.config["annotation_lock"]:
         cache = redis_client.get(str(annotation_id))
@@ -110,6 +148,48 @@ def reset_task(annotation_id):
     redis_client.delete(str(annotation_id))
 
 
+def generate_title(annotation_id, query, placeholder_title, fingerprint=None):
+    # requests that only differ in node ids or predicate order share a title
+    if fingerprint is None:
+        fingerprint = hashlib.sha256(query.encode("utf-8")).hexdigest()
+    cache_key = f"title:{fingerprint}"
+
+    try:
+        title = redis_client.get(cache_key)
+        if title is not None:
+            apply_title(annotation_id, title.decode("utf-8"), placeholder_title)
+            return
+
+        # titles requested close together are generated by one LLM call
+        future = title_batcher.submit(query)
+        future.add_done_callback(
+            lambda future: store_title(annotation_id, cache_key, future, placeholder_title)
+        )
+    except Exception as e:
+        # the placeholder title stays in place
+        logging.error("Error generating title %s", e)
+
+
+def store_title(annotation_id, cache_key, future, placeholder_title):
+    try:
+        title = future.result()
+        redis_client.setex(cache_key, TITLE_EXP, title)
+        apply_title(annotation_id, title, placeholder_title)
+    except Exception as e:
+        logging.error("Error generating title %s", e)
+
+
+def apply_title(annotation_id, title, placeholder_title):
+    if not AnnotationStorageService.update_title(annotation_id, title, placeholder_title):
+        # the annotation was renamed meanwhile, keep showing that name
+        return
+    socketio.emit(
+        "update",
+        {"status": get_status(annotation_id), "update": {"title": title}},
+        to=str(annotation_id),
+    )
+
+
 def generate_summary(annotation_id, request, all_status, summary=None):
     result_done, total_count_done, label_count_done = all_status.values()
     # wait for all threads to finish
@@ -159,7 +239,22 @@ def generate_summary(annotation_id, request, all_status, summary=None):
         if len(response["nodes"]) == 0:
             summary = "No summary for this graph because the graph is empty"
         else:
-            summary = llm.generate_summary(response, request)
+            fingerprint = SummaryCache.fingerprint(response, request_fingerprint(request))
+            summary = summary_cache.get(fingerprint)
+            logging.info("Summary cache %s", summary_cache.stats())
+            if summary is None:
+                status = get_status(annotation_id)
+
+                def forward_token(token):
+                    socketio.emit(
+                        "update",
+                        {"status": status, "update": {"summary_chunk": token}},
+                        to=str(annotation_id),
+                    )
+
+                summary = llm.generate_summary(response, request, on_token=forward_token)
+                if summary:
+                    summary_cache.set(fingerprint, summary)
             summary = summary if summary else "Graph too big, could not summarize"
         AnnotationStorageService.update(annotation_id, {"summary": summary})
 
@@ -209,7 +304,10 @@ def generate_result(query_code, annotation_id, requests, result_status, status=N
 
         db_instance = app.config["db_instance"]
 
-        response_data = db_instance.run_query(query_code, stop_event)
+        response_data = db_instance.run_query(
+            query_code, stop_event, max_rows=MAX_RESULT_ROWS + 1
+        )
+        response_data, truncated = apply_row_budget(response_data)
 
         graph_components = {
             "nodes": requests["nodes"],
@@ -219,6 +317,8 @@ def generate_result(query_code, annotation_id, requests, result_status, status=N
         response = db_instance.parse_and_serialize(
             response_data, schema_manager.schema, graph_components, "graph"
         )
+        response, sampled = apply_node_budget(response)
+        truncated = truncated or sampled
 
         graph = Graph()
 
@@ -226,6 +326,7 @@ def generate_result(query_code, annotation_id, requests, result_status, status=N
             grouped_graph = graph.group_node_only(response, requests)
         else:
             grouped_graph = graph.group_graph(response)
+        grouped_graph["truncated"] = truncated
 
         file_path = (
             Path(__file__).parent
@@ -236,8 +337,7 @@ def generate_result(query_code, annotation_id, requests, result_status, status=N
             / f"{annotation_id}.json"
         )
 
-        with open(file_path, "w") as file:
-            json.dump(grouped_graph, file)
+        GraphFileStorage.save(file_path, grouped_graph)
 
         AnnotationStorageService.update(
             annotation_id, {"path_url": str(file_path.resolve())}
@@ -248,11 +348,15 @@ def generate_result(query_code, annotation_id, requests, result_status, status=N
 
         status = update_task(
             annotation_id,
-            {"nodes": grouped_graph["nodes"], "edges": grouped_graph["edges"]},
+            {
+                "nodes": grouped_graph["nodes"],
+                "edges": grouped_graph["edges"],
+                "truncated": truncated,
+            },
         )
         socketio.emit(
             "update",
-            {"status": status, "update": {"graph": True}},
+            {"status": status, "update": {"graph": True, "truncated": truncated}},
             to=str(annotation_id),
         )
 
@@ -270,7 +374,11 @@ def generate_result(query_code, annotation_id, requests, result_status, status=N
     except Exception as e:
         set_status(annotation_id, TaskStatus.FAILED.value)
         socketio.emit(
-            "update", {"status": TaskStatus.FAILED.value, "update": {"graph": False}}
+            "update",
+            {
+                "status": TaskStatus.FAILED.value,
+                "update": failure_update(e, {"graph": False}),
+            },
         )
         AnnotationStorageService.update(
             annotation_id, {"status": TaskStatus.FAILED.value}
@@ -401,7 +509,7 @@ def generate_total_count(
             "update",
             {
                 "status": TaskStatus.FAILED.value,
-                "update": {"node_count": 0, "edge_count": 0},
+                "update": failure_update(e, {"node_count": 0, "edge_count": 0}),
             },
         )
         total_count_status.set()
@@ -535,7 +643,10 @@ def generate_label_count(
                 "edge_count_by_label": update["edge_count_by_label"],
             },
         )
-        socketio.emit("update", {"status": TaskStatus.FAILED.value, "update": update})
+        socketio.emit(
+            "update",
+            {"status": TaskStatus.FAILED.value, "update": failure_update(e, update)},
+        )
         count_label_status.set()
         logging.error("Error generating label count %s", e)
 
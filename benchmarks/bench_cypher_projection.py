@@ -0,0 +1,81 @@
+'''
+Compare full Node/Relationship results with map projections against a live
+Neo4j (NEO4J_URI, NEO4J_USERNAME and NEO4J_PASSWORD from .env).
+
+The payload size is approximated by the JSON size of the returned values,
+which tracks what is shipped over Bolt closely enough to compare the two.
+
+Run from the repository root:
+    python -m benchmarks.bench_cypher_projection --schema /shared/output/<folder_id>/schema.json --tenant <folder_id>
+'''
+import argparse
+import json
+import time
+from neo4j.graph import Node, Relationship
+from app.lib import validate_request
+from app.services.cypher_generator import CypherQueryGenerator
+from app.services.schema_data import SchemaManager
+
+REQUEST = {
+    "nodes": [
+        {"node_id": "n1", "id": "", "type": "gene", "properties": {}},
+        {"node_id": "n2", "id": "", "type": "transcript", "properties": {}}
+    ],
+    "predicates": [
+        {"type": "transcribed to", "source": "n1", "target": "n2"}
+    ]
+}
+
+
+def payload_size(records):
+    def default(value):
+        if isinstance(value, (Node, Relationship)):
+            return dict(value.items())
+        return str(value)
+
+    return sum(len(json.dumps(record.values(), default=default)) for record in records)
+
+
+def measure(generator, schema, properties, limit):
+    request = json.loads(json.dumps(REQUEST))
+    node_map = validate_request(request, schema)
+    query = generator.query_Generator(request, node_map, limit, properties=properties)[0]
+
+    start = time.perf_counter()
+    records = generator.run_query(query)
+    fetch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    generator.parse_and_serialize(records, schema, {"properties": properties}, "graph")
+    parse = time.perf_counter() - start
+
+    return len(records), payload_size(records), fetch, parse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--schema', required=True)
+    parser.add_argument('--tenant', required=True)
+    parser.add_argument('--limit', type=int, default=20000)
+    args = parser.parse_args()
+
+    schema_manager = SchemaManager()
+    schema_manager.load_schema(args.schema)
+
+    generator = CypherQueryGenerator(None)
+    generator.set_tenant_id(args.tenant)
+    generator.set_schema(schema_manager.schema)
+
+    for properties in [True, False]:
+        for projection in [False, True]:
+            generator.projection = projection
+            rows, size, fetch, parse = measure(
+                generator, schema_manager.schema, properties, args.limit)
+            print(f"properties={properties} projection={projection}: rows={rows} "
+                  f"payload={size / 1024:.0f} KiB fetch={fetch * 1000:.0f} ms "
+                  f"parse={parse * 1000:.0f} ms")
+    generator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Payload size and encode time of the JSON response layer.
+
+Each request fixture from tests/integration/cypher/conftest.py is paired
+with a synthetic grouped graph of the given size, shaped like the body of
+GET /annotation/<id>, and encoded the old way (json.dumps with indent=4)
+and the new way (compact orjson, optionally gzip or brotli).
+
+Run from the repository root:
+    python -m benchmarks.bench_json_response --nodes 100000
+'''
+import argparse
+import gzip
+import importlib.util
+import json
+import os
+import time
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# loaded by path, importing the tests package pulls in the whole app
+CONFTEST_PATH = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                             'integration', 'cypher', 'conftest.py')
+
+
+def load_fixtures():
+    spec = importlib.util.spec_from_file_location("cypher_conftest", CONFTEST_PATH)
+    conftest = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conftest)
+    return [value for value in vars(conftest).values()
+            if isinstance(value, dict) and "requests" in value]
+
+
+def build_body(request, node_count):
+    nodes = [{"data": {"id": f"gene ensg{i}", "type": "gene", "name": f"GENE{i}",
+                       "gene_type": "protein_coding", "chr": "chr1",
+                       "start": i, "end": i + 1000, "parent": f"p{i % 50}"}}
+             for i in range(node_count)]
+    edges = [{"data": {"id": f"e{i}", "edge_id": "gene_transcribed_to_transcript",
+                       "label": "transcribed_to", "source": f"gene ensg{i}",
+                       "target": f"transcript enst{i}"}}
+             for i in range(node_count)]
+    return {"annotation_id": "bench", "request": request["requests"], "title": "bench",
+            "status": "COMPLETE", "node_count": node_count, "edge_count": node_count,
+            "nodes": nodes, "edges": edges}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=100000)
+    args = parser.parse_args()
+
+    for fixture in load_fixtures()[:3]:
+        body = build_body(fixture, args.nodes)
+
+        legacy, legacy_ms = timed(lambda: json.dumps(body, indent=4).encode("utf-8"))
+        compact, compact_ms = timed(lambda: orjson.dumps(body))
+        gzipped, gzip_ms = timed(lambda: gzip.compress(compact, compresslevel=5))
+        print(f"nodes={args.nodes} request_nodes={len(fixture['requests']['nodes'])}")
+        print(f"  json indent=4: {len(legacy) / 1e6:8.2f} MB {legacy_ms:8.1f} ms")
+        print(f"  orjson:        {len(compact) / 1e6:8.2f} MB {compact_ms:8.1f} ms")
+        print(f"  orjson+gzip:   {len(gzipped) / 1e6:8.2f} MB {compact_ms + gzip_ms:8.1f} ms")
+        if brotli is not None:
+            brotlied, brotli_ms = timed(lambda: brotli.compress(compact, quality=4))
+            print(f"  orjson+br:     {len(brotlied) / 1e6:8.2f} MB {compact_ms + brotli_ms:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
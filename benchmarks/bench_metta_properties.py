@@ -0,0 +1,69 @@
+'''
+Time to attach properties to a MeTTa graph result.
+
+Writes a fixture dataset of --genes genes, each transcribed to one
+transcript, with node and edge properties, runs a gene -> transcript
+query and times parse_and_serialize with the second get_node_properties
+match (legacy) and with the property index. The index is warmed by a
+first run, like it is after the first query of a type.
+
+Run from the repository root:
+    python -m benchmarks.bench_metta_properties --genes 500
+'''
+import argparse
+import os
+import tempfile
+import time
+from app.services.metta_generator import MeTTa_Query_Generator
+
+SCHEMA = {
+    "nodes": {"gene": {"properties": ["gene_name", "gene_type", "chr"]},
+              "transcript": {"properties": ["transcript_name", "transcript_type"]}},
+    "edges": {"transcribed_to": {"properties": ["source"]}},
+}
+REQUEST = {
+    "nodes": [{"node_id": "n1", "id": "", "type": "gene", "properties": {}},
+              {"node_id": "n2", "id": "", "type": "transcript", "properties": {}}],
+    "predicates": [{"type": "transcribed to", "source": "n1", "target": "n2", "predicate_id": "p0"}],
+}
+
+
+def write_fixture(folder, genes):
+    os.makedirs(os.path.join(folder, "nodes"))
+    os.makedirs(os.path.join(folder, "edges"))
+    with open(os.path.join(folder, "nodes", "gene.metta"), "w") as file:
+        for i in range(genes):
+            file.write(f"(gene ensg{i})\n(gene_name (gene ensg{i}) GENE{i})\n"
+                       f"(gene_type (gene ensg{i}) protein_coding)\n(chr (gene ensg{i}) chr1)\n")
+    with open(os.path.join(folder, "nodes", "transcript.metta"), "w") as file:
+        for i in range(genes):
+            file.write(f"(transcript enst{i})\n(transcript_name (transcript enst{i}) GENE{i}-201)\n"
+                       f"(transcript_type (transcript enst{i}) protein_coding)\n")
+    with open(os.path.join(folder, "edges", "transcribed_to.metta"), "w") as file:
+        for i in range(genes):
+            edge = f"(transcribed_to (gene ensg{i}) (transcript enst{i}))"
+            file.write(f"{edge}\n(source {edge} GENCODE)\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--genes', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_fixture(folder, args.genes)
+        generator = MeTTa_Query_Generator(folder)
+        node_map = {node["node_id"]: node for node in REQUEST["nodes"]}
+        query = generator.query_Generator(REQUEST, node_map)[0]
+        result = generator.run_query(query)
+
+        for name, use_index in [("legacy", False), ("index", True), ("index", True)]:
+            generator.use_property_index = use_index
+            start = time.perf_counter()
+            graph = generator.parse_and_serialize(result, SCHEMA, {"properties": True}, "graph")
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{name:>7}: {elapsed:9.1f} ms {len(graph['nodes'])} nodes {len(graph['edges'])} edges")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+'''
+Time to serialize and count large MeTTa results.
+
+Builds --matches edge matches shaped like the output of the count
+queries, ((edge transcribed_to) (node (gene ..)) (node (transcript ..))),
+and times the recursive flat-list serializer with the index scan of the
+old get_distinct_node_edge_count against iter_graph_elements on the
+collapsed result the count grounded atoms receive, then the recursive
+serializer against metta_seralizer on the same matches written as
+query results.
+
+Run from the repository root:
+    python -m benchmarks.bench_metta_seralizer --matches 100000
+'''
+import argparse
+import time
+import tracemalloc
+from hyperon import E, S, SymbolAtom, GroundedAtom, ExpressionAtom
+from app.services.metta import iter_graph_elements, metta_seralizer
+
+
+def legacy_seralize(metta_expression, result):
+    for node in metta_expression:
+        if isinstance(node, SymbolAtom):
+            result.append(node.get_name())
+        elif isinstance(node, GroundedAtom):
+            result.append(str(node))
+        else:
+            legacy_seralize(node.get_children(), result)
+    return result
+
+
+def legacy_count(pattern):
+    result_list = legacy_seralize(pattern.get_children(), [])
+    nodes = set()
+    edges = set()
+    for i in range(len(result_list)):
+        if result_list[i] == 'node' and i + 2 < len(result_list):
+            nodes.add(f'{result_list[i + 1]} {result_list[i + 2]}')
+        elif result_list[i] == 'edge' and i + 1 < len(result_list):
+            edges.add(f'{result_list[i+1]}_{result_list[i+3]}_{result_list[i+4]}_{result_list[i+6]}_{result_list[i+7]}')
+    return len(nodes), len(edges)
+
+
+def legacy_tuples(metta_result):
+    result = []
+    for node in metta_result:
+        for metta_symbol in node.get_children():
+            if isinstance(metta_symbol, ExpressionAtom):
+                result.append(tuple(legacy_seralize(metta_symbol.get_children(), [])))
+    return result
+
+
+def count(pattern):
+    nodes = set()
+    edges = set()
+    for element in iter_graph_elements([pattern]):
+        if element[0] == 'node':
+            nodes.add(element[1:3])
+        else:
+            edges.add(element[1:6])
+    return len(nodes), len(edges)
+
+
+def measure(name, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = (time.perf_counter() - start) * 1000
+    # traced separately, tracing slows the atom wrappers down several times
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>18}: {elapsed:9.1f} ms peak {peak / 2 ** 20:7.1f} MiB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=100000)
+    args = parser.parse_args()
+
+    counted = E(*[E(E(E(S("edge"), S("transcribed_to")),
+                   E(S("node"), E(S("gene"), S(f"ensg{i // 2}"))),
+                   E(S("node"), E(S("transcript"), S(f"enst{i}")))))
+               for i in range(args.matches)])
+    matches = [E(S(","), E(S("gene"), S(f"ensg{i // 2}")),
+                 E(S("transcribed_to"), E(S("gene"), S(f"ensg{i // 2}")), E(S("transcript"), S(f"enst{i}"))))
+               for i in range(args.matches)]
+
+    assert measure("legacy count", legacy_count, counted) == measure("count", count, counted)
+    assert measure("legacy seralizer", legacy_tuples, matches) == measure("metta_seralizer", metta_seralizer, matches)
+
+
+if __name__ == '__main__':
+    main()
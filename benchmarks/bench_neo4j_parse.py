@@ -0,0 +1,129 @@
+'''
+Microbenchmark for CypherQueryGenerator.process_result_graph.
+
+Builds synthetic neo4j.graph Node/Relationship records shaped like a
+gene -transcribed_to-> transcript result and compares the current parser
+with the previous implementation. Most of the time of both goes to
+allocating the result dicts and to the garbage collections that
+triggers, so expect them within a few tens of percent of each other.
+
+Run from the repository root:
+    python -m benchmarks.bench_neo4j_parse --rows 50000
+'''
+import argparse
+import gc
+import time
+import neo4j
+from neo4j.graph import Graph
+from app.services.cypher_generator import CypherQueryGenerator
+
+
+class Record(dict):
+    '''Minimal stand-in for neo4j.Record, only values() is used by the parser'''
+
+
+def build_records(rows, fan_out=5):
+    # one graph per result, like the driver hydrates them
+    hydrator = Graph.Hydrator(Graph())
+    records = []
+    for i in range(rows):
+        gene_index = i // fan_out
+        gene = hydrator.hydrate_node(
+            gene_index, ['gene'],
+            {'id': f'ensg{gene_index}', 'gene_name': f'GENE{gene_index}',
+             'gene_type': 'protein_coding', 'chr': 'chr1', 'start': i, 'end': i + 100,
+             'synonyms': [f'syn{gene_index}_{k}' for k in range(30)],
+             'tenant_id': 'bench'})
+        transcript = hydrator.hydrate_node(
+            rows + i, ['transcript'],
+            {'id': f'enst{i}', 'transcript_name': f'TR{i}', 'transcript_type': 'mrna',
+             'chr': 'chr1', 'start': i, 'end': i + 50, 'tenant_id': 'bench'})
+        edge = hydrator.hydrate_relationship(
+            i, gene_index, rows + i, 'transcribed_to', {'source': 'GENCODE'})
+        records.append(Record(p0=edge, n1=gene, n2=transcript))
+    return records
+
+
+def legacy_process_result_graph(results, graph_components):
+    node_dict = {}
+    visited_relations = set()
+    nodes = []
+    edges = []
+    named_types = ['gene_name', 'transcript_name',
+                   'protein_name', 'pathway_name', 'term_name']
+    for record in results:
+        for item in record.values():
+            if isinstance(item, neo4j.graph.Node):
+                node_id = f"{list(item.labels)[0]} {item['id']}"
+                if node_id not in node_dict:
+                    node_data = {"data": {"id": node_id, "type": list(item.labels)[0]}}
+                    for key, value in item.items():
+                        if graph_components['properties']:
+                            if key != "id" and key != "synonyms":
+                                node_data["data"][key] = value
+                        else:
+                            if key in named_types:
+                                node_data["data"]["name"] = value
+                    if "name" not in node_data["data"]:
+                        node_data["data"]["name"] = node_id
+                    nodes.append(node_data)
+                    node_dict[node_id] = node_data
+            elif isinstance(item, neo4j.graph.Relationship):
+                source_label = list(item.start_node.labels)[0]
+                target_label = list(item.end_node.labels)[0]
+                source_id = f"{list(item.start_node.labels)[0]} {item.start_node['id']}"
+                target_id = f"{list(item.end_node.labels)[0]} {item.end_node['id']}"
+                edge_data = {"data": {
+                    "edge_id": f"{source_label}_{item.type}_{target_label}",
+                    "label": item.type, "source": source_id, "target": target_id}}
+                temp_relation_id = f"{source_id} - {item.type} - {target_id}"
+                if temp_relation_id in visited_relations:
+                    continue
+                visited_relations.add(temp_relation_id)
+                for key, value in item.items():
+                    if key == 'source':
+                        edge_data["data"]["source_data"] = value
+                    else:
+                        edge_data["data"][key] = value
+                edges.append(edge_data)
+    return nodes, edges
+
+
+def compare(legacy, current, repeat):
+    '''
+    Best time of each function over repeat runs. The two run in turns and
+    start from a collected heap, so neither pays for the garbage of the
+    other.
+    '''
+    best = [float('inf'), float('inf')]
+    for _ in range(repeat):
+        for i, fn in enumerate([legacy, current]):
+            gc.collect()
+            start = time.perf_counter()
+            fn()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    records = build_records(args.rows)
+    # skip __init__ so no driver connection is opened
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+
+    for properties in [True, False]:
+        components = {'properties': properties}
+        legacy, current = compare(lambda: legacy_process_result_graph(records, components),
+                                  lambda: generator.process_result_graph(records, components),
+                                  args.repeat)
+        print(f"rows={args.rows} properties={properties}: "
+              f"legacy {legacy * 1000:.1f} ms, current {current * 1000:.1f} ms, "
+              f"speedup {legacy / current:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
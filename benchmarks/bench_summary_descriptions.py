@@ -0,0 +1,112 @@
+'''
+Time and size of the graph descriptions built for the summarizer.
+
+Compares the previous pipeline (one tiktoken.get_encoding and one encode
+call per description, every node described, json.loads tried on every
+string) with Graph_Summarizer.batch_descriptions on two synthetic graphs:
+a flat gene -> transcript graph and the same nodes collapsed into a few
+grouped nodes, the shape Graph.group_graph returns for large results.
+
+Run from the repository root:
+    python -m benchmarks.bench_summary_descriptions --nodes 100000
+'''
+import argparse
+import json
+import time
+import tiktoken
+from app.services.graph_handler import Graph_Summarizer
+
+
+def legacy_node_description(node):
+    desc_parts = []
+    for key, value in node.items():
+        if isinstance(value, str):
+            try:
+                parsed_value = json.loads(value)
+                if isinstance(parsed_value, list):
+                    top_items = parsed_value[:3]
+                    if top_items:
+                        desc_parts.append(f"{key.capitalize()}: {', '.join(top_items)}")
+                    continue
+            except json.JSONDecodeError:
+                pass
+        desc_parts.append(f"{key.capitalize()}: {value}")
+    return " | ".join(desc_parts)
+
+
+def legacy_batches(edges, nodes, max_token):
+    descriptions = []
+    by_source = {}
+    for edge in edges:
+        by_source.setdefault(edge["source"], []).append(edge)
+    for source, related in by_source.items():
+        targets = [f"{edge['label']} -> Target Node ({edge['target']}): "
+                   f"{legacy_node_description(nodes.get(edge['target'], {}))}" for edge in related]
+        descriptions.append(f"Source Node ({source}): {legacy_node_description(nodes.get(source, {}))}\n"
+                            + "\n".join(targets))
+
+    batches, current_batch, accumulated_tokens = [], [], 0
+    for desc in descriptions:
+        desc_tokens = len(tiktoken.get_encoding("cl100k_base").encode(desc))
+        if accumulated_tokens + desc_tokens <= max_token:
+            current_batch.append(desc)
+            accumulated_tokens += desc_tokens
+        else:
+            batches.append(current_batch)
+            current_batch, accumulated_tokens = [desc], desc_tokens
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
+def build_flat(node_count):
+    nodes, edges = {}, []
+    for i in range(node_count // 2):
+        gene, transcript = f"ensg{i}", f"enst{i}"
+        nodes[gene] = {"id": gene, "type": "gene", "gene_name": f"GENE{i}", "gene_type": "protein_coding",
+                       "synonyms": json.dumps([f"G{i}", f"GN{i}", f"GX{i}", f"GY{i}"])}
+        nodes[transcript] = {"id": transcript, "type": "transcript", "transcript_name": f"GENE{i}-201"}
+        edges.append({"source": gene, "target": transcript, "label": "transcribed_to"})
+    return edges, nodes
+
+
+def build_grouped(node_count):
+    flat_edges, flat_nodes = build_flat(node_count)
+    genes = [node for node in flat_nodes.values() if node["type"] == "gene"]
+    transcripts = [node for node in flat_nodes.values() if node["type"] == "transcript"]
+    nodes = {"g": {"id": "g", "type": "gene", "name": f"{len(genes)} gene nodes", "nodes": genes},
+             "t": {"id": "t", "type": "transcript", "name": f"{len(transcripts)} transcript nodes",
+                   "nodes": transcripts}}
+    return [{"source": "g", "target": "t", "label": "transcribed_to"}], nodes
+
+
+def measure(name, fn):
+    start = time.perf_counter()
+    batches = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    descriptions = sum(len(batch) for batch in batches)
+    size = sum(len(desc) for batch in batches for desc in batch)
+    print(f"  {name:>8}: {elapsed:9.1f} ms {len(batches):6d} batches "
+          f"{descriptions:7d} descriptions {size / 1e6:8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=100000)
+    parser.add_argument('--max-token', type=int, default=2000)
+    args = parser.parse_args()
+
+    summarizer = Graph_Summarizer.__new__(Graph_Summarizer)
+    summarizer.max_token = args.max_token
+    summarizer.tokenizer = tiktoken.get_encoding("cl100k_base")
+
+    for shape, build in [("flat", build_flat), ("grouped", build_grouped)]:
+        edges, nodes = build(args.nodes)
+        print(f"{shape} graph, {args.nodes} nodes")
+        measure("legacy", lambda: legacy_batches(edges, nodes, args.max_token))
+        measure("budgeted", lambda: summarizer.batch_descriptions(
+            summarizer.generate_grouped_descriptions(edges, nodes)))
+
+
+if __name__ == '__main__':
+    main()
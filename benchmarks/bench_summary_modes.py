@@ -0,0 +1,64 @@
+'''
+Wall time of the refine and map_reduce summary modes.
+
+A stub model sleeps for --latency seconds per call instead of calling a
+provider, so the numbers only reflect how the calls are scheduled. The
+graph is a synthetic gene -> transcript result of --nodes nodes.
+
+Run from the repository root:
+    python -m benchmarks.bench_summary_modes --nodes 2000 --latency 0.5
+'''
+import argparse
+import time
+from app.services.graph_handler import Graph_Summarizer
+
+
+class StubModel:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"summary of {len(prompt)} characters"
+
+
+def build_graph(node_count):
+    nodes, edges = [], []
+    for i in range(node_count // 2):
+        nodes.append({"data": {"id": f"gene ensg{i}", "type": "gene", "gene_name": f"GENE{i}"}})
+        nodes.append({"data": {"id": f"transcript enst{i}", "type": "transcript",
+                               "transcript_name": f"GENE{i}-201"}})
+        edges.append({"data": {"source": f"gene ensg{i}", "target": f"transcript enst{i}",
+                               "label": "transcribed_to"}})
+    return {"nodes": nodes, "edges": edges,
+            "node_count_by_label": [{"label": "gene", "count": node_count // 2},
+                                    {"label": "transcript", "count": node_count // 2}],
+            "edge_count_by_label": [{"label": "transcribed_to", "count": node_count // 2}]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--max-token', type=int, default=2000)
+    args = parser.parse_args()
+
+    graph = build_graph(args.nodes)
+    request = {"nodes": [{"node_id": "n1", "type": "gene"}, {"node_id": "n2", "type": "transcript"}],
+               "predicates": [{"type": "transcribed to", "source": "n1", "target": "n2"}]}
+
+    for mode in ["refine", "map_reduce"]:
+        llm = StubModel(args.latency)
+        summarizer = Graph_Summarizer(llm)
+        summarizer.max_token = args.max_token
+        start = time.perf_counter()
+        summarizer.summary(graph, request, mode=mode)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>10}: {elapsed:7.2f} s {llm.calls:4d} calls "
+              f"({len(summarizer.descriptions)} batches)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# text of the stub completion, streamed one token per event
+TOKENS = ["Genes ", "are ", "transcribed."]
+
+
+def gemini_event(token):
+    return {"candidates": [{"content": {"parts": [{"text": token}]}}]}
+
+
+def openai_event(token):
+    return {"id": "chunk", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    '''
+    Answers like Gemini or OpenAI. Streaming requests get TOKENS as
+    chunked server sent events, the others a single "stub title".
+    '''
+    protocol_version = "HTTP/1.1"
+    # status codes returned one per request, 200 once they run out
+    statuses = []
+    requests = 0
+    received = []  # (path, x-goog-api-key header) of every request
+
+    def do_POST(self):
+        StubHandler.requests += 1
+        StubHandler.received.append((self.path, self.headers.get("x-goog-api-key")))
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+        status = StubHandler.statuses.pop(0) if StubHandler.statuses else 200
+
+        if status == 200 and "chat/completions" in self.path and body.get("stream"):
+            self.send_events([f"data: {json.dumps(openai_event(token))}\n\n" for token in TOKENS]
+                             + ["data: [DONE]\n\n"])
+        elif status == 200 and "streamGenerateContent" in self.path:
+            self.send_events([f"data: {json.dumps(gemini_event(token))}\n\n" for token in TOKENS])
+        else:
+            data = json.dumps(gemini_event("stub title")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    def send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for data in events:
+            data = data.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("utf-8") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StubHandler.statuses = []
+    StubHandler.requests = 0
+    StubHandler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,40 @@
+import copy
+from app import annotation_controller
+from app.services.metta_generator import MeTTa_Query_Generator
+
+# a node-only request has no predicates
+request = {
+    "nodes": [{"node_id": "n1", "id": "", "type": "gene", "properties": {}},
+              {"node_id": "n2", "id": "", "type": "transcript", "properties": {}}],
+}
+
+
+def write_dataset(folder):
+    (folder / "gene.metta").write_text("(gene ensg1)\n(gene ensg2)\n")
+    (folder / "transcript.metta").write_text("(transcript enst1)\n(transcript enst2)\n")
+    (folder / "edges.metta").write_text("(transcribed_to (gene ensg1) (transcript enst1))\n")
+    return str(folder)
+
+
+def invalidate(monkeypatch, generator, documents):
+    updates = {}
+    monkeypatch.setattr(annotation_controller.AnnotationStorageService, "get",
+                        lambda job_id: documents)
+    monkeypatch.setattr(annotation_controller.AnnotationStorageService, "update",
+                        lambda id, data: updates.update({id: data["query"]}))
+    monkeypatch.setattr(annotation_controller.redis_client, "delete", lambda key: None)
+
+    count = annotation_controller.invalidate_annotations("job", None, generator)
+    return count, updates
+
+def test_node_only_annotations_get_the_batched_query(monkeypatch, tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    documents = [{"_id": "nodes", "request": copy.deepcopy(request)}]
+
+    count, updates = invalidate(monkeypatch, generator, documents)
+    result = generator.run_query(updates["nodes"])
+
+    assert count == 1
+    assert "superpose" in updates["nodes"]
+    assert sorted(str(atom) for match in result for atom in match) == [
+        "((gene ensg1))", "((gene ensg2))", "((transcript enst1))", "((transcript enst2))"]
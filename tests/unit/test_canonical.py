@@ -0,0 +1,47 @@
+import copy
+from app.lib import request_fingerprint
+
+request = {
+    "nodes": [
+        {"node_id": "n1", "id": "", "type": "gene", "properties": {"gene_name": "TP53"}},
+        {"node_id": "n2", "id": "", "type": "transcript", "properties": {}},
+        {"node_id": "n3", "id": "", "type": "protein", "properties": {}},
+    ],
+    "predicates": [
+        {"type": "transcribed to", "source": "n1", "target": "n2"},
+        {"type": "translates to", "source": "n2", "target": "n3"},
+    ]
+}
+
+def rename(request, names):
+    renamed = copy.deepcopy(request)
+    for node in renamed["nodes"]:
+        node["node_id"] = names[node["node_id"]]
+    for predicate in renamed["predicates"]:
+        predicate["source"] = names[predicate["source"]]
+        predicate["target"] = names[predicate["target"]]
+    return renamed
+
+def test_renamed_node_ids_share_a_fingerprint():
+    renamed = rename(request, {"n1": "a", "n2": "b", "n3": "c"})
+
+    assert request_fingerprint(request) == request_fingerprint(renamed)
+
+def test_predicate_and_node_order_do_not_matter():
+    reordered = copy.deepcopy(request)
+    reordered["nodes"].reverse()
+    reordered["predicates"].reverse()
+
+    assert request_fingerprint(request) == request_fingerprint(reordered)
+
+def test_direction_and_properties_matter():
+    reversed_edge = copy.deepcopy(request)
+    reversed_edge["predicates"][0].update({"source": "n2", "target": "n1"})
+    other_gene = copy.deepcopy(request)
+    other_gene["nodes"][0]["properties"]["gene_name"] = "BRCA1"
+
+    assert request_fingerprint(request) != request_fingerprint(reversed_edge)
+    assert request_fingerprint(request) != request_fingerprint(other_gene)
+
+def test_properties_flag_matters():
+    assert request_fingerprint(request) != request_fingerprint(request, properties=False)
@@ -0,0 +1,123 @@
+from neo4j.graph import Graph
+from app.services.cypher_generator import CypherQueryGenerator
+
+def build_records():
+    hydrator = Graph.Hydrator(Graph())
+    gene = hydrator.hydrate_node(
+        0, ['gene'],
+        {'id': 'ensg1', 'gene_name': 'TP53', 'gene_type': 'protein_coding',
+         'synonyms': ['p53'], 'not_in_schema': 'kept'})
+    transcript = hydrator.hydrate_node(
+        1, ['transcript'], {'id': 'enst1', 'transcript_name': 'TP53-201'})
+    edge = hydrator.hydrate_relationship(
+        0, 0, 1, 'transcribed_to', {'source': 'GENCODE'})
+    # the same gene comes back on a second row
+    return [{'p0': edge, 'n1': gene, 'n2': transcript}, {'n1': gene}]
+
+def parse(properties):
+    # skip __init__ so no driver connection is opened
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+    return generator.process_result_graph(build_records(), {'properties': properties})
+
+def test_nodes_keep_every_property_but_id_and_synonyms():
+    nodes, _, node_to_dict, _ = parse(True)
+
+    assert [node['data']['id'] for node in nodes] == ['gene ensg1', 'transcript enst1']
+    assert nodes[0]['data'] == {
+        'id': 'gene ensg1', 'type': 'gene', 'gene_name': 'TP53',
+        'gene_type': 'protein_coding', 'not_in_schema': 'kept', 'name': 'gene ensg1'}
+    assert list(node_to_dict) == ['gene', 'transcript']
+
+def test_nodes_only_carry_a_name_without_properties():
+    nodes, _, _, _ = parse(False)
+
+    assert nodes[0]['data'] == {'id': 'gene ensg1', 'type': 'gene', 'name': 'TP53'}
+    assert nodes[1]['data']['name'] == 'TP53-201'
+
+def test_edges_are_parsed_once_with_source_data():
+    _, edges, _, edge_to_dict = parse(True)
+
+    assert edges == [{'data': {
+        'edge_id': 'gene_transcribed_to_transcript', 'label': 'transcribed_to',
+        'source': 'gene ensg1', 'target': 'transcript enst1', 'source_data': 'GENCODE'}}]
+    assert list(edge_to_dict) == ['transcribed_to']
+
+def projecting_generator(schema=None):
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+    generator.projection = True
+    generator.schema = schema
+    return generator
+
+def test_project_node_nulls_out_excluded_properties():
+    generator = projecting_generator()
+
+    assert generator.project_node({'type': 'gene'}, 'n0', True) == \
+        'n0 {.*, synonyms: null, _labels: labels(n0)}'
+
+def test_project_node_only_names_without_properties():
+    schema = {'nodes': {'gene': {'properties': {'gene_name': 'str', 'gene_type': 'str'}}}}
+    generator = projecting_generator(schema)
+
+    assert generator.project_node({'type': 'gene'}, 'n0', False) == \
+        'n0 {.id, _labels: labels(n0), name: coalesce(n0.gene_name)}'
+
+def test_project_edge_carries_properties_on_request():
+    generator = projecting_generator()
+    endpoints = ('_type: type(p0), _source: [labels(n0)[0], n0.id], '
+                 '_target: [labels(n1)[0], n1.id]')
+
+    assert generator.project_edge('p0', 'n0', 'n1', False) == f'p0 {{{endpoints}}}'
+    assert generator.project_edge('p0', 'n0', 'n1', True) == f'p0 {{.*, {endpoints}}}'
+
+def test_projection_can_be_turned_off():
+    generator = projecting_generator()
+    generator.projection = False
+
+    assert generator.project_node({'type': 'gene'}, 'n0', True) == 'n0'
+    assert generator.project_edge('p0', 'n0', 'n1', True) == 'p0'
+
+def projected_records():
+    gene = {'id': 'ensg1', 'gene_name': 'TP53', 'gene_type': 'protein_coding',
+            'synonyms': None, '_labels': ['gene']}
+    transcript = {'id': 'enst1', 'transcript_name': 'TP53-201', '_labels': ['transcript']}
+    edge = {'source': 'GENCODE', '_type': 'transcribed_to',
+            '_source': ['gene', 'ensg1'], '_target': ['transcript', 'enst1']}
+    return [{'p0': edge, 'n0': gene, 'n1': transcript}, {'p0': None, 'n0': gene}]
+
+def test_is_projected_result():
+    generator = projecting_generator()
+
+    assert generator.is_projected_result(projected_records())
+    assert not generator.is_projected_result(build_records())
+    assert not generator.is_projected_result([{'n0': None}])
+
+def test_projected_rows_honor_properties():
+    generator = projecting_generator()
+
+    nodes, edges, _, _ = generator.process_projected_graph(
+        projected_records(), {'properties': True})
+    assert nodes[0]['data'] == {'id': 'gene ensg1', 'type': 'gene', 'gene_name': 'TP53',
+                                'gene_type': 'protein_coding', 'name': 'gene ensg1'}
+    assert edges[0]['data'] == {
+        'edge_id': 'gene_transcribed_to_transcript', 'label': 'transcribed_to',
+        'source': 'gene ensg1', 'target': 'transcript enst1', 'source_data': 'GENCODE'}
+
+    nodes, _, _, _ = generator.process_projected_graph(
+        projected_records(), {'properties': False})
+    assert [node['data'] for node in nodes] == [
+        {'id': 'gene ensg1', 'type': 'gene', 'name': 'TP53'},
+        {'id': 'transcript enst1', 'type': 'transcript', 'name': 'TP53-201'}]
+
+def test_node_only_filters_each_optional_match():
+    generator = projecting_generator()
+    generator.projection = False
+    generator.tenant_id = 't1'
+    nodes = [{'node_id': 'n1', 'id': '', 'type': 'gene', 'properties': {'gene_name': 'TP53'}},
+             {'node_id': 'n2', 'id': '', 'type': 'transcript', 'properties': {}}]
+    node_map = {node['node_id']: node for node in nodes}
+
+    query = generator.query_Generator({'nodes': nodes}, node_map, node_only=True)[0]
+
+    assert query.startswith(
+        "OPTIONAL MATCH (n1:gene {tenant_id: 't1'}) WHERE n1.gene_name =~ '(?i)TP53' "
+        "OPTIONAL MATCH (n2:transcript {tenant_id: 't1'})  RETURN n1, n2")
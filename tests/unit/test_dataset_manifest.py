@@ -0,0 +1,69 @@
+from app.services.dataset_manifest import DatasetManifest, MANIFEST_SAMPLE, CYPHER_SYMBOL_PATTERN
+from app.services.cypher_generator import CypherQueryGenerator
+
+def write(path, text, mode="w"):
+    with open(path, mode) as file:
+        file.write(text)
+    return str(path)
+
+def test_diff_sorts_files_by_change(tmp_path):
+    kept = write(tmp_path / "kept.metta", "(gene ensg1)\n")
+    grown = write(tmp_path / "grown.metta", "(gene ensg2)\n")
+    rewritten = write(tmp_path / "rewritten.metta", "(gene ensg3)\n")
+    removed = write(tmp_path / "removed.metta", "(gene ensg4)\n")
+    manifest = DatasetManifest.build([kept, grown, rewritten, removed])
+
+    write(grown, "(gene ensg5)\n", "a")
+    write(rewritten, "(gene ensg6)\n")
+    added = write(tmp_path / "added.metta", "(gene ensg7)\n")
+
+    assert manifest.diff([kept, grown, rewritten, added]) == {
+        "added": [added],
+        "appended": {grown: len("(gene ensg2)\n")},
+        "changed": [rewritten],
+        "removed": [removed],
+    }
+
+def test_large_file_append_is_found_from_samples(tmp_path):
+    path = write(tmp_path / "genes.metta", "".join(f"(gene ensg{i})\n" for i in range(MANIFEST_SAMPLE // 4)))
+    manifest = DatasetManifest.build([path])
+    size = manifest.entries[path][0]
+
+    write(path, "(gene new)\n", "a")
+
+    assert manifest.diff([path])["appended"] == {path: size}
+
+def test_text_added_to_the_last_line_is_a_change(tmp_path):
+    path = write(tmp_path / "genes.metta", "(gene ensg1)")
+    manifest = DatasetManifest.build([path])
+
+    write(path, " (gene ensg2)", "a")
+
+    assert manifest.diff([path])["changed"] == [path]
+
+def test_symbols_after_offset(tmp_path):
+    path = write(tmp_path / "genes.metta", "(gene ensg1)\n")
+    offset = len("(gene ensg1)\n")
+    write(path, "(gene_name (gene ensg2) TP53)\n(source (transcribed_to (gene ensg2) (transcript enst2)) X)\n", "a")
+
+    assert DatasetManifest.symbols(path, offset) == {"gene_name", "gene", "source", "transcribed_to"}
+
+def test_cypher_symbols(tmp_path):
+    path = write(tmp_path / "edges.cypher",
+                 "MATCH (a:gene {id: 'ensg1'}), (b:transcript {id: 'enst1'}) "
+                 "MERGE (a)-[:transcribed_to]->(b)\n")
+
+    assert DatasetManifest.symbols(path, pattern=CYPHER_SYMBOL_PATTERN) == {"gene", "transcript", "transcribed_to"}
+
+def test_cypher_changes_are_taken_from_the_first_incremental_load(tmp_path):
+    path = write(tmp_path / "nodes.cypher", "CREATE (:gene {id: 'ensg1'})\n")
+    # skip __init__ so no driver connection is opened
+    generator = CypherQueryGenerator.__new__(CypherQueryGenerator)
+    generator.dataset_path = str(tmp_path)
+    generator.manifest = None
+
+    first = generator.load_changes()
+    write(path, "CREATE (:transcript {id: 'enst1'})\n", "a")
+
+    assert first is None
+    assert generator.load_changes() == {"transcript"}
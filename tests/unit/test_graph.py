@@ -0,0 +1,62 @@
+import copy
+from app.lib import Graph, sample_graph
+
+graph = {
+    "nodes": [
+        {"data": {"id": "gene ensg1", "type": "gene", "name": "gene ensg1"}},
+        {"data": {"id": "gene ensg2", "type": "gene", "name": "gene ensg2"}},
+        {"data": {"id": "transcript enst1", "type": "transcript", "name": "transcript enst1"}},
+        {"data": {"id": "transcript enst2", "type": "transcript", "name": "transcript enst2"}},
+    ],
+    "edges": [
+        {"data": {"edge_id": "gene_transcribed_to_transcript", "label": "transcribed_to",
+                  "source": "gene ensg1", "target": "transcript enst1"}},
+        {"data": {"edge_id": "gene_transcribed_to_transcript", "label": "transcribed_to",
+                  "source": "gene ensg1", "target": "transcript enst2"}},
+        {"data": {"edge_id": "gene_transcribed_to_transcript", "label": "transcribed_to",
+                  "source": "gene ensg2", "target": "transcript enst2"}},
+    ]
+}
+
+def test_group_graph_ids_are_deterministic():
+    first = Graph().group_graph(copy.deepcopy(graph))
+    second = Graph().group_graph(copy.deepcopy(graph))
+
+    assert first == second
+
+def test_group_node_only_ids_are_deterministic():
+    request = {"nodes": [{"type": "gene"}]}
+    first = Graph().group_node_only(copy.deepcopy(graph), request)
+    second = Graph().group_node_only(copy.deepcopy(graph), request)
+
+    assert first["nodes"][0]["data"]["id"] == second["nodes"][0]["data"]["id"]
+
+def test_diff_of_identical_runs_is_empty():
+    grouped = Graph().group_graph(copy.deepcopy(graph))
+    diff = Graph().diff(grouped, copy.deepcopy(grouped))
+
+    for component in ["nodes", "edges"]:
+        assert diff[component] == {"added": [], "changed": [], "removed": []}
+
+def test_diff_reports_removed_edges():
+    old = Graph().group_graph(copy.deepcopy(graph))
+    smaller = copy.deepcopy(graph)
+    smaller["edges"] = smaller["edges"][:1]
+    new = Graph().group_graph(smaller)
+    diff = Graph().diff(old, new)
+
+    assert len(diff["edges"]["removed"]) > 0
+
+def test_sample_graph_keeps_top_degree_nodes():
+    sampled = sample_graph(copy.deepcopy(graph), 2, "top_degree")
+    ids = {node["data"]["id"] for node in sampled["nodes"]}
+
+    assert ids == {"gene ensg1", "transcript enst2"}
+    assert len(sampled["edges"]) == 1
+
+def test_sample_graph_random_is_repeatable():
+    first = sample_graph(copy.deepcopy(graph), 2, "random")
+    second = sample_graph(copy.deepcopy(graph), 2, "random")
+
+    assert first == second
+    assert len(first["nodes"]) == 2
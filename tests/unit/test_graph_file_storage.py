@@ -0,0 +1,112 @@
+import json
+from app.persistence.graph_file_storage import GraphFileStorage, INDEX_STRIDE
+
+def build_graph(node_count):
+    nodes = [{"data": {"id": f"gene g{i}", "type": "gene"}} for i in range(node_count)]
+    edges = [{"data": {"id": f"e{i}", "source": f"gene g{i}", "target": f"gene g{i + 1}"}}
+             for i in range(node_count - 1)]
+    return {"nodes": nodes, "edges": edges}
+
+def test_pages_cover_every_element(tmp_path):
+    graph = build_graph(INDEX_STRIDE * 2 + 7)
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, graph)
+
+    cursor = 0
+    nodes = []
+    while cursor is not None:
+        page, cursor, total = GraphFileStorage.read_page(file_path, "nodes", cursor, 333)
+        nodes.extend(page)
+
+    assert total == len(graph["nodes"])
+    assert nodes == graph["nodes"]
+
+def test_page_starting_inside_a_block(tmp_path):
+    graph = build_graph(INDEX_STRIDE + 10)
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, graph)
+
+    page, next_cursor, _ = GraphFileStorage.read_page(file_path, "edges", INDEX_STRIDE - 2, 5)
+
+    assert page == graph["edges"][INDEX_STRIDE - 2:INDEX_STRIDE + 3]
+    assert next_cursor == INDEX_STRIDE + 3
+
+def test_index_is_built_for_older_results(tmp_path):
+    graph = build_graph(5)
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, graph)
+    (tmp_path / "annotation.index.json").unlink()
+
+    page, next_cursor, total = GraphFileStorage.read_page(file_path, "nodes", 0, 10)
+
+    assert page == graph["nodes"]
+    assert next_cursor is None
+    assert total == 5
+
+def test_stream_matches_stored_graph(tmp_path):
+    graph = build_graph(20)
+    graph["truncated"] = True
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, graph)
+
+    body = b"".join(GraphFileStorage.stream(file_path, {"annotation_id": "a1", "status": "COMPLETE"}))
+
+    assert json.loads(body) == {"annotation_id": "a1", "status": "COMPLETE", **graph}
+
+def test_stream_keeps_the_result_it_was_opened_on(tmp_path):
+    graph = build_graph(20)
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, graph)
+
+    stream = GraphFileStorage.stream(file_path, {})
+    GraphFileStorage.save(file_path, build_graph(3))
+
+    assert json.loads(b"".join(stream)) == graph
+
+def test_stream_reopens_a_result_replaced_while_opening(tmp_path, monkeypatch):
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, build_graph(20))
+    get_index = GraphFileStorage.get_index
+    calls = []
+
+    def replaced_get_index(path):
+        # a rerun lands between opening <id>.json and reading the index
+        if not calls:
+            GraphFileStorage.save(file_path, build_graph(3))
+        calls.append(path)
+        return get_index(path)
+
+    monkeypatch.setattr(GraphFileStorage, "get_index", staticmethod(replaced_get_index))
+    body = b"".join(GraphFileStorage.stream(file_path, {}))
+
+    assert json.loads(body) == build_graph(3)
+    assert len(calls) == 2
+
+def test_invalidated_result_is_kept_as_previous(tmp_path):
+    graph = build_graph(10)
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, graph)
+
+    GraphFileStorage.invalidate(file_path)
+
+    assert GraphFileStorage.read_page(file_path, "nodes") is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["annotation.prev.json"]
+
+def test_save_keeps_previous_run_and_leaves_no_temp_files(tmp_path):
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, build_graph(3))
+    GraphFileStorage.save(file_path, build_graph(4))
+
+    with open(tmp_path / "annotation.prev.json") as file:
+        assert len(json.load(file)["nodes"]) == 3
+    assert GraphFileStorage.read_page(file_path, "nodes", 0, 10)[2] == 4
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_delete_removes_every_stored_file(tmp_path):
+    file_path = tmp_path / "annotation.json"
+    GraphFileStorage.save(file_path, build_graph(3))
+    GraphFileStorage.save(file_path, build_graph(4))
+
+    GraphFileStorage.delete(file_path)
+
+    assert not list(tmp_path.iterdir())
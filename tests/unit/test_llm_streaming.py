@@ -0,0 +1,29 @@
+from app.services import GeminiModel, OpenAIModel, LLMTransport
+from tests.lib.llm_stub import StubHandler, TOKENS, server
+
+def test_gemini_streams_tokens(server):
+    model = GeminiModel("key", api_url=f"{server}/v1beta/models/stub:generateContent")
+
+    assert list(model.generate_stream("summarize")) == TOKENS
+    assert StubHandler.received[0][0].startswith("/v1beta/models/stub:streamGenerateContent?alt=sse")
+
+def test_openai_streams_tokens(server):
+    model = OpenAIModel("key", base_url=f"{server}/v1")
+
+    assert list(model.generate_stream("summarize")) == TOKENS
+
+def test_streamed_text_parses_like_generate(server):
+    model = GeminiModel("key", api_url=f"{server}/v1beta/models/stub:generateContent")
+
+    assert model.parse_response("".join(model.generate_stream("summarize"))) == "".join(TOKENS)
+
+def test_openai_stream_holds_a_slot_until_closed(server):
+    model = OpenAIModel("key", base_url=f"{server}/v1")
+    model.transport = LLMTransport("openai", max_concurrency=1)
+
+    tokens = model.generate_stream("summarize")
+    assert next(tokens) == TOKENS[0]
+    assert not model.transport.semaphore.acquire(blocking=False)
+
+    tokens.close()
+    assert model.transport.semaphore.acquire(blocking=False)
@@ -0,0 +1,40 @@
+import httpx
+import pytest
+from app.services import LLMTransport, GeminiModel
+from tests.lib.llm_stub import StubHandler, server
+
+def test_retries_rate_limited_and_server_errors(server):
+    StubHandler.statuses = [429, 503]
+    transport = LLMTransport("stub", backoff=0.01)
+
+    response = transport.post(server, json={})
+
+    assert response.status_code == 200
+    assert StubHandler.requests == 3
+
+def test_gives_up_after_max_retries(server):
+    StubHandler.statuses = [500, 500, 500]
+    transport = LLMTransport("stub", max_retries=2, backoff=0.01)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        transport.post(server, json={})
+    assert StubHandler.requests == 3
+
+def test_client_errors_are_not_retried(server):
+    StubHandler.statuses = [400]
+    transport = LLMTransport("stub", backoff=0.01)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        transport.post(server, json={})
+    assert StubHandler.requests == 1
+
+def test_gemini_model_uses_the_transport(server):
+    model = GeminiModel("key", api_url=server)
+
+    assert model.generate("title please") == "stub title"
+
+def test_gemini_key_is_sent_in_a_header(server):
+    model = GeminiModel("secret", api_url=f"{server}/v1beta/models/stub:generateContent")
+    model.generate("title please")
+
+    assert StubHandler.received == [("/v1beta/models/stub:generateContent", "secret")]
@@ -0,0 +1,137 @@
+import os
+from app.services.metta_generator import MeTTa_Query_Generator, dataset_cache
+from app.services.metta import metta_dataset
+from app.services.metta.dataset_snapshot import DatasetSnapshot
+
+
+def write_dataset(folder, genes):
+    with open(folder / "genes.metta", "w") as file:
+        for gene in genes:
+            file.write(f"(gene {gene})\n(gene_name (gene {gene}) {gene.upper()})\n")
+    return str(folder)
+
+def test_unchanged_dataset_is_reused(tmp_path):
+    path = write_dataset(tmp_path, ["ensg1", "ensg2"])
+
+    first = MeTTa_Query_Generator(path)
+    second = MeTTa_Query_Generator(path)
+
+    assert first.metta is second.metta
+    assert len(second.run_query("!(match &space (gene $x) $x)")[0]) == 2
+
+def test_changed_dataset_is_reloaded(tmp_path):
+    path = write_dataset(tmp_path, ["ensg1"])
+    first = MeTTa_Query_Generator(path)
+
+    write_dataset(tmp_path, ["ensg1", "ensg2", "ensg3"])
+    second = MeTTa_Query_Generator(path)
+
+    assert first.metta is not second.metta
+    assert len(second.run_query("!(match &space (gene $x) $x)")[0]) == 3
+
+def write_typed_dataset(folder):
+    (folder / "nodes").mkdir()
+    (folder / "edges").mkdir()
+    (folder / "nodes" / "gene.metta").write_text("(gene ensg1)\n(gene_name (gene ensg1) TP53)\n")
+    (folder / "nodes" / "transcript.metta").write_text("(transcript enst1)\n")
+    (folder / "edges" / "transcribed_to.metta").write_text(
+        "(transcribed_to (gene ensg1) (transcript enst1))\n")
+    return str(folder)
+
+def test_only_files_a_query_needs_are_loaded(tmp_path, monkeypatch):
+    # without query workers files are loaded into the server space
+    monkeypatch.setattr(metta_dataset, "use_workers", lambda: False)
+    path = write_typed_dataset(tmp_path)
+    generator = MeTTa_Query_Generator(path)
+
+    result = generator.run_query("!(match &space (gene_name (gene $x) TP53) $x)")
+
+    assert [str(atom) for atom in result[0]] == ["ensg1"]
+    assert [os.path.basename(path) for path in generator.dataset.loaded] == ["gene.metta"]
+
+def test_variable_heads_load_every_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(metta_dataset, "use_workers", lambda: False)
+    path = write_typed_dataset(tmp_path)
+    generator = MeTTa_Query_Generator(path)
+
+    result = generator.run_query("!(match &space ($predicate (gene ensg1) $target) $predicate)")
+
+    assert sorted(str(atom) for atom in result[0]) == ["gene_name", "transcribed_to"]
+    assert len(generator.dataset.loaded) == 3
+
+def test_snapshot_is_written_once(tmp_path):
+    path = write_typed_dataset(tmp_path)
+    first = MeTTa_Query_Generator(path)
+    dataset_cache.clear()
+    second = MeTTa_Query_Generator(path)
+
+    snapshots = os.listdir(tmp_path / ".snapshot")
+    assert snapshots == [f"{first.dataset.snapshot.dataset_hash}.json"]
+    assert second.dataset.snapshot.files == first.dataset.snapshot.files
+
+def test_snapshot_of_a_changed_dataset_replaces_the_old_one(tmp_path):
+    path = write_dataset(tmp_path, ["ensg1"])
+    MeTTa_Query_Generator(path)
+    write_dataset(tmp_path, ["ensg1", "ensg2"])
+    second = MeTTa_Query_Generator(path)
+
+    snapshots = os.listdir(tmp_path / ".snapshot")
+    assert snapshots == [f"{second.dataset.snapshot.dataset_hash}.json"]
+
+def scan_text(tmp_path, text):
+    path = tmp_path / "atoms.metta"
+    path.write_bytes(text.encode("utf-8"))
+    return DatasetSnapshot.scan(str(path))
+
+def test_scan_finds_atoms_that_do_not_start_a_line(tmp_path):
+    assert scan_text(tmp_path, "(gene ensg1)\n  (gene_name (gene ensg1) TP53)\n") == \
+        ["gene", "gene_name"]
+    assert scan_text(tmp_path, "(gene ensg1) (transcript enst1)\n") == ["gene", "transcript"]
+    assert scan_text(tmp_path, "(transcribed_to\n  (gene ensg1)\n  (transcript enst1))\n") == \
+        ["transcribed_to"]
+    assert scan_text(tmp_path, '; (comment\n(gene ensg1)\n(description (gene ensg1) "a ) b")\n') == \
+        ["description", "gene"]
+
+def test_scan_marks_files_with_other_content_eager(tmp_path):
+    assert scan_text(tmp_path, "!(import! &self other)\n(gene ensg1)\n") is None
+    assert scan_text(tmp_path, "((gene ensg1) ensg1)\n") is None
+    assert scan_text(tmp_path, "") is None
+
+def test_indented_atoms_load_with_their_file(tmp_path):
+    (tmp_path / "genes.metta").write_text("(gene ensg1)\n  (gene_name (gene ensg1) TP53)\n")
+    (tmp_path / "transcripts.metta").write_text("(transcript enst1)\n")
+    generator = MeTTa_Query_Generator(str(tmp_path))
+
+    result = generator.run_query("!(match &space (gene_name (gene $x) TP53) $x)")
+
+    assert [str(atom) for atom in result[0]] == ["ensg1"]
+
+def test_appended_atoms_are_loaded_into_the_same_space(tmp_path):
+    path = write_dataset(tmp_path, ["ensg1"])
+    generator = MeTTa_Query_Generator(path)
+    metta = generator.metta
+    assert generator.run_query("!(match &space (gene_name (gene ensg1) $x) $x)")[0]
+
+    with open(tmp_path / "genes.metta", "a") as file:
+        file.write("(gene ensg2)\n(gene_name (gene ensg2) ENSG2)\n")
+    (tmp_path / "transcripts.metta").write_text("(transcript enst1)\n")
+
+    symbols = generator.load_changes()
+
+    assert symbols == {"gene", "gene_name", "transcript"}
+    assert generator.metta is metta
+    assert len(generator.run_query("!(match &space (gene $x) $x)")[0]) == 2
+    assert len(generator.run_query("!(match &space (transcript $x) $x)")[0]) == 1
+    assert generator.dataset.property_index.find("gene_name", "gene", "ENSG2") == ["ensg2"]
+    assert MeTTa_Query_Generator(path).metta is metta
+
+def test_rewritten_file_reloads_the_dataset(tmp_path):
+    path = write_dataset(tmp_path, ["ensg1", "ensg2"])
+    generator = MeTTa_Query_Generator(path)
+    metta = generator.metta
+
+    write_dataset(tmp_path, ["ensg3"])
+
+    assert generator.load_changes() is None
+    assert generator.metta is not metta
+    assert len(generator.run_query("!(match &space (gene $x) $x)")[0]) == 1
@@ -0,0 +1,152 @@
+from app.services.metta_generator import MeTTa_Query_Generator
+
+schema = {
+    "nodes": {"gene": {"properties": ["gene_name", "synonyms"]},
+              "transcript": {"properties": ["transcript_name"]}},
+    "edges": {"transcribed_to": {"properties": ["source"]}},
+}
+request = {
+    "nodes": [{"node_id": "n1", "id": "", "type": "gene", "properties": {}},
+              {"node_id": "n2", "id": "", "type": "transcript", "properties": {}}],
+    "predicates": [{"type": "transcribed to", "source": "n1", "target": "n2", "predicate_id": "p0"}],
+}
+
+
+def write_dataset(folder):
+    (folder / "gene.metta").write_text(
+        "(gene ensg1)\n(gene_name (gene ensg1) TP53)\n(synonyms (gene ensg1) (P53 LFS1))\n"
+        "(gene ensg2)\n(gene_name (gene ensg2) BRCA1)\n(synonyms (gene ensg2) (RNF53))\n")
+    (folder / "transcript.metta").write_text(
+        "(transcript enst1)\n(transcript_name (transcript enst1) TP53-201)\n"
+        "(transcript enst2)\n(transcript_name (transcript enst2) BRCA1-201)\n")
+    (folder / "edges.metta").write_text(
+        "(transcribed_to (gene ensg1) (transcript enst1))\n"
+        "(source (transcribed_to (gene ensg1) (transcript enst1)) GENCODE)\n"
+        "(transcribed_to (gene ensg2) (transcript enst2))\n"
+        "(source (transcribed_to (gene ensg2) (transcript enst2)) GENCODE)\n")
+    return str(folder)
+
+def sort_graph(graph):
+    return (sorted(graph["nodes"], key=lambda node: node["data"]["id"]),
+            sorted(graph["edges"], key=lambda edge: edge["data"]["source"]))
+
+def test_property_index_matches_the_property_query(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    node_map = {node["node_id"]: node for node in request["nodes"]}
+    result = generator.run_query(generator.query_Generator(request, node_map)[0])
+
+    generator.use_property_index = False
+    from_query = generator.parse_and_serialize(result, schema, {"properties": True}, "graph")
+    generator.use_property_index = True
+    from_index = generator.parse_and_serialize(result, schema, {"properties": True}, "graph")
+
+    assert sort_graph(from_index) == sort_graph(from_query)
+    assert len(from_index["nodes"]) == 4
+
+def test_generated_ids_are_unique(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+
+    assert len({generator.generate_id() for _ in range(1000)}) == 1000
+
+def run_graph(generator, request):
+    node_map = {node["node_id"]: node for node in request["nodes"]}
+    query, total_count, label_count = generator.query_Generator(request, node_map)
+    result = generator.run_query(query)
+    nodes = {str(atom) for match in result for atom in match}
+    stats = generator.run_query(total_count)[0][0].get_object().value
+    count = {"total_nodes": stats["total_nodes"], "total_edges": stats["total_edges"]}
+    return query, nodes, count
+
+def filtered_request(properties):
+    filtered = {"nodes": [dict(node) for node in request["nodes"]],
+                "predicates": [dict(predicate) for predicate in request["predicates"]]}
+    filtered["nodes"][0]["properties"] = properties
+    return filtered
+
+def test_property_filters_are_bound_when_run(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    filtered = filtered_request({"gene_name": "TP53"})
+
+    generator.use_property_index = False
+    _, unified, unified_count = run_graph(generator, filtered)
+    generator.use_property_index = True
+    query, prebound, prebound_count = run_graph(generator, filtered)
+
+    assert "ensg1" not in query
+    assert "(let $n1 (superpose (ensg1))" in generator.bind_query(query)
+    assert prebound == unified
+    assert prebound_count == unified_count == {"total_nodes": 2, "total_edges": 1}
+
+def test_several_matches_are_bound_with_superpose(tmp_path):
+    (tmp_path / "types.metta").write_text(
+        "(gene_type (gene ensg1) protein_coding)\n(gene_type (gene ensg2) protein_coding)\n")
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    filtered = filtered_request({"gene_type": "protein_coding"})
+
+    generator.use_property_index = False
+    _, unified, _ = run_graph(generator, filtered)
+    generator.use_property_index = True
+    query, prebound, count = run_graph(generator, filtered)
+
+    assert "(superpose (ensg1 ensg2))" in generator.bind_query(query)
+    assert prebound == unified
+    assert count == {"total_nodes": 4, "total_edges": 2}
+
+def test_stored_query_finds_nodes_loaded_after_it(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    filtered = filtered_request({"gene_name": "TP53"})
+    query, nodes, _ = run_graph(generator, filtered)
+
+    with open(tmp_path / "gene.metta", "a") as file:
+        file.write("(gene ensg3)\n(gene_name (gene ensg3) TP53)\n")
+    with open(tmp_path / "edges.metta", "a") as file:
+        file.write("(transcribed_to (gene ensg3) (transcript enst2))\n")
+    generator.load_changes()
+    result = generator.run_query(query)
+
+    assert len(nodes) == 1
+    assert len(result[0]) == 2
+
+def test_unknown_property_value_matches_nothing(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    _, nodes, _ = run_graph(generator, filtered_request({"gene_name": "NOPE"}))
+
+    assert nodes == set()
+
+def test_node_only_request_is_one_batched_query(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    node_only = {"nodes": [dict(node) for node in request["nodes"]], "predicates": []}
+    node_only["nodes"][0]["properties"] = {"gene_name": "TP53"}
+    node_map = {node["node_id"]: node for node in node_only["nodes"]}
+
+    query, stats_query, _ = generator.query_Generator(node_only, node_map, node_only=True)
+    result = generator.run_query(query)
+
+    generator.use_property_index = False
+    from_query = generator.parse_and_serialize(result, schema, {"properties": True}, "graph")
+    generator.use_property_index = True
+    from_index = generator.parse_and_serialize(result, schema, {"properties": True}, "graph")
+    stats = generator.run_query(stats_query)[0][0].get_object().value
+
+    assert query.count("!") == 1 and "superpose" in query
+    assert len(result) == 1
+    assert sort_graph(from_index) == sort_graph(from_query)
+    assert [node["data"]["id"] for node in sort_graph(from_index)[0]] == [
+        "gene ensg1", "transcript enst1", "transcript enst2"]
+    assert stats["total_nodes"] == 3
+    assert stats["node_label_count"] == {"gene": {"count": 1}, "transcript": {"count": 2}}
+
+def test_nodes_without_node_only_are_a_conjunction(tmp_path):
+    generator = MeTTa_Query_Generator(write_dataset(tmp_path))
+    nodes = {"nodes": [dict(node) for node in request["nodes"]], "predicates": []}
+    nodes["nodes"][0]["properties"] = {"gene_name": "TP53"}
+    node_map = {node["node_id"]: node for node in nodes["nodes"]}
+
+    query, stats_query, _ = generator.query_Generator(nodes, node_map)
+    result = generator.run_query(query)
+    stats = generator.run_query(stats_query)[0][0].get_object().value
+
+    assert "superpose" not in query
+    assert sorted(str(atom) for atom in result[0]) == [
+        "((gene ensg1) (transcript enst1))", "((gene ensg1) (transcript enst2))"]
+    assert stats["total_nodes"] == 3
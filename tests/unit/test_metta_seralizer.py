@@ -0,0 +1,64 @@
+import sys
+from hyperon import E, S, MeTTa
+from app.services.metta import Metta_Ground, metta_seralizer, iter_graph_elements, recurssive_seralize
+
+def node(node_type, node_id):
+    return E(S("node"), E(S(node_type), S(node_id)))
+
+def edge(predicate, source, target):
+    return E(E(S("edge"), S(predicate)), node(*source), node(*target))
+
+def matches():
+    # built per test, hyperon atoms left alive at exit are freed after the library
+    return E(
+        E(edge("transcribed_to", ("gene", "ensg1"), ("transcript", "enst1"))),
+        E(edge("transcribed_to", ("gene", "ensg1"), ("transcript", "enst1"))),
+        E(edge("transcribed_to", ("gene", "ensg1"), ("transcript", "enst2"))),
+        E(node("gene", "ensg2")),
+    )
+
+def test_seralizer_yields_one_tuple_per_expression():
+    result = [E(S(","), E(S("gene"), S("ensg1")),
+                E(S("transcribed_to"), E(S("gene"), S("ensg1")), E(S("transcript"), S("enst1"))))]
+
+    assert metta_seralizer(result) == [
+        ("gene", "ensg1"),
+        ("transcribed_to", "gene", "ensg1", "transcript", "enst1"),
+    ]
+
+def test_deep_expressions_do_not_recurse():
+    expression = S("leaf")
+    for _ in range(sys.getrecursionlimit() + 100):
+        expression = E(expression)
+
+    assert recurssive_seralize([expression], []) == ["leaf"]
+
+def test_graph_elements_are_typed():
+    elements = list(iter_graph_elements([matches()]))
+
+    assert elements[:3] == [
+        ("edge", "transcribed_to", "gene", "ensg1", "transcript", "enst1"),
+        ("node", "gene", "ensg1"),
+        ("node", "transcript", "enst1"),
+    ]
+    assert elements[-1] == ("node", "gene", "ensg2")
+
+def test_counts_are_distinct():
+    ground = Metta_Ground(MeTTa())
+
+    total = ground.total_count(matches())[0].get_object().value
+    labels = ground.label_count(matches())[0].get_object().value
+
+    assert total == {"total_nodes": 4, "total_edges": 2}
+    assert labels == {
+        "node_label_count": {"gene": {"count": 2}, "transcript": {"count": 2}},
+        "edge_label_count": {"transcribed_to": {"count": 2}},
+    }
+
+def test_graph_stats_has_totals_and_labels():
+    ground = Metta_Ground(MeTTa())
+
+    stats = ground.graph_stats(matches())[0].get_object().value
+
+    assert stats == {**ground.total_count(matches())[0].get_object().value,
+                     **ground.label_count(matches())[0].get_object().value}
@@ -0,0 +1,168 @@
+import threading
+import time
+import pytest
+from app.error import ThreadStopException, QueryTimeoutException, PoolClosedException
+from app.services.metta import MettaWorkerPool
+from app.services.metta.metta_worker import METTA_POOL_SIZE
+from app.services.metta_generator import MeTTa_Query_Generator
+
+SPIN = "(= (spin $x) (spin $x)) !(spin 1)"
+
+def make_pool(tmp_path, size=1):
+    (tmp_path / "genes.metta").write_text("(gene ensg1)\n(gene ensg2)\n")
+    generator = MeTTa_Query_Generator(str(tmp_path))
+    return MettaWorkerPool(generator.dataset.open_copy(), size)
+
+def test_results_come_back_from_the_worker(tmp_path):
+    pool = make_pool(tmp_path)
+    try:
+        results = pool.run("!(match &space (gene $x) (gene $x))", max_rows=1)
+    finally:
+        pool.close()
+
+    assert len(results) == 1
+    assert [str(atom) for atom in results[0]] in (["(gene ensg1)"], ["(gene ensg2)"])
+
+def test_grounded_values_keep_their_value(tmp_path):
+    pool = make_pool(tmp_path)
+    try:
+        results = pool.run("!(total_count (collapse (match &space (gene $x) (node (gene $x)))))")
+    finally:
+        pool.close()
+
+    assert results[0][0].get_object().value == {"total_nodes": 2, "total_edges": 0}
+
+def test_stop_event_kills_the_query(tmp_path):
+    pool = make_pool(tmp_path)
+    stop_event = threading.Event()
+    threading.Timer(0.3, stop_event.set).start()
+
+    start = time.monotonic()
+    try:
+        with pytest.raises(ThreadStopException):
+            pool.run(SPIN, stop_event)
+    finally:
+        pool.close()
+
+    assert time.monotonic() - start < 5
+
+def test_slow_query_times_out(tmp_path):
+    pool = make_pool(tmp_path)
+    try:
+        with pytest.raises(QueryTimeoutException, match="timed out"):
+            pool.run(SPIN, timeout=0.3)
+    finally:
+        pool.close()
+
+def test_stopped_event_does_not_start_the_query(tmp_path):
+    pool = make_pool(tmp_path)
+    stop_event = threading.Event()
+    stop_event.set()
+
+    try:
+        with pytest.raises(ThreadStopException):
+            pool.run(SPIN, stop_event)
+    finally:
+        pool.close()
+
+def test_pool_workers_load_files_on_demand(tmp_path):
+    (tmp_path / "genes.metta").write_text("(gene ensg1)\n(gene_name (gene ensg1) TP53)\n")
+    generator = MeTTa_Query_Generator(str(tmp_path))
+    pool = MettaWorkerPool(generator.dataset.open_copy(), 2)
+    try:
+        results = [pool.run("!(match &space (gene_name (gene ensg1) $name) $name)") for _ in range(3)]
+    finally:
+        pool.close()
+
+    assert [[str(atom) for atom in result[0]] for result in results] == [["TP53"]] * 3
+    # the server space only has what it loaded itself
+    assert generator.dataset.loaded == set()
+
+def test_pool_replaces_killed_workers(tmp_path):
+    (tmp_path / "genes.metta").write_text("(gene ensg1)\n")
+    generator = MeTTa_Query_Generator(str(tmp_path))
+    pool = MettaWorkerPool(generator.dataset.open_copy(), 1)
+    try:
+        with pytest.raises(QueryTimeoutException):
+            pool.run(SPIN, timeout=0.3)
+        result = pool.run("!(match &space (gene $x) $x)")
+    finally:
+        pool.close()
+
+    assert [str(atom) for atom in result[0]] == ["ensg1"]
+
+def run_in_thread(fn, *args):
+    outcome = []
+
+    def target():
+        try:
+            outcome.append(fn(*args))
+        except Exception as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+def test_closing_the_pool_releases_waiting_queries(tmp_path):
+    pool = make_pool(tmp_path, 1)
+    stop_event = threading.Event()
+    busy, _ = run_in_thread(pool.run, SPIN, stop_event)
+    time.sleep(0.3)
+    waiting, outcome = run_in_thread(pool.run, "!(match &space (gene $x) $x)")
+    time.sleep(0.3)
+
+    pool.close()
+    waiting.join(5)
+    stop_event.set()
+    busy.join(5)
+
+    assert not waiting.is_alive()
+    assert isinstance(outcome[0], PoolClosedException)
+
+def test_waiting_queries_move_to_the_pool_of_the_changed_dataset(tmp_path):
+    (tmp_path / "genes.metta").write_text("(gene ensg1)\n")
+    generator = MeTTa_Query_Generator(str(tmp_path))
+    stop_events = [threading.Event() for _ in range(METTA_POOL_SIZE)]
+    busy = [run_in_thread(generator.run_query, f"(= (spin $x) (spin $x)) !(spin {i})", stop_event)[0]
+            for i, stop_event in enumerate(stop_events)]
+    time.sleep(0.3)
+    waiting, outcome = run_in_thread(generator.run_query, "!(match &space (gene $x) $x)", threading.Event())
+    time.sleep(0.3)
+
+    with open(tmp_path / "genes.metta", "a") as file:
+        file.write("(gene ensg2)\n")
+    generator.load_changes()
+    waiting.join(10)
+    for stop_event in stop_events:
+        stop_event.set()
+    for thread in busy:
+        thread.join(5)
+
+    assert not waiting.is_alive()
+    assert sorted(str(atom) for atom in outcome[0][0]) == ["ensg1", "ensg2"]
+
+def test_identical_queries_share_one_run(tmp_path):
+    (tmp_path / "genes.metta").write_text("(gene ensg1)\n")
+    generator = MeTTa_Query_Generator(str(tmp_path))
+    calls = []
+    execute_query = generator.execute_query
+
+    def slow_execute_query(*args):
+        calls.append(args)
+        time.sleep(0.3)
+        return execute_query(*args)
+
+    generator.execute_query = slow_execute_query
+    query = "!(graph_stats (collapse (match &space (gene $x) (node (gene $x)))))"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(generator.run_query(query, threading.Event())))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results[0] is results[1]
+    assert results[0][0][0].get_object().value["total_nodes"] == 1
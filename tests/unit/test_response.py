@@ -0,0 +1,63 @@
+import gzip
+import json
+import brotli
+from flask import Flask
+from app.lib.response import json_response, stream_response, MIN_COMPRESS_SIZE
+
+server = Flask(__name__)
+
+def build_data():
+    return {"nodes": [{"data": {"id": f"gene g{i}", "type": "gene"}}
+                      for i in range(MIN_COMPRESS_SIZE // 10)]}
+
+def respond(accept_encoding=None, data=None, query_string=None):
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding is not None else {}
+    with server.test_request_context(headers=headers, query_string=query_string):
+        return json_response(build_data() if data is None else data)
+
+def test_body_is_compact_json():
+    response = respond(data={"a": [1, 2], 3: "b"})
+
+    assert response.get_data() == b'{"a":[1,2],"3":"b"}'
+    assert response.mimetype == "application/json"
+    assert "Content-Encoding" not in response.headers
+
+def test_pretty_body_is_indented():
+    response = respond(data={"a": 1}, query_string={"pretty": "1"})
+
+    assert response.get_data() == b'{\n  "a": 1\n}'
+
+def test_brotli_is_preferred_on_a_tie():
+    response = respond("gzip, deflate, br")
+
+    assert response.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(response.get_data())) == build_data()
+
+def test_quality_values_are_honored():
+    response = respond("br;q=0.5, gzip")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.get_data())) == build_data()
+
+def test_refused_encodings_are_not_used():
+    assert respond("br;q=0, gzip;q=0").headers.get("Content-Encoding") is None
+    assert respond("identity").headers.get("Content-Encoding") is None
+    assert respond("brotli").headers.get("Content-Encoding") is None
+
+def test_small_bodies_are_not_compressed():
+    response = respond("gzip", data={"a": 1})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data() == b'{"a":1}'
+
+def test_vary_header_is_always_set():
+    assert respond().headers["Vary"] == "Accept-Encoding"
+    assert respond("gzip").headers["Vary"] == "Accept-Encoding"
+
+def test_stream_is_compressed_on_the_fly():
+    with server.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        response = stream_response(iter([b'{"a": ', b'1}']))
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.get_data()) == b'{"a": 1}'
@@ -0,0 +1,60 @@
+from app.lib import request_fingerprint
+from app.services import SummaryCache
+
+graph = {
+    "nodes": [
+        {"data": {"id": "gene ensg1", "type": "gene"}},
+        {"data": {"id": "gene ensg2", "type": "gene"}},
+    ],
+    "edges": [],
+    "node_count": 2,
+    "edge_count": 0,
+}
+request = request_fingerprint({"nodes": [{"node_id": "n1", "type": "gene"}], "predicates": []})
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def expire(self, key, ttl):
+        pass
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+def test_fingerprint_ignores_node_order():
+    reordered = {**graph, "nodes": list(reversed(graph["nodes"]))}
+
+    assert SummaryCache.fingerprint(graph, request) == SummaryCache.fingerprint(reordered, request)
+
+def test_fingerprint_ignores_group_member_order():
+    members = [{"id": "gene ensg1", "type": "gene"}, {"id": "gene ensg2", "type": "gene"}]
+    grouped = {"nodes": [{"data": {"id": "g1", "type": "gene", "nodes": members}}], "edges": []}
+    reordered = {"nodes": [{"data": {"id": "g1", "type": "gene", "nodes": members[::-1]}}], "edges": []}
+
+    assert SummaryCache.fingerprint(grouped, request) == SummaryCache.fingerprint(reordered, request)
+
+def test_fingerprint_depends_on_request_and_user_query():
+    other = request_fingerprint({"nodes": [{"node_id": "n1", "type": "transcript"}], "predicates": []})
+    fingerprint = SummaryCache.fingerprint(graph, request)
+
+    assert fingerprint != SummaryCache.fingerprint(graph, other)
+    assert fingerprint != SummaryCache.fingerprint(graph, request, "what genes?")
+
+def test_cache_counts_hits_and_misses():
+    cache = SummaryCache(FakeRedis(), 60)
+    fingerprint = SummaryCache.fingerprint(graph, request)
+
+    assert cache.get(fingerprint) is None
+    cache.set(fingerprint, "two genes")
+
+    assert cache.get(fingerprint) == "two genes"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
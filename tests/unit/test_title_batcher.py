@@ -0,0 +1,47 @@
+from app.services import TitleBatcher
+
+
+class FakeHandler:
+    def __init__(self, batched=True):
+        self.batched = batched
+        self.batch_calls = []
+        self.single_calls = []
+
+    def generate_titles(self, queries):
+        self.batch_calls.append(queries)
+        if not self.batched:
+            raise ValueError("Batched titles do not match the queries")
+        return [f"title of {query}" for query in queries]
+
+    def generate_title(self, query):
+        self.single_calls.append(query)
+        return f"single title of {query}"
+
+def test_requests_in_the_window_share_one_call():
+    handler = FakeHandler()
+    batcher = TitleBatcher(handler, window=0.2)
+
+    futures = [batcher.submit(f"query {i}") for i in range(5)]
+    titles = [future.result(timeout=5) for future in futures]
+
+    assert titles == [f"title of query {i}" for i in range(5)]
+    assert len(handler.batch_calls) == 1
+    assert handler.single_calls == []
+
+def test_identical_queries_are_generated_once():
+    handler = FakeHandler()
+    batcher = TitleBatcher(handler, window=0.2)
+
+    futures = [batcher.submit("query"), batcher.submit("query"), batcher.submit("other")]
+    [future.result(timeout=5) for future in futures]
+
+    assert handler.batch_calls == [["query", "other"]]
+
+def test_falls_back_to_single_calls():
+    handler = FakeHandler(batched=False)
+    batcher = TitleBatcher(handler, window=0.2)
+
+    futures = [batcher.submit("a"), batcher.submit("b")]
+
+    assert [future.result(timeout=5) for future in futures] == ["single title of a", "single title of b"]
+    assert handler.single_calls == ["a", "b"]